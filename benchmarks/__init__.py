@@ -0,0 +1,13 @@
+"""
+Benchmarks dos fluxos principais do SGMRP.
+
+- gerador.py: gera um dados.db temporário e determinístico (lotes com cadeias de
+  predecessores, unidades e subunidades, anos de mapas diários com SIISP)
+- cenarios.py: os fluxos medidos (dashboard, métricas, relatórios, exportações,
+  gravação de mapas e SIISP)
+- __main__.py: execução, relatório JSON e comparação com um baseline
+
+Uso:
+	python -m benchmarks --perfil medio --saida relatorio.json
+	python -m benchmarks --perfil medio --baseline relatorio.json --tolerancia 0.2
+"""
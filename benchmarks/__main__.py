@@ -0,0 +1,175 @@
+"""
+Executa os benchmarks e grava o relatório JSON.
+
+	python -m benchmarks [--perfil pequeno|medio|grande] [--semente 42] [--repeticoes 5]
+	                     [--filtro texto] [--saida relatorio.json]
+	                     [--baseline anterior.json] [--tolerancia 0.2]
+
+Com --baseline, compara a mediana de cada cenário com a do relatório anterior e
+termina com código 1 se algum cenário ficar mais lento que (1 + tolerância) ×
+baseline. O banco é criado em um diretório temporário e removido ao final.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from .gerador import PERFIS, criar_app, gerar_dados
+from .cenarios import montar_cenarios
+
+from functions.instrumentacao import medir_bloco
+
+
+def medir_cenario(cenario, repeticoes):
+	"""
+	Executa o cenário 'repeticoes' vezes (mais uma de aquecimento, descartada).
+
+	Returns:
+		dict: {'repeticoes', 'min_s', 'mediana_s', 'media_s', 'max_s', 'sql_consultas', 'json_loads'}
+	"""
+	tempos = []
+	medicao = None
+	for repeticao in range(repeticoes + 1):
+		if cenario.get('preparar'):
+			cenario['preparar']()
+		with medir_bloco() as medicao:
+			inicio = time.perf_counter()
+			cenario['executar']()
+			decorrido = time.perf_counter() - inicio
+		if repeticao > 0:
+			tempos.append(decorrido)
+	return {
+		'repeticoes': repeticoes,
+		'min_s': round(min(tempos), 6),
+		'mediana_s': round(statistics.median(tempos), 6),
+		'media_s': round(statistics.mean(tempos), 6),
+		'max_s': round(max(tempos), 6),
+		'sql_consultas': medicao['sql_consultas'],
+		'json_loads': medicao['json_loads']
+	}
+
+
+def comparar(relatorio, baseline, tolerancia):
+	"""
+	Compara as medianas com as do baseline.
+
+	Returns:
+		dict: {nome: {'baseline_s', 'atual_s', 'razao', 'status'}} com status
+		'regressao', 'melhoria' ou 'ok' (cenários ausentes em um dos lados são ignorados)
+	"""
+	comparacao = {}
+	for nome, atual in relatorio['resultados'].items():
+		anterior = baseline.get('resultados', {}).get(nome)
+		if not anterior or not anterior.get('mediana_s'):
+			continue
+		razao = atual['mediana_s'] / anterior['mediana_s']
+		if razao > 1 + tolerancia:
+			status = 'regressao'
+		elif razao < 1 / (1 + tolerancia):
+			status = 'melhoria'
+		else:
+			status = 'ok'
+		comparacao[nome] = {
+			'baseline_s': anterior['mediana_s'],
+			'atual_s': atual['mediana_s'],
+			'razao': round(razao, 3),
+			'status': status
+		}
+	return comparacao
+
+
+def _ambiente():
+	import numpy
+	import sqlalchemy
+	return {
+		'python': platform.python_version(),
+		'plataforma': platform.platform(),
+		'processador': platform.processor() or platform.machine(),
+		'cpus': os.cpu_count(),
+		'numpy': numpy.__version__,
+		'sqlalchemy': sqlalchemy.__version__
+	}
+
+
+def executar(args, caminho_db):
+	"""
+	Gera os dados em caminho_db e mede os cenários.
+
+	Returns:
+		dict: relatório (perfil, ambiente, dados gerados e resultados por cenário)
+	"""
+	app = criar_app(caminho_db)
+	with app.app_context():
+		inicio = time.perf_counter()
+		dados = gerar_dados(PERFIS[args.perfil], args.semente)
+		tempo_geracao = time.perf_counter() - inicio
+
+		relatorio = {
+			'gerado_em': datetime.now().isoformat(timespec='seconds'),
+			'perfil': args.perfil,
+			'config': PERFIS[args.perfil],
+			'semente': args.semente,
+			'ambiente': _ambiente(),
+			'dados': dict(dados, geracao_s=round(tempo_geracao, 3)),
+			'resultados': {}
+		}
+		for cenario in montar_cenarios(dados):
+			if args.filtro and args.filtro not in cenario['nome']:
+				continue
+			resultado = medir_cenario(cenario, args.repeticoes)
+			relatorio['resultados'][cenario['nome']] = resultado
+			print(f"{cenario['nome']}: {resultado['mediana_s'] * 1000:.1f} ms", file=sys.stderr)
+	return relatorio
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks dos fluxos principais do SGMRP')
+	parser.add_argument('--perfil', choices=sorted(PERFIS), default='pequeno')
+	parser.add_argument('--semente', type=int, default=42)
+	parser.add_argument('--repeticoes', type=int, default=5)
+	parser.add_argument('--filtro', default='', help='executa só os cenários cujo nome contém o texto')
+	parser.add_argument('--saida', default='', help='arquivo JSON do relatório (padrão: stdout)')
+	parser.add_argument('--baseline', default='', help='relatório anterior para comparação')
+	parser.add_argument('--tolerancia', type=float, default=0.2, help='aumento relativo aceito da mediana (0.2 = 20%%)')
+	args = parser.parse_args(argv)
+
+	# Sem logs nem prints dos fluxos medidos (a escrita distorce os tempos e o JSON em stdout)
+	logging.disable(logging.INFO)
+
+	diretorio = tempfile.mkdtemp(prefix='sgmrp_bench_')
+	try:
+		with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+			relatorio = executar(args, os.path.join(diretorio, 'dados.db'))
+	finally:
+		shutil.rmtree(diretorio, ignore_errors=True)
+
+	codigo = 0
+	if args.baseline:
+		with open(args.baseline, encoding='utf-8') as f:
+			baseline = json.load(f)
+		relatorio['comparacao'] = comparar(relatorio, baseline, args.tolerancia)
+		regressoes = [nome for nome, c in relatorio['comparacao'].items() if c['status'] == 'regressao']
+		for nome in regressoes:
+			c = relatorio['comparacao'][nome]
+			print(f"REGRESSÃO {nome}: {c['baseline_s'] * 1000:.1f} ms -> {c['atual_s'] * 1000:.1f} ms (x{c['razao']})", file=sys.stderr)
+		codigo = 1 if regressoes else 0
+
+	texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+	if args.saida:
+		with open(args.saida, 'w', encoding='utf-8') as f:
+			f.write(texto + '\n')
+	else:
+		print(texto)
+	return codigo
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Fluxos medidos pelos benchmarks.
+
+Cada cenário é um dict {'nome', 'executar', 'preparar'}: 'preparar' (opcional)
+roda antes de cada repetição, fora da medição (ex.: limpar o cache para medir a
+leitura fria); 'executar' é o trecho medido.
+"""
+import copy
+import random
+from datetime import date
+
+from functions.models import db, Lote, Unidade
+from functions.cache import limpar_cache
+from functions.helpers import (
+	carregar_lotes_para_dashboard, gerar_excel_exportacao,
+	gerar_excel_exportacao_multiplos_lotes, _carregar_mapas_dashboard
+)
+from functions.lotes import _load_lotes_data
+from functions.mapas import calcular_metricas_lotes, salvar_mapas_raw
+from functions.relatorios import buscar_dados_graficos, buscar_dados_gastos
+from functions.siisp import adicionar_siisp_em_mapa
+
+from .gerador import _entrada_mapa
+
+
+PERIODOS_RELATORIOS = ('dia', 'semana', 'mes', 'ano')
+MODOS_RELATORIOS = ('acumulado', 'unidade', 'lote')
+
+
+def _verificar(resultado):
+	# Falha explícita: um cenário que retorna erro mediria o caminho de erro
+	if isinstance(resultado, dict) and resultado.get('success') is False:
+		raise RuntimeError(resultado.get('error') or 'falha no cenário')
+	return resultado
+
+
+def montar_cenarios(dados):
+	"""
+	Monta os cenários para os dados gerados (ver gerador.gerar_dados).
+
+	Args:
+		dados: retorno de gerar_dados
+
+	Returns:
+		list: dicts {'nome', 'executar', 'preparar'}
+	"""
+	lotes_ativos = dados['lotes_ativos']
+	lote_exportacao = db.session.get(Lote, lotes_ativos[0])
+	unidades_principais = sorted({
+		u.nome for u in Unidade.query.filter(
+			Unidade.lote_id.in_(lotes_ativos), Unidade.unidade_principal_id.is_(None)
+		).all()
+	})
+	unidades_exportacao = [
+		u.nome for u in Unidade.query.filter_by(lote_id=lote_exportacao.id).order_by(Unidade.id).all()
+	]
+	fim = date.fromisoformat(dados['periodo'][1])
+	inicio_ano = date(fim.year, 1, 1).isoformat()
+	inicio_mes = date(fim.year, fim.month, 1).isoformat()
+
+	cenarios = [
+		{'nome': 'carregar_lotes_para_dashboard', 'preparar': limpar_cache,
+		 'executar': lambda: carregar_lotes_para_dashboard()},
+		{'nome': 'carregar_lotes_para_dashboard[cache]', 'preparar': None,
+		 'executar': lambda: carregar_lotes_para_dashboard()},
+	]
+
+	# Métricas: só o cálculo (lotes copiados a cada repetição, pois são alterados in-place)
+	entrada_metricas = {}
+
+	def preparar_metricas():
+		limpar_cache()
+		entrada_metricas['lotes'] = copy.deepcopy(_load_lotes_data())
+		entrada_metricas['mapas'] = _carregar_mapas_dashboard(incluir_series=False)
+
+	cenarios.append({
+		'nome': 'calcular_metricas_lotes', 'preparar': preparar_metricas,
+		'executar': lambda: calcular_metricas_lotes(entrada_metricas['lotes'], entrada_metricas['mapas'])
+	})
+
+	for periodo in PERIODOS_RELATORIOS:
+		for modo in MODOS_RELATORIOS:
+			cenarios.append({
+				'nome': f'buscar_dados_graficos[{periodo},{modo}]', 'preparar': limpar_cache,
+				'executar': (lambda p=periodo, m=modo: _verificar(
+					buscar_dados_graficos(lotes_ativos, unidades_principais, p, modo=m)
+				))
+			})
+			cenarios.append({
+				'nome': f'buscar_dados_gastos[{periodo},{modo}]', 'preparar': limpar_cache,
+				'executar': (lambda p=periodo, m=modo: _verificar(
+					buscar_dados_gastos(lotes_ativos, unidades_principais, p, modo=m)
+				))
+			})
+
+	cenarios.append({
+		'nome': 'gerar_excel_exportacao', 'preparar': limpar_cache,
+		'executar': lambda: _verificar(gerar_excel_exportacao(
+			lote_exportacao.id, unidades_exportacao, lote_exportacao.data_inicio, lote_exportacao.data_fim
+		))
+	})
+	cenarios.append({
+		'nome': 'gerar_excel_exportacao_multiplos_lotes', 'preparar': limpar_cache,
+		'executar': lambda: _verificar(gerar_excel_exportacao_multiplos_lotes(inicio_mes, fim.isoformat()))
+	})
+
+	# Gravação: atualiza sempre o mesmo mapa (upsert), então as repetições são equivalentes
+	rnd = random.Random(7)
+	unidade_gravacao = unidades_exportacao[0]
+	entrada_gravacao = _entrada_mapa(rnd, lote_exportacao.id, unidade_gravacao, fim.year, fim.month, 400)
+	cenarios.append({
+		'nome': 'salvar_mapas_raw', 'preparar': None,
+		'executar': lambda: _verificar(salvar_mapas_raw(copy.deepcopy(entrada_gravacao)))
+	})
+	payload_siisp = {
+		'lote_id': lote_exportacao.id, 'ano': fim.year, 'mes': fim.month, 'unidade': unidade_gravacao,
+		'dados_siisp': entrada_gravacao['dados_siisp']
+	}
+	cenarios.append({
+		'nome': 'adicionar_siisp_em_mapa', 'preparar': None,
+		'executar': lambda: _verificar(adicionar_siisp_em_mapa(dict(payload_siisp)))
+	})
+	cenarios.append({
+		'nome': 'buscar_dados_graficos[mes,acumulado,intervalo]', 'preparar': limpar_cache,
+		'executar': lambda: _verificar(buscar_dados_graficos(
+			lotes_ativos, unidades_principais, 'mes', inicio_ano, fim.isoformat(), modo='acumulado'
+		))
+	})
+	return cenarios
@@ -0,0 +1,177 @@
+"""
+Gerador determinístico de dados sintéticos para os benchmarks.
+
+Cria um app Flask apontando para um SQLite temporário e o preenche com:
+- cadeias de lotes (cada lote sucede o anterior; só o último fica ativo);
+- unidades principais e subunidades, copiadas para todos os lotes da cadeia;
+- um mapa por unidade e mês de vigência de cada lote, com as 8 refeições,
+  datas (DD/MM/YYYY) e a série SIISP.
+
+Os mapas são gravados pelo mesmo caminho da importação em lote
+(salvar_mapas_lote), que calcula os totais e a tabela mapa_dia.
+"""
+import calendar
+import json
+import os
+import random
+import sys
+from datetime import date
+
+from flask import Flask
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+	sys.path.insert(0, RAIZ)
+
+from functions.models import db, Lote, Unidade, MapaDia
+from functions.migracoes import executar_migracoes
+from functions.mapas import salvar_mapas_lote
+
+
+PERFIS = {
+	'pequeno': {'cadeias': 2, 'lotes_por_cadeia': 2, 'unidades': 4, 'subunidades': 1, 'meses_por_lote': 12},
+	'medio': {'cadeias': 4, 'lotes_por_cadeia': 3, 'unidades': 15, 'subunidades': 1, 'meses_por_lote': 12},
+	'grande': {'cadeias': 8, 'lotes_por_cadeia': 3, 'unidades': 40, 'subunidades': 2, 'meses_por_lote': 12},
+}
+
+ANO_INICIAL = 2020
+REFEICOES = ['cafe', 'almoco', 'lanche', 'jantar']
+TIPOS = ['interno', 'funcionario']
+CAMPOS_REFEICOES = [f'{refeicao}_{tipo}' for refeicao in REFEICOES for tipo in TIPOS]
+
+
+def criar_app(caminho_db):
+	"""
+	App Flask mínimo com o banco em caminho_db (tabelas e migrações aplicadas).
+	"""
+	app = Flask('benchmarks')
+	app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{caminho_db}'
+	app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+	db.init_app(app)
+	with app.app_context():
+		db.create_all()
+		executar_migracoes()
+	return app
+
+
+def _somar_meses(ano, mes, meses):
+	total = ano * 12 + (mes - 1) + meses
+	return total // 12, total % 12 + 1
+
+
+def _precos(rnd):
+	return {
+		refeicao: {tipo: round(rnd.uniform(2.0, 25.0), 2) for tipo in TIPOS}
+		for refeicao in REFEICOES
+	}
+
+
+def _entrada_mapa(rnd, lote_id, unidade, ano, mes, populacao):
+	dias = calendar.monthrange(ano, mes)[1]
+	entrada = {
+		'lote_id': lote_id, 'ano': ano, 'mes': mes, 'unidade': unidade,
+		'datas': [f'{dia:02d}/{mes:02d}/{ano}' for dia in range(1, dias + 1)],
+		'dados_siisp': [max(0, populacao + rnd.randint(-5, 5)) for _ in range(dias)]
+	}
+	for campo in CAMPOS_REFEICOES:
+		base = populacao if campo.endswith('interno') else max(1, populacao // 10)
+		entrada[campo] = [max(0, base + rnd.randint(-base // 10 - 1, base // 10 + 1)) for _ in range(dias)]
+	return entrada
+
+
+def gerar_dados(config, semente=42):
+	"""
+	Preenche o banco do app atual (dentro de app_context) com os dados do perfil.
+
+	Args:
+		config: dict como em PERFIS
+		semente: semente do gerador pseudoaleatório (mesma semente, mesmos dados)
+
+	Returns:
+		dict: {'lotes', 'lotes_ativos', 'unidades', 'mapas', 'linhas_diarias', 'periodo': (início, fim)}
+	"""
+	rnd = random.Random(semente)
+	lotes_ativos = []
+	total_lotes = 0
+	total_unidades = 0
+	total_mapas = 0
+	ultimo_dia = date(ANO_INICIAL, 1, 1)
+
+	for cadeia in range(config['cadeias']):
+		nomes_unidades = []
+		for u in range(config['unidades']):
+			principal = f'Unidade {cadeia + 1}.{u + 1}'
+			subunidades = [f'{principal} - Anexo {s + 1}' for s in range(config['subunidades'])]
+			nomes_unidades.append((principal, subunidades))
+		populacao = {nome: rnd.randint(30, 900) for principal, subs in nomes_unidades for nome in [principal] + subs}
+
+		predecessor_id = None
+		ano, mes = ANO_INICIAL, 1
+		for posicao in range(config['lotes_por_cadeia']):
+			ativo = posicao == config['lotes_por_cadeia'] - 1
+			ano_fim, mes_fim = _somar_meses(ano, mes, config['meses_por_lote'] - 1)
+			lote = Lote(
+				nome=f'Lote {cadeia + 1}.{posicao + 1}',
+				empresa=f'Empresa {cadeia % 3 + 1}',
+				numero_contrato=f'{cadeia + 1}{posicao + 1:02d}/{ano}',
+				numero=f'{cadeia + 1}{posicao + 1:02d}',
+				data_inicio=f'{ano:04d}-{mes:02d}-01',
+				data_fim=f'{ano_fim:04d}-{mes_fim:02d}-{calendar.monthrange(ano_fim, mes_fim)[1]:02d}',
+				valor_contratual=round(rnd.uniform(1e6, 5e7), 2),
+				precos=json.dumps(_precos(rnd)),
+				quantitativos='{}',
+				unidades='[]',
+				ativo=ativo,
+				status='ativo' if ativo else 'inativo',
+				lote_predecessor_id=predecessor_id
+			)
+			db.session.add(lote)
+			db.session.flush()
+
+			ids_unidades = []
+			for principal, subunidades in nomes_unidades:
+				unidade = Unidade(
+					nome=principal, lote_id=lote.id, ativo=True, quantitativos_unidade='{}',
+					valor_contratual_unidade=round(rnd.uniform(1e5, 2e6), 2), delegacia=rnd.random() < 0.2
+				)
+				db.session.add(unidade)
+				db.session.flush()
+				ids_unidades.append(unidade.id)
+				for nome_sub in subunidades:
+					sub = Unidade(
+						nome=nome_sub, lote_id=lote.id, ativo=True, quantitativos_unidade='{}',
+						valor_contratual_unidade=round(rnd.uniform(1e4, 2e5), 2), unidade_principal_id=unidade.id
+					)
+					db.session.add(sub)
+					db.session.flush()
+					ids_unidades.append(sub.id)
+			lote.unidades = json.dumps(ids_unidades)
+			db.session.commit()
+			total_lotes += 1
+			total_unidades += len(ids_unidades)
+			if ativo:
+				lotes_ativos.append(lote.id)
+
+			# Mapas de todos os meses de vigência, gravados em lote
+			entradas = []
+			for deslocamento in range(config['meses_por_lote']):
+				ano_mapa, mes_mapa = _somar_meses(ano, mes, deslocamento)
+				for nome, base in populacao.items():
+					entradas.append(_entrada_mapa(rnd, lote.id, nome, ano_mapa, mes_mapa, base))
+			resultado = salvar_mapas_lote(entradas)
+			if not resultado.get('success'):
+				raise RuntimeError(resultado.get('error'))
+			total_mapas += resultado.get('inseridos', 0)
+
+			ultimo_dia = max(ultimo_dia, date(ano_fim, mes_fim, calendar.monthrange(ano_fim, mes_fim)[1]))
+			predecessor_id = lote.id
+			ano, mes = _somar_meses(ano_fim, mes_fim, 1)
+
+	return {
+		'lotes': total_lotes,
+		'lotes_ativos': lotes_ativos,
+		'unidades': total_unidades,
+		'mapas': total_mapas,
+		'linhas_diarias': MapaDia.query.count(),
+		'periodo': (date(ANO_INICIAL, 1, 1).isoformat(), ultimo_dia.isoformat())
+	}
@@ -0,0 +1,305 @@
+"""
+Motor único de agregação dos gráficos e relatórios.
+
+Uma requisição declara a medida (refeições, gastos, SIISP ou desvio), o
+agrupamento (grupo de lotes, lote, empresa, unidade com subunidades agregadas na
+principal), o período e o modo acumulado. Os valores de cada mapa são empilhados
+em uma matriz (mapas × campos) e reduzidos com NumPy para (períodos × grupos × campos).
+Nos períodos diário e semanal (semana ISO) as linhas são os totais diários de
+carregar_totais_diarios e as chaves são calculadas vetorizadas a partir da data.
+Os endpoints de gráficos e as funções de relatorios.py apenas formatam o resultado.
+"""
+import numpy as np
+
+from .graficos import CAMPOS_REFEICOES, obter_indice_unidades
+from .linhagem import info_lote
+from .mapas import total_campo_mapa, desvio_campo_mapa, _atributo_mapa
+
+
+MEDIDAS = ('refeicoes', 'gastos', 'siisp', 'desvio')
+AGRUPAMENTOS = (None, 'lote_grupo', 'lote', 'lote_nome', 'empresa', 'unidade', 'unidade_nome')
+PERIODOS = ('dia', 'semana', 'mes', 'ano')
+PERIODOS_DIARIOS = ('dia', 'semana')
+
+
+# ----- Medidas -----
+def campos_medida(medida, campos=None):
+	"""
+	Retorna os campos somados pela medida (SIISP: 'dados_siisp'; demais: as 8 refeições).
+	"""
+	if campos:
+		return list(campos)
+	return ['dados_siisp'] if medida == 'siisp' else list(CAMPOS_REFEICOES)
+
+
+def colunas_medida(medida, campos=None):
+	"""
+	Retorna as colunas persistidas de Mapa lidas pela medida (total_<campo> ou desvio_<campo>).
+	"""
+	prefixo = 'desvio' if medida == 'desvio' else 'total'
+	return [f'{prefixo}_{campo}' for campo in campos_medida(medida, campos)]
+
+
+def preco_refeicao(precos, campo):
+	"""
+	Preço unitário de uma refeição ('cafe_interno' -> precos['cafe']['interno'] ou
+	precos['cafe_interno']), aceitando strings com vírgula ou ponto.
+
+	Returns:
+		float (0.0 se ausente ou inválido)
+	"""
+	if not isinstance(precos, dict):
+		return 0.0
+	refeicao, _, tipo = campo.partition('_')
+	if refeicao and tipo and isinstance(precos.get(refeicao), dict):
+		valor = precos[refeicao].get(tipo, 0)
+	else:
+		valor = precos.get(campo, 0)
+	try:
+		return float(str(valor).replace(',', '.'))
+	except (ValueError, TypeError):
+		return 0.0
+
+
+def _matriz_valores(mapas, medida, campos):
+	# Empilha os totais de cada mapa (mapas × campos); dicts carregados por
+	# carregar_totais_mapas já trazem as colunas, instâncias de Mapa usam o fallback das séries
+	ler = desvio_campo_mapa if medida == 'desvio' else total_campo_mapa
+	linhas = [[ler(mapa, campo) or 0 for campo in campos] for mapa in mapas]
+	if not linhas:
+		return np.zeros((0, len(campos)), dtype=np.int64)
+	if all(isinstance(v, int) for linha in linhas for v in linha):
+		return np.array(linhas, dtype=np.int64)
+	return np.array(linhas, dtype=np.float64)
+
+
+def _matriz_precos(lote_ids, campos, precos_por_lote):
+	# Vetor de preços montado uma vez por lote e repetido para os mapas do lote
+	vetores = {}
+	for lote_id in set(lote_ids):
+		precos = (precos_por_lote or {}).get(lote_id, {})
+		vetores[lote_id] = [preco_refeicao(precos, campo) for campo in campos]
+	if not lote_ids:
+		return np.zeros((0, len(campos)), dtype=np.float64)
+	return np.array([vetores[lote_id] for lote_id in lote_ids], dtype=np.float64)
+
+
+# ----- Chaves -----
+def chave_periodo(ano, mes, periodo='mes'):
+	"""
+	Chave do período de um mapa ('mes': 'YYYY-MM'; 'ano': 'YYYY').
+	"""
+	if periodo == 'ano':
+		return str(ano)
+	return f"{ano}-{mes:02d}"
+
+
+def chaves_periodo_datas(datas, periodo='dia'):
+	"""
+	Chaves de período de uma lista de datas 'YYYY-MM-DD', calculadas em lote
+	('dia': 'YYYY-MM-DD'; 'semana': semana ISO 'YYYY-Www', que ordena como texto).
+
+	Returns:
+		list: uma chave por data
+	"""
+	if not datas:
+		return []
+	dias = np.array(datas, dtype='datetime64[D]')
+	if periodo == 'dia':
+		codigos = dias.astype(np.int64)
+		unicos, inverso = np.unique(codigos, return_inverse=True)
+		rotulos = np.datetime_as_string(unicos.astype('datetime64[D]'), unit='D').tolist()
+	else:
+		# Semana ISO: a quinta-feira da semana define o ano; 1970-01-01 foi quinta (dia 3, segunda = 0)
+		dia_semana = (dias.astype(np.int64) + 3) % 7
+		quinta = dias - dia_semana + 3
+		inicio_ano = quinta.astype('datetime64[Y]')
+		semana = (quinta - inicio_ano.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+		codigos = (inicio_ano.astype(np.int64) + 1970) * 100 + semana
+		unicos, inverso = np.unique(codigos, return_inverse=True)
+		rotulos = [f"{codigo // 100}-W{codigo % 100:02d}" for codigo in unicos.tolist()]
+	return [rotulos[pos] for pos in inverso.ravel().tolist()]
+
+
+def _funcao_grupo(agrupar_por, indice_unidades):
+	if agrupar_por is None:
+		return lambda mapa: 'total'
+	if agrupar_por == 'lote_grupo':
+		return lambda mapa: _atributo_mapa(mapa, 'lote_grupo')
+	if agrupar_por == 'lote':
+		return lambda mapa: _atributo_mapa(mapa, 'lote_id')
+	if agrupar_por == 'lote_nome':
+		def nome_lote(mapa):
+			lote_id = _atributo_mapa(mapa, 'lote_id')
+			info = info_lote(lote_id)
+			return info['nome'] if info else f"Lote {lote_id}"
+		return nome_lote
+	if agrupar_por == 'empresa':
+		return lambda mapa: (info_lote(_atributo_mapa(mapa, 'lote_id')) or {}).get('empresa')
+	if agrupar_por == 'unidade':
+		# ID da unidade principal (subunidades agregadas); nome vazio ou desconhecido: sem grupo
+		def id_unidade(mapa):
+			nome = _atributo_mapa(mapa, 'unidade')
+			if not nome:
+				return None
+			unidade_id = indice_unidades['nome_para_id'].get(nome)
+			if unidade_id and unidade_id in indice_unidades['subunidade_para_principal']:
+				unidade_id = indice_unidades['subunidade_para_principal'][unidade_id]
+			return unidade_id
+		return id_unidade
+	if agrupar_por == 'unidade_nome':
+		# Nome da unidade principal (nome desconhecido: o próprio nome do mapa)
+		def nome_unidade(mapa):
+			nome = _atributo_mapa(mapa, 'unidade')
+			unidade_id = indice_unidades['nome_para_id'].get(nome)
+			principal_id = indice_unidades['subunidade_para_principal'].get(unidade_id)
+			if principal_id in indice_unidades['info']:
+				return indice_unidades['info'][principal_id]['nome']
+			return nome
+		return nome_unidade
+	raise ValueError(f'Agrupamento inválido: {agrupar_por}')
+
+
+# ----- Agregação -----
+def agregar_mapas(mapas, medida='refeicoes', agrupar_por=None, periodo='mes', campos=None,
+                  precos_por_lote=None, acumulado=False, indice_unidades=None):
+	"""
+	Agrega os mapas por período × grupo × campo.
+
+	Args:
+		mapas: dicts de carregar_totais_mapas/carregar_mapas_graficos ou instâncias de Mapa
+		medida: 'refeicoes', 'gastos' (quantidade × preço do lote do mapa), 'siisp' ou 'desvio'
+		agrupar_por: None (total), 'lote_grupo', 'lote', 'lote_nome', 'empresa', 'unidade' ou 'unidade_nome'
+		periodo: 'dia', 'semana' (linhas de carregar_totais_diarios), 'mes' ou 'ano' (outros valores: 'mes')
+		campos: campos somados (padrão: ver campos_medida)
+		precos_por_lote: {lote_id: precos} (medida 'gastos')
+		acumulado: soma acumulada ao longo dos períodos
+		indice_unidades: mapeamento de obter_indice_unidades() (padrão: o do cache)
+
+	Returns:
+		dict: {
+			'periodos': [chaves ordenadas], 'grupos': [chaves na ordem em que aparecem],
+			'campos': [...], 'valores': ndarray (períodos × grupos × campos),
+			'presente': ndarray bool (períodos × grupos) indicando grupos com mapas no período
+		}
+	"""
+	if medida not in MEDIDAS:
+		raise ValueError(f'Medida inválida: {medida}')
+	if periodo not in PERIODOS:
+		periodo = 'mes'
+	if periodo in PERIODOS_DIARIOS and medida == 'desvio':
+		raise ValueError('Medida desvio não disponível por dia ou semana')
+	campos = campos_medida(medida, campos)
+	if agrupar_por in ('unidade', 'unidade_nome') and indice_unidades is None:
+		indice_unidades = obter_indice_unidades()
+	grupo_de = _funcao_grupo(agrupar_por, indice_unidades)
+
+	# Linhas sem data (períodos diários) ou sem ano/mês são ignoradas; sem grupo contam só para os períodos
+	if periodo in PERIODOS_DIARIOS:
+		mapas = [m for m in mapas if _atributo_mapa(m, 'data')]
+		chaves_periodo = chaves_periodo_datas([_atributo_mapa(m, 'data') for m in mapas], periodo)
+	else:
+		mapas = [m for m in mapas if _atributo_mapa(m, 'ano') and _atributo_mapa(m, 'mes')]
+		chaves_periodo = [chave_periodo(_atributo_mapa(m, 'ano'), _atributo_mapa(m, 'mes'), periodo) for m in mapas]
+	periodos = sorted(set(chaves_periodo))
+	posicao_periodo = {chave: pos for pos, chave in enumerate(periodos)}
+
+	grupos = []
+	posicao_grupo = {}
+	indices_periodo = []
+	indices_grupo = []
+	validos = []
+	# O grupo depende só do lote e da unidade: resolvido uma vez por combinação
+	grupo_por_chave = {}
+	for pos, mapa in enumerate(mapas):
+		chave_grupo = (_atributo_mapa(mapa, 'lote_id'), _atributo_mapa(mapa, 'lote_grupo'), _atributo_mapa(mapa, 'unidade'))
+		if chave_grupo not in grupo_por_chave:
+			grupo_por_chave[chave_grupo] = grupo_de(mapa)
+		grupo = grupo_por_chave[chave_grupo]
+		if grupo is None or grupo == '' or grupo == 0:
+			continue
+		if grupo not in posicao_grupo:
+			posicao_grupo[grupo] = len(grupos)
+			grupos.append(grupo)
+		indices_periodo.append(posicao_periodo[chaves_periodo[pos]])
+		indices_grupo.append(posicao_grupo[grupo])
+		validos.append(mapa)
+
+	valores_mapas = _matriz_valores(validos, medida, campos)
+	if medida == 'gastos':
+		lote_ids = [_atributo_mapa(m, 'lote_id') for m in validos]
+		valores_mapas = valores_mapas * _matriz_precos(lote_ids, campos, precos_por_lote)
+
+	valores = np.zeros((len(periodos), len(grupos), len(campos)), dtype=valores_mapas.dtype)
+	presente = np.zeros((len(periodos), len(grupos)), dtype=bool)
+	if validos:
+		indices_periodo = np.array(indices_periodo, dtype=np.intp)
+		indices_grupo = np.array(indices_grupo, dtype=np.intp)
+		np.add.at(valores, (indices_periodo, indices_grupo), valores_mapas)
+		presente[indices_periodo, indices_grupo] = True
+	if acumulado:
+		valores = np.cumsum(valores, axis=0)
+
+	return {
+		'periodos': periodos,
+		'grupos': grupos,
+		'campos': campos,
+		'valores': valores,
+		'presente': presente
+	}
+
+
+def serie_grupo(agregado, grupo, campos=None, nulo_sem_dados=False):
+	"""
+	Série de um grupo ao longo dos períodos (soma dos campos informados; padrão: todos).
+	Grupos ausentes do agregado resultam em zeros.
+
+	Args:
+		nulo_sem_dados: usa None nos períodos em que o grupo não tem mapas
+
+	Returns:
+		list: valores Python (int ou float), um por período
+	"""
+	if grupo not in agregado['grupos']:
+		return [None if nulo_sem_dados else 0] * len(agregado['periodos'])
+	posicao = agregado['grupos'].index(grupo)
+	valores = agregado['valores'][:, posicao, :]
+	if campos is not None:
+		valores = valores[:, [agregado['campos'].index(c) for c in campos]]
+	serie = valores.sum(axis=1).tolist()
+	if nulo_sem_dados:
+		serie = [v if agregado['presente'][p, posicao] else None for p, v in enumerate(serie)]
+	return serie
+
+
+def serie_total(agregado):
+	"""
+	Série somando todos os grupos e campos, uma por período.
+	"""
+	return agregado['valores'].sum(axis=(1, 2)).tolist()
+
+
+def series_por_campo(agregado):
+	"""
+	Séries somando todos os grupos, por campo.
+
+	Returns:
+		dict: {campo: [valor por período]}
+	"""
+	totais = agregado['valores'].sum(axis=1)
+	return {campo: totais[:, pos].tolist() for pos, campo in enumerate(agregado['campos'])}
+
+
+def valores_por_periodo_grupo(agregado):
+	"""
+	Valores por campo, período e grupo, só com os grupos presentes no período.
+
+	Returns:
+		dict: {campo: {periodo: {grupo: valor}}}
+	"""
+	resultado = {campo: {} for campo in agregado['campos']}
+	for p, periodo in enumerate(agregado['periodos']):
+		grupos = [(g, grupo) for g, grupo in enumerate(agregado['grupos']) if agregado['presente'][p, g]]
+		for c, campo in enumerate(agregado['campos']):
+			resultado[campo][periodo] = {grupo: agregado['valores'][p, g, c].item() for g, grupo in grupos}
+	return resultado
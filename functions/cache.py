@@ -0,0 +1,158 @@
+"""
+Cache em memória (por processo) dos dados calculados para as páginas do dashboard.
+
+Cada grupo de dados tem uma versão incrementada pelas rotinas de escrita:
+- 'mapas': salvar mapas, SIISP, excluir mapa (as entradas em cache somam todos os
+  lotes, então qualquer gravação em mapas recalcula todas)
+- 'lotes': metadados dos lotes (criar, editar, excluir)
+- 'unidades': cadastro de unidades
+Uma entrada guarda as versões com que foi calculada e é recalculada quando alguma muda.
+
+As versões ficam também no banco (tabela versoes_dados), incrementadas a cada
+gravação e lidas antes de cada consulta ao cache: uma gravação feita em um processo
+do servidor (ex.: outro worker do gunicorn) invalida o cache de todos os processos.
+"""
+import copy
+import logging
+import threading
+
+from flask import has_app_context
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import db, VersaoDados
+
+
+logger = logging.getLogger(__name__)
+
+GRUPOS = ('mapas', 'lotes', 'unidades')
+
+_lock = threading.RLock()
+_versoes = {grupo: 0 for grupo in GRUPOS}
+_entradas = {}  # chave -> (versões, valor)
+_contadores = {'hits': 0, 'misses': 0, 'invalidacoes': 0}
+
+
+# ----- Versões compartilhadas (banco) -----
+def _versoes_banco():
+	# Sem app context ou sem a tabela, valem só as versões locais
+	if not has_app_context():
+		return {}
+	try:
+		return dict(db.session.query(VersaoDados.grupo, VersaoDados.versao).all())
+	except SQLAlchemyError as e:
+		logger.warning("Versões do cache indisponíveis no banco: %s", e)
+		return {}
+
+
+def _incrementar_banco(grupo):
+	# Chamada depois do commit de quem grava: a transação é só a do incremento
+	if not has_app_context():
+		return
+	try:
+		db.session.execute(
+			sqlite_insert(VersaoDados).values(grupo=grupo, versao=1).on_conflict_do_update(
+				index_elements=['grupo'], set_={'versao': VersaoDados.versao + 1}
+			)
+		)
+		db.session.commit()
+	except SQLAlchemyError as e:
+		db.session.rollback()
+		logger.warning("Não foi possível incrementar a versão '%s' no banco: %s", grupo, e)
+
+
+# ----- Invalidação -----
+def _incrementar(grupo):
+	with _lock:
+		_versoes[grupo] += 1
+		_contadores['invalidacoes'] += 1
+	_incrementar_banco(grupo)
+
+
+def invalidar_mapas():
+	# Dados derivados dos mapas (totais, métricas e séries de todos os lotes)
+	_incrementar('mapas')
+
+
+def invalidar_lotes():
+	# Metadados dos lotes (nome, preços, predecessor, datas, status...)
+	_incrementar('lotes')
+
+
+def invalidar_unidades():
+	_incrementar('unidades')
+
+
+# ----- Consulta -----
+def versao_dados(grupos=GRUPOS):
+	"""
+	Retorna a versão atual dos grupos informados (tupla comparável): para cada
+	grupo, a versão local e a do banco.
+	"""
+	banco = _versoes_banco()
+	with _lock:
+		return _combinar_versoes(grupos, banco)
+
+
+def _combinar_versoes(grupos, banco):
+	return tuple((_versoes[grupo], banco.get(grupo, 0)) for grupo in grupos)
+
+
+def obter_ou_calcular(chave, calcular, grupos=GRUPOS, copiar=copy.deepcopy):
+	"""
+	Retorna o valor em cache para a chave ou o calcula, se as versões mudaram.
+
+	Args:
+		chave: identificador da entrada (hashable)
+		calcular: função sem argumentos que produz o valor
+		grupos: grupos de dados dos quais o valor depende
+		copiar: função aplicada ao valor devolvido (os chamadores podem alterá-lo);
+		        None devolve o próprio objeto em cache
+
+	Returns:
+		valor calculado ou em cache
+	"""
+	versao = versao_dados(grupos)
+	with _lock:
+		entrada = _entradas.get(chave)
+		if entrada is not None and entrada[0] == versao:
+			_contadores['hits'] += 1
+			valor = entrada[1]
+			return copiar(valor) if copiar else valor
+		_contadores['misses'] += 1
+
+	valor = calcular()
+
+	# Só guarda se nenhuma escrita aconteceu durante o cálculo
+	banco = _versoes_banco()
+	with _lock:
+		if _combinar_versoes(grupos, banco) == versao:
+			_entradas[chave] = (versao, valor)
+	return copiar(valor) if copiar else valor
+
+
+def estatisticas_cache():
+	"""
+	Retorna os contadores do cache.
+
+	Returns:
+		dict: {'hits', 'misses', 'invalidacoes', 'taxa_acerto', 'entradas', 'versoes', 'versoes_banco'}
+	"""
+	banco = _versoes_banco()
+	with _lock:
+		consultas = _contadores['hits'] + _contadores['misses']
+		return {
+			'hits': _contadores['hits'],
+			'misses': _contadores['misses'],
+			'invalidacoes': _contadores['invalidacoes'],
+			'taxa_acerto': round(_contadores['hits'] / consultas, 4) if consultas else 0.0,
+			'entradas': len(_entradas),
+			'versoes': dict(_versoes),
+			'versoes_banco': {grupo: banco.get(grupo, 0) for grupo in GRUPOS}
+		}
+
+
+def limpar_cache():
+	# Remove todas as entradas (as versões e os contadores são mantidos)
+	with _lock:
+		_entradas.clear()
@@ -0,0 +1,295 @@
+"""
+Cache em disco dos arquivos Excel exportados, endereçado pelo conteúdo.
+
+A chave de uma exportação é o hash de:
+- parâmetros (lote ou "todos os lotes", unidades, período);
+- IDs dos lotes envolvidos (com os predecessores, cujos mapas entram na exportação);
+- versão dos dados: por lote, quantidade, maior ID e MAX(atualizado_em) dos mapas,
+  mais as linhas dos lotes (preços e metadados) e das unidades;
+- hash do arquivo modelo.xlsx.
+
+Qualquer gravação que mude o arquivo gerado muda a chave, então uma entrada
+nunca precisa ser invalidada: as antigas deixam de ser usadas e saem pela
+política LRU (por tamanho total, pela data de modificação, renovada a cada
+acerto). A chave também serve de ETag no download.
+
+Configuração (variável de ambiente):
+- SGMRP_CACHE_EXPORTACOES_MB: tamanho máximo do cache em MB (padrão: 256; 0 = desativado)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import func
+
+from .models import db, Lote, Unidade, Mapa
+from .linhagem import expandir_lotes_com_predecessores
+
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_CACHE = os.path.join(BASE_DIR, '..', 'dados', 'cache_exportacoes')
+CAMINHO_MODELO = os.path.join(BASE_DIR, '..', 'dados', 'modelo.xlsx')
+
+# Muda quando o layout gerado muda sem mudança de dados/modelo (invalida o cache antigo)
+VERSAO_FORMATO = 1
+
+try:
+	LIMITE_MB = int(os.environ.get('SGMRP_CACHE_EXPORTACOES_MB', 256))
+except ValueError:
+	LIMITE_MB = 256
+
+# Segundos até um arquivo sem par (ou temporário) ser considerado abandonado
+PRAZO_ARQUIVOS_SEM_PAR = 300
+
+_lock = threading.Lock()
+_hash_modelo = {}  # (mtime_ns, tamanho) -> sha256 do modelo
+
+
+# ----- Parâmetros -----
+def normalizar_parametros_exportacao(dados):
+	"""
+	Valida e normaliza os parâmetros de uma exportação (os mesmos de /exportar-tabela
+	e /exportar-dashboard).
+
+	Args:
+		dados: dict com lote_id, data_inicio, data_fim, unidades (lista ou texto
+			separado por vírgulas) e exportar_todos_lotes
+
+	Returns:
+		dict: {'success': True, 'parametros': {...}} ou {'success': False, 'error': ...}
+	"""
+	exportar_todos = str(dados.get('exportar_todos_lotes', 'false')).lower() in ('true', '1')
+	data_inicio = dados.get('data_inicio') or None
+	data_fim = dados.get('data_fim') or None
+
+	if exportar_todos:
+		if not data_inicio or not data_fim:
+			return {'success': False, 'error': 'data_inicio e data_fim são obrigatórios'}
+		return {'success': True, 'parametros': {
+			'exportar_todos_lotes': True, 'data_inicio': data_inicio, 'data_fim': data_fim
+		}}
+
+	try:
+		lote_id = int(dados.get('lote_id'))
+	except (TypeError, ValueError):
+		return {'success': False, 'error': 'lote_id é obrigatório'}
+
+	unidades = dados.get('unidades') or []
+	if isinstance(unidades, str):
+		unidades = unidades.split(',')
+	return {'success': True, 'parametros': {
+		'exportar_todos_lotes': False, 'lote_id': lote_id,
+		'unidades': [str(u) for u in unidades if u],
+		'data_inicio': data_inicio, 'data_fim': data_fim
+	}}
+
+
+# ----- Chave -----
+def _hash_arquivo_modelo():
+	# Relido só quando o arquivo muda (mtime/tamanho)
+	try:
+		info = os.stat(CAMINHO_MODELO)
+	except OSError:
+		return None
+	assinatura = (info.st_mtime_ns, info.st_size)
+	with _lock:
+		if assinatura not in _hash_modelo:
+			with open(CAMINHO_MODELO, 'rb') as f:
+				_hash_modelo.clear()
+				_hash_modelo[assinatura] = hashlib.sha256(f.read()).hexdigest()
+		return _hash_modelo[assinatura]
+
+
+def _lotes_envolvidos(parametros):
+	if parametros['exportar_todos_lotes']:
+		ativos = [lote_id for lote_id, ativo in db.session.query(Lote.id, Lote.ativo).order_by(Lote.id) if ativo is not False]
+	else:
+		ativos = [parametros['lote_id']]
+	return ativos, sorted(expandir_lotes_com_predecessores(ativos))
+
+
+def _versao_dados(lote_ids):
+	"""
+	Hash do estado dos lotes, unidades e mapas que entram na exportação.
+	"""
+	mapas = db.session.query(
+		Mapa.lote_id, func.count(Mapa.id), func.max(Mapa.id), func.max(Mapa.atualizado_em)
+	).filter(Mapa.lote_id.in_(lote_ids)).group_by(Mapa.lote_id).order_by(Mapa.lote_id).all()
+	lotes = db.session.query(*Lote.__table__.columns).filter(Lote.id.in_(lote_ids)).order_by(Lote.id).all()
+	unidades = db.session.query(*Unidade.__table__.columns).filter(
+		Unidade.lote_id.in_(lote_ids)
+	).order_by(Unidade.id).all()
+	conteudo = json.dumps(
+		[[list(linha) for linha in consulta] for consulta in (mapas, lotes, unidades)],
+		default=str, ensure_ascii=False
+	)
+	return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def chave_exportacao(parametros):
+	"""
+	Chave (sha256 hex) do arquivo que a exportação geraria agora; usada também como ETag.
+
+	Args:
+		parametros: retorno de normalizar_parametros_exportacao ('parametros')
+
+	Returns:
+		str
+	"""
+	ativos, envolvidos = _lotes_envolvidos(parametros)
+	conteudo = json.dumps({
+		'formato': VERSAO_FORMATO,
+		'parametros': parametros,
+		'lotes': ativos,
+		'envolvidos': envolvidos,
+		'dados': _versao_dados(envolvidos),
+		'modelo': _hash_arquivo_modelo()
+	}, sort_keys=True, default=str)
+	return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+# ----- Armazenamento -----
+def _caminhos(chave):
+	base = os.path.join(DIRETORIO_CACHE, chave)
+	return base + '.xlsx', base + '.json'
+
+
+def buscar_exportacao(chave):
+	"""
+	Arquivo em cache para a chave (renova a posição na fila LRU).
+
+	Returns:
+		dict ou None: {'caminho', 'filename'}
+	"""
+	caminho, caminho_meta = _caminhos(chave)
+	try:
+		with open(caminho_meta, encoding='utf-8') as f:
+			filename = json.load(f)['filename']
+		os.utime(caminho)
+	except (OSError, ValueError, KeyError):
+		return None
+	return {'caminho': caminho, 'filename': filename}
+
+
+def _liberar_espaco(manter):
+	"""
+	Remove as exportações menos usadas (mtime mais antigo do .xlsx) até caber no
+	limite, sempre o .xlsx junto com o .json. Remove também os arquivos sem par
+	(.json sem .xlsx, .xlsx sem .json) e temporários abandonados, depois de um
+	prazo que evita apagar os de uma gravação em andamento.
+	"""
+	limite = LIMITE_MB * 1024 * 1024
+	abandonado = time.time() - PRAZO_ARQUIVOS_SEM_PAR
+	entradas = {}  # chave -> {extensão: (mtime, tamanho)}
+	for nome in os.listdir(DIRETORIO_CACHE):
+		try:
+			info = os.stat(os.path.join(DIRETORIO_CACHE, nome))
+		except OSError:
+			continue
+		chave, extensao = os.path.splitext(nome)
+		if extensao in ('.xlsx', '.json') and '.' not in chave:
+			entradas.setdefault(chave, {})[extensao] = (info.st_mtime, info.st_size)
+		elif info.st_mtime < abandonado:
+			_remover(os.path.join(DIRETORIO_CACHE, nome))
+
+	completas = []
+	for chave, arquivos in entradas.items():
+		if len(arquivos) == 2:
+			completas.append((arquivos['.xlsx'][0], sum(tamanho for _, tamanho in arquivos.values()), chave))
+		elif chave != manter and max(mtime for mtime, _ in arquivos.values()) < abandonado:
+			for caminho in _caminhos(chave):
+				_remover(caminho)
+			logger.debug("Exportação %s incompleta removida do cache", chave)
+
+	total = sum(tamanho for _, tamanho, _ in completas)
+	for _, tamanho, chave in sorted(completas):
+		if total <= limite:
+			break
+		if chave == manter:
+			continue
+		for caminho in _caminhos(chave):
+			_remover(caminho)
+		total -= tamanho
+		logger.debug("Exportação %s removida do cache", chave)
+
+
+def _remover(caminho):
+	try:
+		os.remove(caminho)
+	except OSError:
+		pass
+
+
+def armazenar_exportacao(chave, output, filename):
+	"""
+	Grava o arquivo gerado no cache e aplica o limite de tamanho.
+
+	Returns:
+		str ou None: caminho do arquivo (None se o cache está desativado ou a gravação falhou)
+	"""
+	if LIMITE_MB <= 0:
+		return None
+	caminho, caminho_meta = _caminhos(chave)
+	try:
+		os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+		# Metadados antes do arquivo: buscar_exportacao só acerta com os dois gravados
+		for destino, conteudo in (
+			(caminho_meta, json.dumps({'filename': filename}).encode('utf-8')),
+			(caminho, output.getbuffer())
+		):
+			temporario = f'{destino}.{threading.get_ident()}.tmp'
+			with open(temporario, 'wb') as f:
+				f.write(conteudo)
+			os.replace(temporario, destino)
+		with _lock:
+			_liberar_espaco(chave)
+	except OSError as e:
+		logger.warning("Não foi possível gravar a exportação no cache: %s", e)
+		return None
+	return caminho
+
+
+# ----- Exportação -----
+def obter_exportacao(parametros, chave=None, progresso=None):
+	"""
+	Arquivo da exportação: do cache, se existir, ou gerado (e guardado no cache).
+
+	Args:
+		parametros: retorno de normalizar_parametros_exportacao ('parametros')
+		chave: chave_exportacao(parametros), se já calculada
+		progresso: função opcional repassada à geração (ver tarefas.py)
+
+	Returns:
+		dict: {'success': True, 'chave', 'filename', 'caminho' ou 'output', 'origem': 'cache'|'gerada'}
+		ou o retorno de erro da geração
+	"""
+	from .helpers import gerar_excel_exportacao, gerar_excel_exportacao_multiplos_lotes
+
+	chave = chave or chave_exportacao(parametros)
+	encontrado = buscar_exportacao(chave) if LIMITE_MB > 0 else None
+	if encontrado:
+		logger.info("Exportação em cache: %s", encontrado['filename'])
+		return dict(encontrado, success=True, chave=chave, origem='cache')
+
+	if parametros['exportar_todos_lotes']:
+		resultado = gerar_excel_exportacao_multiplos_lotes(
+			parametros['data_inicio'], parametros['data_fim'], progresso=progresso
+		)
+	else:
+		resultado = gerar_excel_exportacao(
+			parametros['lote_id'], parametros['unidades'],
+			parametros['data_inicio'], parametros['data_fim'], progresso=progresso
+		)
+	if not resultado.get('success'):
+		return resultado
+
+	caminho = armazenar_exportacao(chave, resultado['output'], resultado['filename'])
+	resultado['output'].seek(0)
+	if caminho:
+		return {'success': True, 'chave': chave, 'filename': resultado['filename'], 'caminho': caminho, 'origem': 'gerada'}
+	return dict(resultado, chave=chave, origem='gerada')
@@ -0,0 +1,256 @@
+"""
+Montagem das abas de cada lote na exportação de múltiplos lotes, em série ou
+em um pool de processos.
+
+No modo paralelo, cada processo do pool abre a própria conexão, somente leitura,
+com o banco (um app Flask mínimo com a mesma URI) e lê o modelo uma vez (relido
+só se o arquivo mudar). Para cada lote, ele monta as abas em memória
+(ColecaoPlanilhas) e devolve as Planilhas ao processo principal, que as recebe
+na ordem dos lotes: o arquivo gerado é o mesmo da execução serial.
+
+O pool é único no processo do servidor, criado no primeiro uso e reaproveitado
+pelas exportações seguintes. Os processos são iniciados com 'forkserver' (ou
+'spawn', onde não existe): não herdam a memória do servidor, que tem várias
+threads, nem locks que outra thread segurava (cache, logging, registro de
+modelos). Como em todo pool 'spawn', o módulo principal é importado de novo em
+cada processo do pool: o código de inicialização dele deve ficar protegido por
+if __name__ == '__main__' (como o app.run de main.py).
+
+Configuração (variáveis de ambiente):
+- SGMRP_EXPORTACAO_PROCESSOS: número de processos (padrão: núcleos disponíveis,
+  no máximo 4; 0 ou 1 = serial). Sem a variável, as exportações feitas dentro de
+  uma requisição (download direto) são montadas em série e só as tarefas em
+  segundo plano (tarefas.py) usam o pool.
+- SGMRP_EXPORTACAO_MEMORIA_MB: limite de memória virtual de cada processo, em MB
+  (padrão: 0 = sem limite; só em sistemas POSIX)
+
+Em série ficam: banco SQLite em memória, exportação com um único lote ou um único
+processo. Se o pool falhar (processo encerrado, falta de memória, erro ao criar os
+processos), ele é descartado (o próximo uso cria outro) e os lotes que faltam são
+montados em série no processo principal.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Flask, current_app, has_request_context
+
+
+logger = logging.getLogger(__name__)
+
+
+def _inteiro_env(nome, padrao):
+	try:
+		return int(os.environ.get(nome, padrao))
+	except (TypeError, ValueError):
+		logger.warning("Valor inválido em %s; usando %s", nome, padrao)
+		return padrao
+
+
+def _nucleos_disponiveis():
+	if hasattr(os, 'sched_getaffinity'):
+		return len(os.sched_getaffinity(0))
+	return os.cpu_count() or 1
+
+
+PROCESSOS_PADRAO_MAXIMO = 4
+PROCESSOS_CONFIGURADOS = 'SGMRP_EXPORTACAO_PROCESSOS' in os.environ
+PROCESSOS = _inteiro_env('SGMRP_EXPORTACAO_PROCESSOS', min(_nucleos_disponiveis(), PROCESSOS_PADRAO_MAXIMO))
+MEMORIA_MB = _inteiro_env('SGMRP_EXPORTACAO_MEMORIA_MB', 0)
+
+METODO_INICIO = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_lock_pool = threading.Lock()
+_pool = None  # (configuração (uri, processos, memória), ProcessPoolExecutor)
+
+
+def uri_somente_leitura(uri):
+	"""
+	URI equivalente com acesso somente leitura.
+
+	SQLite em arquivo é aberto com mode=ro; outros bancos mantêm a URI.
+
+	Returns:
+		str ou None: None para SQLite em memória, que não é visível a outros processos
+	"""
+	if not uri.startswith('sqlite'):
+		return uri
+	caminho = uri.split(':///', 1)[1] if ':///' in uri else ''
+	if not caminho or caminho.startswith(':memory:') or 'mode=memory' in caminho:
+		return None
+	if caminho.startswith('file:'):
+		return uri if 'mode=ro' in caminho else uri + ('&' if '?' in caminho else '?') + 'mode=ro'
+	return f'sqlite:///file:{caminho}?mode=ro&uri=true'
+
+
+def _limitar_memoria(memoria_mb):
+	if not memoria_mb:
+		return
+	try:
+		import resource
+	except ImportError:
+		return
+	limite = memoria_mb * 1024 * 1024
+	resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+
+
+def _iniciar_processo(uri, memoria_mb):
+	"""
+	Inicializador do pool: limite de memória e app com conexão própria.
+	"""
+	from .models import db
+
+	_limitar_memoria(memoria_mb)
+	app = Flask(__name__)
+	app.config['SQLALCHEMY_DATABASE_URI'] = uri
+	app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+	db.init_app(app)
+	app.app_context().push()
+
+
+def _montar_lote(lote_id, data_inicio, data_fim, caminho_modelo):
+	"""
+	Tarefa do pool: monta as abas de um lote.
+
+	Returns:
+		tuple: (resultado, planilhas, estilos criados fora do modelo)
+	"""
+	from .helpers import _montar_planilhas_lote
+	from .planilhas import ColecaoPlanilhas, obter_modelo
+
+	# Cópia de trabalho do modelo já lido neste processo
+	modelo = obter_modelo(caminho_modelo)
+	estilos_modelo = set(modelo.estilos)
+	colecao = ColecaoPlanilhas(modelo)
+	resultado = _montar_planilhas_lote(lote_id, [], data_inicio, data_fim, colecao)
+	estilos = {
+		nome: estilo for nome, estilo in modelo.estilos.items()
+		if nome not in estilos_modelo
+	}
+	return resultado, colecao.planilhas, estilos
+
+
+def _montar_em_serie(lote_id, data_inicio, data_fim, modelo):
+	from .helpers import _montar_planilhas_lote
+	from .planilhas import ColecaoPlanilhas
+
+	colecao = ColecaoPlanilhas(modelo)
+	resultado = _montar_planilhas_lote(lote_id, [], data_inicio, data_fim, colecao)
+	return resultado, colecao.planilhas
+
+
+def _obter_pool(uri, processos, memoria_mb):
+	# Pool do processo, recriado só se a configuração mudar (ou depois de uma falha)
+	global _pool
+	configuracao = (uri, processos, memoria_mb)
+	with _lock_pool:
+		if _pool is not None and _pool[0] != configuracao:
+			_pool[1].shutdown(wait=False)
+			_pool = None
+		if _pool is None:
+			_pool = (configuracao, ProcessPoolExecutor(
+				max_workers=processos,
+				mp_context=multiprocessing.get_context(METODO_INICIO),
+				initializer=_iniciar_processo,
+				initargs=(uri, memoria_mb)
+			))
+			logger.info("Pool de exportação criado: %d processo(s) (%s)", processos, METODO_INICIO)
+		return _pool[1]
+
+
+def _descartar_pool(pool):
+	global _pool
+	with _lock_pool:
+		if _pool is not None and _pool[1] is pool:
+			_pool = None
+	pool.shutdown(wait=False, cancel_futures=True)
+
+
+def encerrar_pool():
+	"""
+	Encerra o pool de exportação, se existir (o próximo uso cria outro).
+	"""
+	global _pool
+	with _lock_pool:
+		pool, _pool = (_pool[1] if _pool else None), None
+	if pool:
+		pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _montar_em_paralelo(lote_ids, data_inicio, data_fim, modelo, processos, memoria_mb, progresso):
+	"""
+	Monta os lotes no pool. Posições com None ficaram sem resultado (falha do pool).
+	"""
+	uri = uri_somente_leitura(current_app.config['SQLALCHEMY_DATABASE_URI'])
+	montados = [None] * len(lote_ids)
+	if uri is None:
+		return montados
+
+	pool = None
+	try:
+		pool = _obter_pool(uri, processos, memoria_mb)
+		futuros = [
+			pool.submit(_montar_lote, lote_id, data_inicio, data_fim, modelo.caminho)
+			for lote_id in lote_ids
+		]
+		for posicao, futuro in enumerate(futuros):
+			try:
+				resultado, planilhas, estilos = futuro.result()
+			except (BrokenProcessPool, MemoryError) as e:
+				# Processo encerrado ou sem memória: o pool é descartado (o próximo uso cria outro)
+				logger.warning("Pool de exportação interrompido (%r); lotes restantes em série", e)
+				_descartar_pool(pool)
+				break
+			except Exception as e:
+				logger.warning("Lote %s não montado no pool (%s); será montado em série", lote_ids[posicao], e)
+				continue
+			# Estilos derivados no processo do pool (ex.: dados do COMPARATIVO)
+			for nome, estilo in estilos.items():
+				modelo.estilos.setdefault(nome, estilo)
+			montados[posicao] = (resultado, planilhas)
+			if progresso:
+				progresso('montando', posicao + 1, len(lote_ids))
+	except Exception as e:
+		logger.warning("Pool de exportação indisponível (%s); montando os lotes em série", e)
+		if pool is not None:
+			_descartar_pool(pool)
+	return montados
+
+
+def montar_planilhas_lotes(lote_ids, data_inicio, data_fim, modelo, processos=None, memoria_mb=None, progresso=None):
+	"""
+	Monta as abas (Planilhas em memória) de cada lote, em série ou em um pool de processos.
+
+	Args:
+		lote_ids: IDs dos lotes, na ordem da exportação
+		data_inicio, data_fim: período (YYYY-MM-DD)
+		modelo: ModeloPlanilhas usado na escrita do arquivo
+		processos: número de processos (padrão: SGMRP_EXPORTACAO_PROCESSOS; sem a
+			variável, em série dentro de uma requisição)
+		memoria_mb: limite de memória por processo (padrão: SGMRP_EXPORTACAO_MEMORIA_MB)
+		progresso: função opcional (fase, lotes concluídos, total), chamada a cada lote
+
+	Returns:
+		list: (resultado, planilhas) por lote, na ordem de lote_ids; resultado é o
+		retorno de _montar_planilhas_lote ({'success': ...})
+	"""
+	if processos is None:
+		# Download direto: não abre processos por requisição, a menos que configurado
+		processos = 1 if has_request_context() and not PROCESSOS_CONFIGURADOS else PROCESSOS
+	memoria_mb = MEMORIA_MB if memoria_mb is None else memoria_mb
+
+	if progresso:
+		progresso('montando', 0, len(lote_ids))
+	montados = [None] * len(lote_ids)
+	if min(processos, len(lote_ids)) > 1:
+		montados = _montar_em_paralelo(lote_ids, data_inicio, data_fim, modelo, processos, memoria_mb, progresso)
+
+	for posicao, lote_id in enumerate(lote_ids):
+		if montados[posicao] is None:
+			montados[posicao] = _montar_em_serie(lote_id, data_inicio, data_fim, modelo)
+			if progresso:
+				progresso('montando', sum(1 for m in montados if m is not None), len(lote_ids))
+	return montados
@@ -0,0 +1,261 @@
+"""
+Carregamento dos dados dos gráficos do dashboard.
+
+Os endpoints de gráficos recebem os lotes selecionados (expandidos com os
+predecessores) e, opcionalmente, as unidades. Os mapas de todos esses lotes são
+lidos com uma única consulta IN, projetando só as chaves e os totais persistidos
+(sem decodificar as séries JSON). Os períodos diário e semanal leem a tabela
+mapa_dia, já agregada por lote, unidade e data.
+"""
+import calendar
+
+from sqlalchemy import func, and_, or_, select
+
+from .models import db, Mapa, MapaDia, Unidade
+from .cache import obter_ou_calcular
+from .linhagem import mapear_grupos_linhagem, info_lote
+from .mapas import total_campo_mapa, desvio_campo_mapa
+
+
+CAMPOS_REFEICOES = [
+	'cafe_interno', 'cafe_funcionario',
+	'almoco_interno', 'almoco_funcionario',
+	'lanche_interno', 'lanche_funcionario',
+	'jantar_interno', 'jantar_funcionario'
+]
+
+_COLUNAS_CHAVE_GRAFICOS = ['id', 'lote_id', 'ano', 'mes', 'unidade']
+
+
+# ----- Unidades -----
+def _montar_indice_unidades():
+	"""
+	Monta o mapeamento de unidades usado nos gráficos com uma consulta.
+
+	Returns:
+		dict: {'nome_para_id': {nome: id}, 'subunidade_para_principal': {id: id},
+		       'info': {id: {'id', 'nome', 'lote_id'}}}
+	"""
+	nome_para_id = {}
+	subunidade_para_principal = {}
+	info = {}
+	for unidade_id, nome, lote_id, principal_id in db.session.query(
+		Unidade.id, Unidade.nome, Unidade.lote_id, Unidade.unidade_principal_id
+	).order_by(Unidade.id).all():
+		nome_para_id[nome] = unidade_id
+		if principal_id:
+			subunidade_para_principal[unidade_id] = principal_id
+		info[unidade_id] = {'id': unidade_id, 'nome': nome, 'lote_id': lote_id}
+	return {'nome_para_id': nome_para_id, 'subunidade_para_principal': subunidade_para_principal, 'info': info}
+
+
+def obter_indice_unidades():
+	"""
+	Retorna o mapeamento de unidades dos gráficos (somente leitura), em cache até
+	a próxima gravação no cadastro de unidades.
+	"""
+	return obter_ou_calcular('unidades_graficos', _montar_indice_unidades, grupos=('unidades',), copiar=None)
+
+
+def resolver_unidade_mapa(nome, indice=None):
+	"""
+	Converte o nome da unidade de um mapa no ID usado nos gráficos (subunidades
+	são agregadas na unidade principal).
+
+	Returns:
+		int ou None se o nome for vazio ou desconhecido
+	"""
+	if not nome:
+		return None
+	indice = indice or obter_indice_unidades()
+	unidade_id = indice['nome_para_id'].get(nome)
+	if unidade_id and unidade_id in indice['subunidade_para_principal']:
+		unidade_id = indice['subunidade_para_principal'][unidade_id]
+	return unidade_id
+
+
+def _nomes_fora_do_filtro(unidades_ids, indice):
+	# Nomes de unidades conhecidas cuja unidade (ou principal) não foi selecionada;
+	# mapas com nome vazio ou desconhecido não são filtrados
+	return [
+		nome for nome in indice['nome_para_id']
+		if nome and resolver_unidade_mapa(nome, indice) not in unidades_ids
+	]
+
+
+# ----- Mapas -----
+def _calcular_coluna_total(linha, coluna):
+	# Total de uma coluna total_<campo>/desvio_<campo> a partir das séries do mapa
+	if coluna.startswith('desvio_'):
+		return desvio_campo_mapa(linha, coluna[len('desvio_'):])
+	return total_campo_mapa(linha, coluna[len('total_'):])
+
+
+def _series_da_coluna(coluna):
+	if coluna.startswith('desvio_'):
+		return f"{coluna[len('desvio_'):]}_siisp"
+	return coluna[len('total_'):]
+
+
+def carregar_totais_mapas(filtros, colunas_totais):
+	"""
+	Carrega as chaves e os totais persistidos dos mapas que atendem aos filtros,
+	com uma consulta projetada (sem decodificar as séries JSON).
+
+	Args:
+		filtros: expressões SQLAlchemy aplicadas à consulta de Mapa
+		colunas_totais: colunas total_<campo>/desvio_<campo> a carregar
+
+	Returns:
+		list: dicts {'id', 'lote_id', 'ano', 'mes', 'unidade', <colunas_totais>...} em ordem de ID
+	"""
+	colunas_totais = list(colunas_totais)
+	linhas = db.session.query(
+		*[getattr(Mapa, c) for c in _COLUNAS_CHAVE_GRAFICOS + colunas_totais]
+	).filter(*filtros).order_by(Mapa.id).all()
+
+	# Mapas sem total persistido (valores não inteiros): somar só as séries necessárias
+	sem_total = [l.id for l in linhas if any(getattr(l, c) is None for c in colunas_totais)]
+	series = {}
+	if sem_total:
+		colunas_series = sorted(set(_series_da_coluna(c) for c in colunas_totais))
+		for linha in db.session.query(Mapa.id, *[getattr(Mapa, c) for c in colunas_series]).filter(Mapa.id.in_(sem_total)).all():
+			series[linha.id] = linha
+
+	mapas = []
+	for linha in linhas:
+		mapa = dict(linha._asdict())
+		if linha.id in series:
+			for coluna in colunas_totais:
+				if mapa[coluna] is None:
+					mapa[coluna] = _calcular_coluna_total(series[linha.id], coluna)
+		mapas.append(mapa)
+	return mapas
+
+
+# ----- Intervalo de datas -----
+def filtros_intervalo_meses(modelo, data_inicio=None, data_fim=None):
+	"""
+	Predicados SQL de (ano, mes) para os meses que tocam o intervalo, usáveis
+	pelo índice (lote_id, ano, mes).
+
+	Args:
+		modelo: Mapa ou MapaDia
+		data_inicio, data_fim: date opcionais (inclusive)
+
+	Returns:
+		list: expressões SQLAlchemy (vazia sem datas)
+	"""
+	filtros = []
+	if data_inicio:
+		filtros.append(or_(
+			modelo.ano > data_inicio.year,
+			and_(modelo.ano == data_inicio.year, modelo.mes >= data_inicio.month)
+		))
+	if data_fim:
+		filtros.append(or_(
+			modelo.ano < data_fim.year,
+			and_(modelo.ano == data_fim.year, modelo.mes <= data_fim.month)
+		))
+	return filtros
+
+
+def meses_parciais(data_inicio=None, data_fim=None):
+	"""
+	Meses de borda só parcialmente cobertos pelo intervalo (o mês inicial se não
+	começar no dia 1, o final se não terminar no último dia).
+
+	Returns:
+		list: tuplas (ano, mes) sem repetição
+	"""
+	meses = []
+	if data_inicio and data_inicio.day > 1:
+		meses.append((data_inicio.year, data_inicio.month))
+	if data_fim and data_fim.day < calendar.monthrange(data_fim.year, data_fim.month)[1]:
+		if (data_fim.year, data_fim.month) not in meses:
+			meses.append((data_fim.year, data_fim.month))
+	return meses
+
+
+def carregar_totais_diarios(filtros, campos, data_inicio=None, data_fim=None):
+	"""
+	Carrega os totais diários (tabela mapa_dia) dos mapas que atendem aos filtros,
+	somados por lote, unidade e data em uma consulta agregada.
+
+	Args:
+		filtros: expressões SQLAlchemy aplicadas à consulta de Mapa
+		campos: campos de mapa_dia somados (refeições e/ou 'dados_siisp')
+		data_inicio, data_fim: date opcionais; recortam os dias (inclusive)
+
+	Returns:
+		list: dicts {'lote_id', 'unidade', 'ano', 'mes', 'data' ('YYYY-MM-DD'),
+		       'total_<campo>'...} em ordem de data
+	"""
+	campos = list(campos)
+	chaves = [MapaDia.lote_id, MapaDia.unidade, MapaDia.ano, MapaDia.mes, MapaDia.data]
+	consulta = db.session.query(
+		*chaves, *[func.coalesce(func.sum(getattr(MapaDia, c)), 0).label(f'total_{c}') for c in campos]
+	).filter(
+		MapaDia.mapa_id.in_(select(Mapa.id).where(*filtros)),
+		*filtros_intervalo_meses(MapaDia, data_inicio, data_fim)
+	)
+	if data_inicio:
+		consulta = consulta.filter(MapaDia.data >= data_inicio.strftime('%Y-%m-%d'))
+	if data_fim:
+		consulta = consulta.filter(MapaDia.data <= data_fim.strftime('%Y-%m-%d'))
+	linhas = consulta.group_by(*chaves).order_by(MapaDia.data, MapaDia.lote_id, MapaDia.unidade).all()
+	return [dict(linha._asdict()) for linha in linhas]
+
+
+def carregar_mapas_graficos(lotes_ids, unidades_ids=None, colunas_totais=None):
+	"""
+	Carrega os mapas dos lotes selecionados e dos seus predecessores com uma
+	única consulta.
+
+	Args:
+		lotes_ids: IDs dos lotes selecionados
+		unidades_ids: IDs das unidades selecionadas (vazio: todas)
+		colunas_totais: colunas total_<campo>/desvio_<campo> (padrão: as 8 refeições)
+
+	Returns:
+		dict: {
+			'mapas': [{'id', 'lote_id', 'ano', 'mes', 'unidade', 'lote_grupo', <colunas_totais>...}],
+			'lote_para_grupo': {lote_id: lote_principal_id},
+			'lotes_info': {lote_id: {'id', 'nome', 'empresa', 'precos'}},
+			'unidades': índice de obter_indice_unidades(),
+			'mapas_filtrados': quantidade de mapas excluídos pelo filtro de unidades,
+			'existem_mapas': se os lotes têm mapas (mesmo que todos fora do filtro)
+		}
+	"""
+	colunas_totais = list(colunas_totais or [f'total_{campo}' for campo in CAMPOS_REFEICOES])
+	lote_para_grupo = mapear_grupos_linhagem(lotes_ids)
+	indice = obter_indice_unidades()
+	resultado = {
+		'mapas': [],
+		'lote_para_grupo': lote_para_grupo,
+		'lotes_info': {lote_id: info_lote(lote_id) for lote_id in lote_para_grupo},
+		'unidades': indice,
+		'mapas_filtrados': 0,
+		'existem_mapas': False
+	}
+	if not lote_para_grupo:
+		return resultado
+
+	filtros = [Mapa.lote_id.in_(list(lote_para_grupo))]
+	if unidades_ids:
+		fora = _nomes_fora_do_filtro(set(unidades_ids), indice)
+		if fora:
+			filtros.append(or_(Mapa.unidade.is_(None), Mapa.unidade.notin_(fora)))
+			resultado['mapas_filtrados'] = db.session.query(func.count(Mapa.id)).filter(
+				Mapa.lote_id.in_(list(lote_para_grupo)), Mapa.unidade.in_(fora)
+			).scalar() or 0
+	mapas = carregar_totais_mapas(filtros, colunas_totais)
+
+	posicao_lote = {lote_id: pos for pos, lote_id in enumerate(lote_para_grupo)}
+	for mapa in mapas:
+		mapa['lote_grupo'] = lote_para_grupo[mapa['lote_id']]
+	# Mesma ordem da leitura lote a lote (ordem dos grupos, depois ID do mapa)
+	mapas.sort(key=lambda m: posicao_lote[m['lote_id']])
+	resultado['mapas'] = mapas
+	resultado['existem_mapas'] = bool(mapas) or resultado['mapas_filtrados'] > 0
+	return resultado
@@ -0,0 +1,207 @@
+"""
+Importação de arquivos de texto com vários meses seguidos (ex.: dados/dados.txt),
+separados por cabeçalhos como "AGOSTO (31 dias)" ou "SETEMBRO (30 valores)".
+"""
+import calendar
+import re
+import unicodedata
+from datetime import datetime
+
+from .models import db, Lote
+from .mapas import (
+	parse_texto_tabular,
+	_normalizar_datas_coluna,
+	_validate_map_day_lengths,
+	salvar_mapas_lote
+)
+from .siisp import adicionar_siisp_em_mapas_lote
+
+
+MESES_POR_NOME = {
+	'JANEIRO': 1, 'FEVEREIRO': 2, 'MARCO': 3, 'ABRIL': 4, 'MAIO': 5, 'JUNHO': 6,
+	'JULHO': 7, 'AGOSTO': 8, 'SETEMBRO': 9, 'OUTUBRO': 10, 'NOVEMBRO': 11, 'DEZEMBRO': 12
+}
+
+# Ex.: "AGOSTO (31 dias)", "MARÇO/2025 (31 dias)", "SETEMBRO 2025 (30 valores)"
+_RE_CABECALHO_MES = re.compile(
+	r'^\s*([A-Za-zÀ-ÿ]+)\s*(?:[/\-]?\s*(\d{4}))?\s*\(\s*(\d{1,2})\s*(?:dias|valores)\s*\)\s*$',
+	re.IGNORECASE
+)
+
+_CAMPOS_COLUNAS = {
+	'coluna_1': 'cafe_interno',
+	'coluna_2': 'cafe_funcionario',
+	'coluna_3': 'almoco_interno',
+	'coluna_4': 'almoco_funcionario',
+	'coluna_5': 'lanche_interno',
+	'coluna_6': 'lanche_funcionario',
+	'coluna_7': 'jantar_interno',
+	'coluna_8': 'jantar_funcionario'
+}
+
+
+def _sem_acentos(texto):
+	return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def _ler_cabecalho_mes(linha):
+	"""
+	Reconhece um cabeçalho de mês.
+
+	Returns:
+		tuple (mes, ano ou None, dias informados) ou None se a linha não for cabeçalho
+	"""
+	m = _RE_CABECALHO_MES.match(linha)
+	if not m:
+		return None
+	mes = MESES_POR_NOME.get(_sem_acentos(m.group(1)).upper())
+	if not mes:
+		return None
+	ano = int(m.group(2)) if m.group(2) else None
+	return (mes, ano, int(m.group(3)))
+
+
+def dividir_blocos_mensais(linhas):
+	"""
+	Percorre as linhas (texto ou arquivo aberto) e produz um bloco por mês, sem
+	carregar o arquivo inteiro em memória.
+
+	Yields:
+		dict: {'mes', 'ano' (ou None), 'dias_informados', 'texto'}
+	"""
+	if isinstance(linhas, str):
+		linhas = linhas.splitlines()
+	atual = None
+	conteudo = []
+	for linha in linhas:
+		if isinstance(linha, bytes):
+			linha = linha.decode('utf-8', errors='replace')
+		cabecalho = _ler_cabecalho_mes(linha)
+		if cabecalho:
+			if atual:
+				yield dict(atual, texto='\n'.join(conteudo))
+			atual = {'mes': cabecalho[0], 'ano': cabecalho[1], 'dias_informados': cabecalho[2]}
+			conteudo = []
+		elif atual is not None and linha.strip():
+			conteudo.append(linha.rstrip('\r\n'))
+	if atual:
+		yield dict(atual, texto='\n'.join(conteudo))
+
+
+def _ano_inicial_do_lote(lote_id, mes):
+	# Primeiro ano da vigência do lote em que o mês informado ocorre
+	lote = db.session.get(Lote, int(lote_id))
+	if lote and lote.data_inicio:
+		try:
+			inicio = datetime.strptime(lote.data_inicio, '%Y-%m-%d')
+			return inicio.year if mes >= inicio.month else inicio.year + 1
+		except Exception:
+			pass
+	return datetime.now().year
+
+
+def _montar_entrada_bloco(bloco, lote_id, unidade, tipo):
+	"""
+	Converte um bloco mensal em entrada de importação (listas por campo) e valida
+	a quantidade de dias.
+
+	Returns:
+		tuple (entry, erro)
+	"""
+	entry = {'lote_id': lote_id, 'unidade': unidade, 'mes': bloco['mes'], 'ano': bloco['ano']}
+	dias_mes = calendar.monthrange(bloco['ano'], bloco['mes'])[1]
+	if bloco['dias_informados'] != dias_mes:
+		return (entry, f"Cabeçalho informa {bloco['dias_informados']} dias, mas {bloco['mes']:02d}/{bloco['ano']} tem {dias_mes}")
+	parsed = parse_texto_tabular(bloco['texto'])
+	if not parsed.get('ok'):
+		return (entry, parsed.get('error', 'Erro ao interpretar o bloco'))
+	colunas = parsed.get('colunas') or {}
+	if tipo == 'siisp':
+		# Arquivo SIISP: uma coluna com o valor do dia (a última, se houver coluna de dia)
+		ultima = f"coluna_{max(int(parsed.get('colunas_count') or 1) - 1, 0)}"
+		entry['dados_siisp'] = [v if v is not None else 0 for v in colunas.get(ultima, [])]
+	else:
+		for coluna, campo in _CAMPOS_COLUNAS.items():
+			entry[campo] = [v if v is not None else 0 for v in colunas.get(coluna, [])]
+		if 'coluna_0' in colunas:
+			entry['datas'] = _normalizar_datas_coluna(colunas['coluna_0'], entry)
+	valido, erro = _validate_map_day_lengths(entry)
+	return (entry, None if valido else erro)
+
+
+def importar_texto_multimes(texto, lote_id, unidade, ano=None, tipo='refeicoes'):
+	"""
+	Importa um texto com vários meses seguidos para uma unidade.
+
+	Args:
+		texto: conteúdo (str) ou arquivo aberto/iterável de linhas
+		lote_id: ID do lote
+		unidade: nome da unidade
+		ano: ano do primeiro mês sem ano no cabeçalho (padrão: inferido da vigência do lote)
+		tipo: 'refeicoes' (dia + 8 colunas) ou 'siisp' (uma coluna)
+
+	Returns:
+		dict: {'success', 'meses': [{mes, ano, success, error?, id?}], 'salvos', 'erros', ...}
+	"""
+	if not lote_id or not unidade:
+		return {'success': False, 'error': 'lote_id e unidade são obrigatórios'}
+	if tipo not in ('refeicoes', 'siisp'):
+		return {'success': False, 'error': f'Tipo inválido: {tipo}'}
+	try:
+		lote_id = int(lote_id)
+		ano_atual = int(ano) if ano else None
+	except (ValueError, TypeError):
+		return {'success': False, 'error': 'lote_id ou ano inválido'}
+
+	meses = []
+	entradas = []
+	mes_anterior = None
+	for bloco in dividir_blocos_mensais(texto):
+		# Sem ano no cabeçalho: sequência cronológica, virando o ano de dezembro para janeiro
+		if bloco['ano'] is None:
+			if ano_atual is None:
+				ano_atual = _ano_inicial_do_lote(lote_id, bloco['mes'])
+			elif mes_anterior is not None and bloco['mes'] <= mes_anterior:
+				ano_atual += 1
+			bloco['ano'] = ano_atual
+		else:
+			ano_atual = bloco['ano']
+		mes_anterior = bloco['mes']
+		entry, erro = _montar_entrada_bloco(bloco, lote_id, unidade, tipo)
+		if erro:
+			meses.append({'mes': bloco['mes'], 'ano': bloco['ano'], 'success': False, 'error': erro})
+		else:
+			meses.append({'mes': bloco['mes'], 'ano': bloco['ano'], 'success': True})
+			entradas.append((len(meses) - 1, entry))
+
+	if not meses:
+		return {'success': False, 'error': 'Nenhum cabeçalho de mês encontrado (ex.: "AGOSTO (31 dias)")'}
+
+	if tipo == 'siisp' and entradas:
+		res = adicionar_siisp_em_mapas_lote([entry for _, entry in entradas])
+		if not res.get('success'):
+			return {'success': False, 'error': res.get('error'), 'meses': meses}
+		for (pos, _), resultado in zip(entradas, res.get('resultados', [])):
+			if resultado.get('success'):
+				meses[pos]['id'] = resultado.get('id')
+			else:
+				meses[pos].update({'success': False, 'error': resultado.get('error')})
+	elif entradas:
+		# Todos os meses da unidade em uma única transação
+		res = salvar_mapas_lote([entry for _, entry in entradas])
+		if not res.get('success'):
+			return {'success': False, 'error': res.get('error'), 'meses': meses}
+		for (pos, _), resultado in zip(entradas, res.get('resultados', [])):
+			if resultado.get('success'):
+				meses[pos].update({'id': resultado.get('id'), 'operacao': resultado.get('operacao')})
+			else:
+				meses[pos].update({'success': False, 'error': resultado.get('error')})
+
+	salvos = sum(1 for m in meses if m.get('success'))
+	return {
+		'success': salvos > 0,
+		'meses': meses,
+		'salvos': salvos,
+		'erros': len(meses) - salvos,
+		'error': None if salvos else 'Nenhum mês foi importado'
+	}
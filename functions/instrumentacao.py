@@ -0,0 +1,272 @@
+"""
+Instrumentação das requisições (tempo, SQL, decodificação de séries e tamanho).
+
+Para cada requisição são medidos:
+- tempo total (wall time);
+- quantidade e tempo das instruções SQL (eventos before/after_cursor_execute do SQLAlchemy);
+- quantidade de json.loads em serialize_mapa;
+- tamanho da resposta.
+
+Os valores acumulam em contadores e histogramas por rota (regra do Flask, ex.
+'/lote/<int:lote_id>'), expostos no formato de texto do Prometheus em /metrics.
+
+Configuração (variáveis de ambiente):
+- SGMRP_METRICAS: 0 desativa a instrumentação (padrão: ativa)
+- SGMRP_METRICAS_TOKEN: token aceito em /metrics no cabeçalho
+  'Authorization: Bearer <token>' (para o Prometheus); sem ele, /metrics só
+  responde a usuários logados
+- SGMRP_METRICAS_CABECALHO: 1 inclui os números da própria requisição no
+  cabeçalho X-Metricas-Requisicao de cada resposta (padrão: desligado)
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request, session, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _flag_env(nome, padrao):
+	return os.environ.get(nome, padrao).strip().lower() not in ('', '0', 'false', 'nao', 'não')
+
+
+METRICAS_ATIVAS = _flag_env('SGMRP_METRICAS', '1')
+CABECALHO_ATIVO = _flag_env('SGMRP_METRICAS_CABECALHO', '0')
+TOKEN_METRICAS = os.environ.get('SGMRP_METRICAS_TOKEN', '').strip()
+CABECALHO_METRICAS = 'X-Metricas-Requisicao'
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BUCKETS_BYTES = (1000, 10000, 100000, 1000000, 10000000)
+
+# Medições da requisição em andamento (None fora de requisições instrumentadas)
+_medicao_atual = ContextVar('medicao_requisicao', default=None)
+
+
+# ----- Registro -----
+class _Registro:
+	"""
+	Contadores e histogramas por rótulos, protegidos por lock (threads do servidor).
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._metricas = {}
+
+	def _serie(self, nome, tipo, ajuda, rotulos, buckets=None):
+		metrica = self._metricas.setdefault(nome, {'tipo': tipo, 'ajuda': ajuda, 'buckets': buckets, 'series': {}})
+		chave = tuple(sorted(rotulos.items()))
+		if chave not in metrica['series']:
+			if tipo == 'histogram':
+				metrica['series'][chave] = {'buckets': [0] * len(buckets), 'soma': 0.0, 'total': 0}
+			else:
+				metrica['series'][chave] = 0
+		return metrica, chave
+
+	def incrementar(self, nome, ajuda, rotulos, valor=1):
+		with self._lock:
+			metrica, chave = self._serie(nome, 'counter', ajuda, rotulos)
+			metrica['series'][chave] += valor
+
+	def observar(self, nome, ajuda, rotulos, valor, buckets):
+		with self._lock:
+			metrica, chave = self._serie(nome, 'histogram', ajuda, rotulos, buckets)
+			serie = metrica['series'][chave]
+			for pos, limite in enumerate(buckets):
+				if valor <= limite:
+					serie['buckets'][pos] += 1
+			serie['soma'] += valor
+			serie['total'] += 1
+
+	def limpar(self):
+		with self._lock:
+			self._metricas.clear()
+
+	def exportar(self):
+		"""
+		Texto no formato de exposição do Prometheus (0.0.4).
+		"""
+		linhas = []
+		with self._lock:
+			for nome in sorted(self._metricas):
+				metrica = self._metricas[nome]
+				linhas.append(f"# HELP {nome} {metrica['ajuda']}")
+				linhas.append(f"# TYPE {nome} {metrica['tipo']}")
+				for chave, serie in sorted(metrica['series'].items()):
+					if metrica['tipo'] != 'histogram':
+						linhas.append(f"{nome}{_rotulos(chave)} {_numero(serie)}")
+						continue
+					for limite, acumulado in zip(metrica['buckets'], serie['buckets']):
+						linhas.append(f"{nome}_bucket{_rotulos(chave + (('le', _numero(limite)),))} {acumulado}")
+					linhas.append(f"{nome}_bucket{_rotulos(chave + (('le', '+Inf'),))} {serie['total']}")
+					linhas.append(f"{nome}_sum{_rotulos(chave)} {_numero(serie['soma'])}")
+					linhas.append(f"{nome}_count{_rotulos(chave)} {serie['total']}")
+		return '\n'.join(linhas) + '\n'
+
+
+def _escapar(valor):
+	return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(chave):
+	if not chave:
+		return ''
+	return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in chave) + '}'
+
+
+def _numero(valor):
+	if isinstance(valor, float):
+		return repr(round(valor, 6))
+	return str(valor)
+
+
+registro_metricas = _Registro()
+
+
+# ----- Medição da requisição -----
+def _nova_medicao():
+	return {'inicio': time.perf_counter(), 'sql_consultas': 0, 'sql_segundos': 0.0, 'json_loads': 0}
+
+
+def contar_json_loads(quantidade=1):
+	"""
+	Soma decodificações JSON (serialize_mapa) na requisição em andamento.
+	"""
+	medicao = _medicao_atual.get()
+	if medicao is not None:
+		medicao['json_loads'] += quantidade
+
+
+def medicao_atual():
+	"""
+	Retorna as medições da requisição em andamento (ou None).
+	"""
+	return _medicao_atual.get()
+
+
+@contextmanager
+def medir_bloco():
+	"""
+	Mede um trecho fora de requisições (ex.: benchmarks) com os mesmos contadores.
+
+	Yields:
+		dict: {'inicio', 'sql_consultas', 'sql_segundos', 'json_loads'}, atualizado até o fim do bloco
+	"""
+	_registrar_eventos_sql()
+	medicao = _nova_medicao()
+	token = _medicao_atual.set(medicao)
+	try:
+		yield medicao
+	finally:
+		_medicao_atual.reset(token)
+
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+	if _medicao_atual.get() is not None:
+		conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+	medicao = _medicao_atual.get()
+	inicios = conn.info.get('inicio_consulta')
+	if medicao is None or not inicios:
+		return
+	medicao['sql_consultas'] += 1
+	medicao['sql_segundos'] += time.perf_counter() - inicios.pop()
+
+
+_eventos_registrados = False
+
+
+def _registrar_eventos_sql():
+	# Eventos no nível da classe Engine: valem para o engine do Flask-SQLAlchemy
+	global _eventos_registrados
+	if _eventos_registrados:
+		return
+	event.listen(Engine, 'before_cursor_execute', _antes_da_consulta)
+	event.listen(Engine, 'after_cursor_execute', _depois_da_consulta)
+	_eventos_registrados = True
+
+
+def _rota_atual():
+	regra = request.url_rule
+	return regra.rule if regra is not None else 'desconhecida'
+
+
+def _iniciar_requisicao():
+	g._token_medicao = _medicao_atual.set(_nova_medicao())
+
+
+def _finalizar_requisicao(resposta):
+	medicao = _medicao_atual.get()
+	if medicao is None:
+		return resposta
+	segundos = time.perf_counter() - medicao['inicio']
+	tamanho = resposta.content_length or resposta.calculate_content_length() or 0
+	rota = _rota_atual()
+	rotulos = {'rota': rota, 'metodo': request.method}
+
+	registro_metricas.incrementar(
+		'sgmrp_requisicoes_total', 'Requisições atendidas', dict(rotulos, status=str(resposta.status_code))
+	)
+	registro_metricas.incrementar('sgmrp_sql_consultas_total', 'Instruções SQL executadas', rotulos, medicao['sql_consultas'])
+	registro_metricas.incrementar('sgmrp_sql_segundos_total', 'Tempo gasto em SQL (s)', rotulos, medicao['sql_segundos'])
+	registro_metricas.incrementar('sgmrp_serialize_mapa_json_loads_total', 'json.loads em serialize_mapa', rotulos, medicao['json_loads'])
+	registro_metricas.incrementar('sgmrp_resposta_bytes_total', 'Bytes de resposta', rotulos, tamanho)
+	registro_metricas.observar('sgmrp_requisicao_segundos', 'Duração da requisição (s)', rotulos, segundos, BUCKETS_SEGUNDOS)
+	registro_metricas.observar('sgmrp_sql_consultas_por_requisicao', 'Instruções SQL por requisição', rotulos, medicao['sql_consultas'], BUCKETS_CONSULTAS)
+	registro_metricas.observar('sgmrp_resposta_bytes', 'Tamanho da resposta (bytes)', rotulos, tamanho, BUCKETS_BYTES)
+
+	if not CABECALHO_ATIVO:
+		return resposta
+	resposta.headers[CABECALHO_METRICAS] = (
+		f"tempo_ms={segundos * 1000:.1f}; sql={medicao['sql_consultas']}; "
+		f"sql_ms={medicao['sql_segundos'] * 1000:.1f}; json_loads={medicao['json_loads']}; bytes={tamanho}"
+	)
+	return resposta
+
+
+def _encerrar_requisicao(erro=None):
+	token = g.pop('_token_medicao', None)
+	if token is None:
+		return
+	try:
+		_medicao_atual.reset(token)
+	except ValueError:
+		# Token de outro contexto (ex.: servidor que troca de contexto entre hooks)
+		_medicao_atual.set(None)
+
+
+def _acesso_metricas_autorizado():
+	# Usuário logado (como nas demais rotas) ou o token de SGMRP_METRICAS_TOKEN
+	if 'usuario_id' in session:
+		return True
+	autorizacao = request.headers.get('Authorization', '')
+	if TOKEN_METRICAS and autorizacao.startswith('Bearer '):
+		return hmac.compare_digest(autorizacao[len('Bearer '):].strip(), TOKEN_METRICAS)
+	return False
+
+
+def instrumentar_app(app):
+	"""
+	Registra os hooks de medição e a rota /metrics (protegida) no app Flask.
+	Não faz nada se SGMRP_METRICAS=0.
+	"""
+	if not METRICAS_ATIVAS:
+		return app
+	_registrar_eventos_sql()
+	app.before_request(_iniciar_requisicao)
+	app.after_request(_finalizar_requisicao)
+	app.teardown_request(_encerrar_requisicao)
+
+	@app.route('/metrics')
+	def metricas_prometheus():
+		if not _acesso_metricas_autorizado():
+			return Response('Não autorizado\n', status=401, mimetype='text/plain; charset=utf-8')
+		return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+	return app
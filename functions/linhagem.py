@@ -0,0 +1,132 @@
+"""
+Linhagem dos lotes (cadeia de lote_predecessor_id).
+
+Todos os pares (id, lote_predecessor_id) são lidos com uma única consulta e as
+cadeias de ancestrais/descendentes de cada lote são pré-calculadas. O índice fica
+em cache até a próxima gravação de lotes (salvar_novo_lote, editar_lote, deletar_lote).
+"""
+import json
+
+from .models import db, Lote
+from .cache import obter_ou_calcular
+
+
+def _montar_indice_linhagem():
+	"""
+	Monta o índice de linhagem com uma consulta.
+
+	Returns:
+		dict: {'predecessor': {id: id}, 'ancestrais': {id: [ids]}, 'descendentes': {id: [ids]},
+		       'info': {id: {'id', 'nome', 'empresa', 'precos'}}}
+	"""
+	predecessor = {}
+	info = {}
+	for lote_id, predecessor_id, nome, empresa, precos in db.session.query(
+		Lote.id, Lote.lote_predecessor_id, Lote.nome, Lote.empresa, Lote.precos
+	).all():
+		predecessor[lote_id] = predecessor_id
+		try:
+			precos = json.loads(precos) if precos else {}
+		except Exception:
+			precos = {}
+		info[lote_id] = {'id': lote_id, 'nome': nome, 'empresa': empresa, 'precos': precos}
+
+	# Ancestrais: do predecessor imediato ao mais antigo (protegido contra ciclos)
+	ancestrais = {}
+	descendentes = {lote_id: [] for lote_id in predecessor}
+	for lote_id in predecessor:
+		cadeia = []
+		atual = predecessor[lote_id]
+		while atual in predecessor and atual != lote_id and atual not in cadeia:
+			cadeia.append(atual)
+			atual = predecessor[atual]
+		ancestrais[lote_id] = cadeia
+		for ancestral in cadeia:
+			descendentes[ancestral].append(lote_id)
+	return {'predecessor': predecessor, 'ancestrais': ancestrais, 'descendentes': descendentes, 'info': info}
+
+
+def obter_indice_linhagem():
+	"""
+	Retorna o índice de linhagem (somente leitura; ver _montar_indice_linhagem).
+	"""
+	return obter_ou_calcular('linhagem', _montar_indice_linhagem, grupos=('lotes',), copiar=None)
+
+
+def _normalizar_id(lote_id):
+	try:
+		return int(lote_id)
+	except (ValueError, TypeError):
+		return None
+
+
+def ancestrais_lote(lote_id):
+	"""
+	Retorna os IDs dos predecessores do lote, do mais recente ao mais antigo.
+	"""
+	return list(obter_indice_linhagem()['ancestrais'].get(_normalizar_id(lote_id), []))
+
+
+def descendentes_lote(lote_id):
+	"""
+	Retorna os IDs dos lotes que têm este lote na sua cadeia de predecessores.
+	"""
+	return list(obter_indice_linhagem()['descendentes'].get(_normalizar_id(lote_id), []))
+
+
+def linhagem_lote(lote_id):
+	"""
+	Retorna o lote seguido dos seus predecessores (vazio se o lote não existir).
+	"""
+	lote_id = _normalizar_id(lote_id)
+	indice = obter_indice_linhagem()
+	if lote_id not in indice['predecessor']:
+		return []
+	return [lote_id] + list(indice['ancestrais'][lote_id])
+
+
+def expandir_lotes_com_predecessores(lotes_ids):
+	"""
+	Retorna os lotes informados mais todos os seus predecessores (sem repetição).
+	"""
+	expandidos = []
+	vistos = set()
+	for lote_id in lotes_ids or []:
+		lote_id = _normalizar_id(lote_id)
+		for item in [lote_id] + ancestrais_lote(lote_id):
+			if item is not None and item not in vistos:
+				vistos.add(item)
+				expandidos.append(item)
+	return expandidos
+
+
+def mapear_grupos_linhagem(lotes_ids):
+	"""
+	Mapeia cada lote (selecionado ou predecessor) para o lote selecionado cujo
+	grupo ele integra nos gráficos. Um predecessor já mapeado não é reatribuído.
+
+	Args:
+		lotes_ids: IDs dos lotes selecionados
+
+	Returns:
+		dict: {lote_id: lote_principal_id}
+	"""
+	indice = obter_indice_linhagem()
+	lote_para_grupo = {}
+	for lote_principal_id in lotes_ids or []:
+		lote_principal_id = _normalizar_id(lote_principal_id)
+		if lote_principal_id not in indice['predecessor']:
+			continue
+		lote_para_grupo[lote_principal_id] = lote_principal_id
+		for ancestral in indice['ancestrais'][lote_principal_id]:
+			if ancestral in lote_para_grupo:
+				break
+			lote_para_grupo[ancestral] = lote_principal_id
+	return lote_para_grupo
+
+
+def info_lote(lote_id):
+	"""
+	Retorna {'id', 'nome', 'empresa', 'precos'} do lote ou None.
+	"""
+	return obter_indice_linhagem()['info'].get(_normalizar_id(lote_id))
@@ -0,0 +1,60 @@
+"""
+Configuração do logging da aplicação.
+
+Cada módulo usa o próprio logger (logging.getLogger(__name__)), com formatação
+preguiçosa ('%s'), de modo que mensagens abaixo do nível configurado não são
+montadas. Os níveis vêm de variáveis de ambiente:
+- SGMRP_LOG_NIVEL: nível geral (padrão INFO)
+- SGMRP_LOG_MODULOS: níveis por módulo, ex. "relatorios=DEBUG,main=WARNING"
+  (nomes sem o prefixo 'functions.' também são aceitos)
+
+Nos caminhos de requisição, INFO registra no máximo uma linha de resumo por
+requisição; os detalhes (filtros, unidades, mapeamentos) ficam em DEBUG.
+"""
+import logging
+import os
+
+
+NIVEL_PADRAO = 'INFO'
+FORMATO_LOG = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+
+def _nivel(valor, padrao=logging.INFO):
+	nivel = logging.getLevelName(str(valor or '').strip().upper())
+	return nivel if isinstance(nivel, int) else padrao
+
+
+def niveis_modulos(valor=None):
+	"""
+	Interpreta SGMRP_LOG_MODULOS ("modulo=NIVEL,...").
+
+	Returns:
+		dict: {nome do logger: nível (int)}
+	"""
+	if valor is None:
+		valor = os.environ.get('SGMRP_LOG_MODULOS', '')
+	niveis = {}
+	for item in valor.split(','):
+		nome, _, nivel = item.partition('=')
+		nome = nome.strip()
+		if not nome or not nivel.strip():
+			continue
+		if nome != 'main' and not nome.startswith('functions'):
+			nome = f'functions.{nome}'
+		niveis[nome] = _nivel(nivel)
+	return niveis
+
+
+def configurar_logs():
+	"""
+	Configura o handler raiz (stderr) e os níveis geral e por módulo.
+	Pode ser chamada mais de uma vez: o handler é criado só na primeira.
+	"""
+	raiz = logging.getLogger()
+	if not raiz.handlers:
+		handler = logging.StreamHandler()
+		handler.setFormatter(logging.Formatter(FORMATO_LOG))
+		raiz.addHandler(handler)
+	raiz.setLevel(_nivel(os.environ.get('SGMRP_LOG_NIVEL', NIVEL_PADRAO)))
+	for nome, nivel in niveis_modulos().items():
+		logging.getLogger(nome).setLevel(nivel)
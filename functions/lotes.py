@@ -8,9 +8,13 @@ def to_int_list(unidades):
 	return result
 # Função para carregar lotes do banco de dados (substitui o antigo carregamento do JSON)
 def _load_lotes_data():
-	"""Retorna todos os lotes cadastrados no banco de dados."""
+	"""Retorna todos os lotes cadastrados no banco de dados (em cache até a próxima gravação)."""
+	return obter_ou_calcular('lotes', _montar_lotes_data)
+
+def _montar_lotes_data():
 	lotes = Lote.query.all()
-	return [lote_to_dict(l) for l in lotes]
+	ultimas_atualizacoes = _obter_ultimas_atualizacoes_lotes()
+	return [lote_to_dict(l, ultimas_atualizacoes) for l in lotes]
 # Função para calcular a última atividade dos lotes
 def calcular_ultima_atividade_lotes(lotes, mapas=None):
 	"""Retorna a data da última atividade dos lotes ou mapas."""
@@ -25,6 +29,7 @@ def calcular_ultima_atividade_lotes(lotes, mapas=None):
 from .models import Lote, Unidade, db
 from datetime import datetime
 from .unidades import criar_unidade
+from .cache import obter_ou_calcular, invalidar_lotes, invalidar_mapas, invalidar_unidades
 
 import json
 
@@ -138,44 +143,52 @@ def copiar_unidades_de_predecessor(lote_predecessor_id, novo_lote_id):
 	
 	return novos_ids
 
-def _obter_ultima_atualizacao_lote(lote_id):
+def _obter_ultimas_atualizacoes_lotes(lote_ids=None):
 	"""
-	Obtém a data da última atividade de um lote.
-	Busca a data mais recente entre:
+	Obtém a data da última atividade de vários lotes com uma única consulta
+	(MAX(atualizado_em) dos mapas agrupado por lote, usando o índice mapas(lote_id, atualizado_em)).
+	A última atividade é a data mais recente entre:
 	- criado_em do lote
 	- atualizado_em dos mapas associados
-	Retorna a data formatada ou None.
+	
+	Args:
+		lote_ids: lista de IDs (padrão: todos os lotes)
+	
+	Returns:
+		dict: lote_id -> data mais recente (ou None)
 	"""
 	from .models import Mapa
 	
 	try:
-		# Buscar data de criação do lote
-		lote = Lote.query.get(lote_id)
-		if not lote:
-			return None
+		ultimo_mapa = db.session.query(
+			Mapa.lote_id.label('lote_id'),
+			db.func.max(Mapa.atualizado_em).label('atualizado_em')
+		).group_by(Mapa.lote_id)
+		if lote_ids is not None:
+			ultimo_mapa = ultimo_mapa.filter(Mapa.lote_id.in_(lote_ids))
+		ultimo_mapa = ultimo_mapa.subquery()
 		
-		datas = []
-		
-		# Adicionar data de criação do lote
-		if lote.criado_em:
-			datas.append(lote.criado_em)
-		
-		# Buscar última atualização dos mapas
-		mapa_mais_recente = Mapa.query.filter_by(lote_id=lote_id).order_by(Mapa.atualizado_em.desc()).first()
-		if mapa_mais_recente and mapa_mais_recente.atualizado_em:
-			datas.append(mapa_mais_recente.atualizado_em)
-		
-		if datas:
-			# Retornar a data mais recente
-			resultado = max(datas)
-			return resultado
+		query = db.session.query(Lote.id, Lote.criado_em, ultimo_mapa.c.atualizado_em).outerjoin(
+			ultimo_mapa, ultimo_mapa.c.lote_id == Lote.id
+		)
+		if lote_ids is not None:
+			query = query.filter(Lote.id.in_(lote_ids))
 		
-		return None
+		resultado = {}
+		for lote_id, criado_em, atualizado_em in query.all():
+			datas = [d for d in (criado_em, atualizado_em) if d]
+			resultado[lote_id] = max(datas) if datas else None
+		return resultado
 	except Exception as e:
-		print(f"[ERROR] Erro ao obter última atividade do lote {lote_id}: {e}")
-		import traceback
-		traceback.print_exc()
-		return None
+		print(f"[ERROR] Erro ao obter última atividade dos lotes: {e}")
+		return {}
+
+def _obter_ultima_atualizacao_lote(lote_id):
+	"""
+	Obtém a data da última atividade de um lote.
+	Retorna a data mais recente ou None.
+	"""
+	return _obter_ultimas_atualizacoes_lotes([lote_id]).get(lote_id)
 
 def _formatar_data_ultima_atividade(data_str):
 	"""
@@ -204,7 +217,12 @@ def _formatar_data_ultima_atividade(data_str):
 		print(f"Erro ao formatar data: {e}")
 		return data_str if data_str else "Sem registro"
 
-def lote_to_dict(lote):
+def lote_to_dict(lote, ultimas_atualizacoes=None):
+	"""
+	Converte um Lote em dict.
+	ultimas_atualizacoes: dict lote_id -> última atividade, já calculado em lote
+	(ver _obter_ultimas_atualizacoes_lotes); se ausente, consulta só este lote.
+	"""
 	# Garantir que quantitativos seja carregado mesmo se houver problema de cache do SQLAlchemy
 	quantitativos_value = None
 	try:
@@ -228,7 +246,10 @@ def lote_to_dict(lote):
 	predecessor_id_value = lote.lote_predecessor_id if hasattr(lote, 'lote_predecessor_id') else None
 	
 	# Obter última atividade do lote
-	ultima_atualizacao = _obter_ultima_atualizacao_lote(lote.id)
+	if ultimas_atualizacoes is not None:
+		ultima_atualizacao = ultimas_atualizacoes.get(lote.id)
+	else:
+		ultima_atualizacao = _obter_ultima_atualizacao_lote(lote.id)
 	ultima_atualizacao_formatada = _formatar_data_ultima_atividade(ultima_atualizacao)
 	
 	return {
@@ -255,15 +276,14 @@ def lote_to_dict(lote):
 	}
 
 def listar_lotes():
-	lotes = Lote.query.all()
-	return [lote_to_dict(l) for l in lotes]
+	return _load_lotes_data()
 
 def deletar_lote(lote_id, db):
 	"""
 	Deleta um lote pelo ID e todos os dados associados (mapas e unidades).
 	IMPORTANTE: Lotes predecessores NÃO são apagados (apenas o vínculo é removido).
 	"""
-	from .models import Mapa, Unidade
+	from .models import Mapa, MapaDia, Unidade
 	
 	lote = db.session.query(Lote).filter_by(id=lote_id).first()
 	if not lote:
@@ -278,7 +298,8 @@ def deletar_lote(lote_id, db):
 			for sucessor in lotes_sucessores:
 				sucessor.lote_predecessor_id = None
 		
-		# 1. Excluir todos os mapas associados ao lote
+		# 1. Excluir todos os mapas associados ao lote (e suas linhas diárias)
+		db.session.query(MapaDia).filter_by(lote_id=lote_id).delete()
 		mapas_deletados = db.session.query(Mapa).filter_by(lote_id=lote_id).delete()
 		print(f"🗑️ Excluídos {mapas_deletados} mapas do lote {lote_id}")
 		
@@ -291,6 +312,9 @@ def deletar_lote(lote_id, db):
 		
 		# 4. Commit de todas as alterações
 		db.session.commit()
+		invalidar_mapas()
+		invalidar_unidades()
+		invalidar_lotes()
 		
 		print(f"✅ Lote {lote_id} e seus dados associados foram excluídos com sucesso")
 		if lote.lote_predecessor_id:
@@ -422,6 +446,8 @@ def salvar_novo_lote(payload: dict):
     # Atualizar campo unidades do lote
     novo_lote.unidades = json.dumps(unidade_ids)
     db.session.commit()
+    invalidar_lotes()
+    invalidar_unidades()
     return {'success': True, 'id': novo_lote.id}
 
 
@@ -525,6 +551,7 @@ def editar_lote(lote_id, payload: dict):
 						db.session.add(nova_unidade)
 				
 				db.session.commit()
+				invalidar_unidades()
 				
 				# Atualizar lista de IDs de todas as unidades do lote
 				todas_unidades = Unidade.query.filter_by(lote_id=lote_id).all()
@@ -616,6 +643,7 @@ def editar_lote(lote_id, payload: dict):
 				setattr(lote, campo, valor)
 		
 		db.session.commit()
+		invalidar_lotes()
 		
 		return {'success': True, 'lote': lote_to_dict(lote)}
 	except Exception as e:
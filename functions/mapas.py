@@ -13,18 +13,19 @@ def serialize_mapa(m):
 		'lanche_interno', 'lanche_funcionario',
 		'jantar_interno', 'jantar_funcionario', 'datas'
 	]
+	json_loads = 0
 	for field in json_fields:
-		if field in mapa_dict and isinstance(mapa_dict[field], str):
-			try:
-				mapa_dict[field] = json.loads(mapa_dict[field])
-			except Exception:
-				mapa_dict[field] = []
+		if field in mapa_dict and isinstance(mapa_dict[field], (str, bytes)):
+			# Aceita JSON/texto e BLOB int32 (ver functions/series.py)
+			json_loads += isinstance(mapa_dict[field], str)
+			mapa_dict[field] = decodificar_serie(mapa_dict[field])
 		elif field in mapa_dict and mapa_dict[field] is None:
 			mapa_dict[field] = []
 	# Garante que todos os campos existam
 	for field in json_fields:
 		if field not in mapa_dict:
 			mapa_dict[field] = []
+	contar_json_loads(json_loads)
 	return mapa_dict
 
 def carregar_mapas_db(filtros=None):
@@ -41,8 +42,15 @@ import re
 import os
 import glob
 import calendar
+import time
 from datetime import datetime
 from collections import defaultdict
+import numpy as np
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .series import codificar_serie, decodificar_serie, somar_serie, CAMPOS_SERIES
+from .cache import invalidar_mapas
+from .instrumentacao import contar_json_loads
 
 
 
@@ -95,6 +103,19 @@ def _get_lote_data_fim(lote_id):
 		return None
 
 
+# ----- Unit Name Helpers -----
+# Função de normalização ultra tolerante para nomes de unidade
+def ultra_normalizar_nome(nome):
+	if not isinstance(nome, str):
+		nome = str(nome)
+	nome = nome.lower().strip()
+	nome = nome.replace('ups', '').replace('upsl', '').replace('unidade', '').replace('posto', '')
+	nome = nome.replace('-', ' ').replace('_', ' ').replace('.', ' ')
+	nome = ''.join(c for c in nome if c.isalnum() or c.isspace())
+	nome = ' '.join(nome.split())
+	return nome
+
+
 # ----- SIISP Comparison Helpers -----
 def _calcular_campos_comparativos_siisp(record):
 	if not isinstance(record, dict):
@@ -380,7 +401,7 @@ def _validate_map_day_lengths(entry):
 # ----- File Path Helpers -----
 
 # Funções CRUD usando banco de dados
-from .models import db, Mapa
+from .models import db, Mapa, MapaDia
 
 
 # ----- Data Loading/Saving -----
@@ -421,24 +442,16 @@ def _load_mapas_partitioned(mes, ano):
 
 # Não é mais necessário salvar em arquivo, mapas são salvos no banco
 def _save_mapas_partitioned(mapas_list, mes, ano):
-	# Salva lista de mapas no banco
+	# Salva lista de mapas no banco (UPSERT por lote/ano/mês/unidade)
 	try:
 		for mapa_data in mapas_list:
-			mapa = Mapa.query.filter_by(mes=mes, ano=ano, unidade=mapa_data.get('unidade'), lote_id=mapa_data.get('lote_id')).first()
-			if mapa:
-				# Atualiza sempre com o valor do dicionário, serializando listas
-				for k, v in mapa_data.items():
-					if hasattr(mapa, k):
-						if isinstance(v, list):
-							setattr(mapa, k, json.dumps(v))
-						else:
-							setattr(mapa, k, v)
-				mapa.atualizado_em = datetime.now().isoformat()
-			else:
-				# Cria novo registro, serializando listas
-				novo_mapa = Mapa(**{k: json.dumps(v) if isinstance(v, list) else v for k, v in mapa_data.items() if hasattr(Mapa, k)})
-				db.session.add(novo_mapa)
+			# Serializa listas: séries numéricas no formato configurado, demais em JSON
+			valores = {k: (codificar_serie(v) if k in CAMPOS_SERIES else json.dumps(v)) if isinstance(v, list) else v for k, v in mapa_data.items()}
+			valores.setdefault('mes', mes)
+			valores.setdefault('ano', ano)
+			_upsert_mapa(valores)
 		db.session.commit()
+		invalidar_mapas()
 		return True
 	except Exception as e:
 		print(f"❌ Erro ao salvar mapas: {e}")
@@ -446,6 +459,38 @@ def _save_mapas_partitioned(mapas_list, mes, ano):
 		return False
 
 
+def _upsert_mapa(mapa_data):
+	"""
+	Grava um mapa com INSERT ... ON CONFLICT (lote_id, ano, mes, unidade) DO UPDATE,
+	recalculando os totais persistidos e as linhas de mapa_dia.
+	Não faz commit: deve ser chamada dentro da transação de quem salva.
+	
+	Args:
+		mapa_data: dict com as colunas de Mapa (séries já codificadas)
+	
+	Returns:
+		int: id do mapa inserido ou atualizado
+	"""
+	colunas = Mapa.__table__.columns.keys()
+	valores = {k: v for k, v in mapa_data.items() if k in colunas and k != 'id'}
+	valores.update(_calcular_totais_mapa(valores))
+	valores['unidade_normalizada'] = ultra_normalizar_nome(valores.get('unidade', ''))
+	agora = datetime.now().isoformat()
+	valores['atualizado_em'] = agora
+	if not valores.get('criado_em'):
+		valores['criado_em'] = agora
+	# Em caso de conflito preserva criado_em do registro original
+	atualizar = {k: v for k, v in valores.items() if k not in _CHAVE_MAPA and k != 'criado_em'}
+	stmt = sqlite_insert(Mapa).values(**valores).on_conflict_do_update(
+		index_elements=_CHAVE_MAPA,
+		set_=atualizar
+	).returning(Mapa.id)
+	mapa_id = db.session.execute(stmt).scalar_one()
+	valores['id'] = mapa_id
+	_sincronizar_mapa_dia(valores)
+	return mapa_id
+
+
 def _load_mapas_by_period(mes_inicio, ano_inicio, mes_fim, ano_fim):
 	mapas_agregados = []
 	
@@ -498,219 +543,681 @@ def _detect_mes_ano_from_entry(entry):
 	return (mes, ano)
 
 
+# ----- Daily Fact Table (mapa_dia) -----
+_CAMPOS_REFEICOES = [
+	'cafe_interno', 'cafe_funcionario',
+	'almoco_interno', 'almoco_funcionario',
+	'lanche_interno', 'lanche_funcionario',
+	'jantar_interno', 'jantar_funcionario'
+]
+_CAMPOS_MAPA_DIA = _CAMPOS_REFEICOES + ['dados_siisp']
+
+# Chave única de um mapa (índice ux_mapas_lote_ano_mes_unidade)
+_CHAVE_MAPA = ['lote_id', 'ano', 'mes', 'unidade']
+
+
+def _valor_inteiro(valor):
+	try:
+		return int(float(valor)) if valor is not None and valor != '' else 0
+	except (ValueError, TypeError):
+		return 0
+
+
+def _linhas_mapa_dia(mapa):
+	"""
+	Gera as linhas diárias (tabela mapa_dia) a partir de um registro Mapa.
+	
+	Args:
+		mapa: instância de Mapa ou dict de colunas, já persistido (com id)
+	
+	Returns:
+		list: dicts prontos para inserção em MapaDia, um por dia
+	"""
+	series = {campo: decodificar_serie(_atributo_mapa(mapa, campo)) for campo in _CAMPOS_MAPA_DIA}
+	datas = decodificar_serie(_atributo_mapa(mapa, 'datas'))
+	total = max([len(v) for v in series.values()] + [len(datas)])
+	if total == 0:
+		return []
+
+	try:
+		ano = int(_atributo_mapa(mapa, 'ano'))
+		mes = int(_atributo_mapa(mapa, 'mes'))
+		dias_mes = calendar.monthrange(ano, mes)[1]
+	except Exception:
+		return []
+
+	# Sem coluna de datas e mapa recortado: o primeiro dia é o início do contrato
+	dia_inicial = 1
+	if not datas and total < dias_mes:
+		data_inicio_dt = _get_lote_data_inicio(_atributo_mapa(mapa, 'lote_id'))
+		if data_inicio_dt and data_inicio_dt.year == ano and data_inicio_dt.month == mes:
+			dia_inicial = data_inicio_dt.day
+
+	linhas = []
+	for i in range(total):
+		dia = None
+		if i < len(datas):
+			try:
+				data_dt = datetime.strptime(str(datas[i]).strip(), '%d/%m/%Y')
+				if data_dt.year == ano and data_dt.month == mes:
+					dia = data_dt.day
+			except Exception:
+				dia = None
+		if dia is None:
+			dia = dia_inicial + i
+		if dia < 1 or dia > dias_mes:
+			continue
+		linha = {
+			'mapa_id': _atributo_mapa(mapa, 'id'),
+			'lote_id': _atributo_mapa(mapa, 'lote_id'),
+			'unidade': _atributo_mapa(mapa, 'unidade'),
+			'ano': ano,
+			'mes': mes,
+			'dia': dia,
+			'data': f'{ano:04d}-{mes:02d}-{dia:02d}'
+		}
+		for campo, valores in series.items():
+			linha[campo] = _valor_inteiro(valores[i]) if i < len(valores) else 0
+		linhas.append(linha)
+	return linhas
+
+
+def _sincronizar_mapa_dia(mapa):
+	"""
+	Regrava as linhas de mapa_dia de um Mapa (write-through).
+	Não faz commit: deve ser chamada dentro da transação de quem salvou o mapa.
+	"""
+	if _atributo_mapa(mapa, 'id') is None:
+		db.session.flush()
+	MapaDia.query.filter_by(mapa_id=_atributo_mapa(mapa, 'id')).delete(synchronize_session=False)
+	linhas = _linhas_mapa_dia(mapa)
+	if linhas:
+		db.session.bulk_insert_mappings(MapaDia, linhas)
+	return len(linhas)
+
+
+def _remover_mapa_dia(mapa_id):
+	# Remove as linhas diárias de um mapa (sem commit)
+	return MapaDia.query.filter_by(mapa_id=mapa_id).delete(synchronize_session=False)
+
+
+def migrar_mapa_dia(forcar=False):
+	"""
+	Popula a tabela mapa_dia a partir dos registros existentes em mapas.
+	Só executa se a tabela estiver vazia (ou se forcar=True).
+	
+	Returns:
+		int: quantidade de linhas diárias geradas
+	"""
+	try:
+		if not forcar and MapaDia.query.first() is not None:
+			return 0
+		if forcar:
+			MapaDia.query.delete(synchronize_session=False)
+		total = 0
+		for mapa in Mapa.query.yield_per(200):
+			linhas = _linhas_mapa_dia(mapa)
+			if linhas:
+				db.session.bulk_insert_mappings(MapaDia, linhas)
+				total += len(linhas)
+		db.session.commit()
+		if total:
+			print(f"✅ mapa_dia populada com {total} linhas diárias")
+		return total
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao migrar mapa_dia: {e}")
+		return 0
+
+
+def agregar_mapa_dia(lotes_ids=None, unidades=None, agrupar_por=('lote_id', 'ano', 'mes'), data_inicio=None, data_fim=None):
+	"""
+	Agrega a tabela mapa_dia no SQLite com SUM/GROUP BY.
+	
+	Args:
+		lotes_ids: lista de IDs de lotes (None = todos)
+		unidades: lista de nomes de unidades (None = todas)
+		agrupar_por: colunas de MapaDia usadas no GROUP BY
+		data_inicio/data_fim: limites 'YYYY-MM-DD' (inclusivos)
+	
+	Returns:
+		list: dicts com as colunas de agrupamento e a soma de cada refeição
+	"""
+	colunas_grupo = [getattr(MapaDia, c) for c in agrupar_por]
+	somas = [db.func.sum(getattr(MapaDia, c)).label(c) for c in _CAMPOS_MAPA_DIA]
+	query = db.session.query(*colunas_grupo, *somas)
+	if lotes_ids:
+		query = query.filter(MapaDia.lote_id.in_([int(l) for l in lotes_ids]))
+	if unidades:
+		query = query.filter(MapaDia.unidade.in_(list(unidades)))
+	if data_inicio:
+		query = query.filter(MapaDia.data >= data_inicio)
+	if data_fim:
+		query = query.filter(MapaDia.data <= data_fim)
+	if colunas_grupo:
+		query = query.group_by(*colunas_grupo).order_by(*colunas_grupo)
+	resultado = []
+	for row in query.all():
+		item = dict(row._mapping)
+		for c in _CAMPOS_MAPA_DIA:
+			item[c] = int(item.get(c) or 0)
+		resultado.append(item)
+	return resultado
+
+
+# ----- Persisted Totals -----
+def _soma_inteira(valores):
+	# Soma como em calcular_metricas_lotes: cada valor convertido com int(), None conta 0
+	try:
+		return sum(int(x) if x is not None else 0 for x in valores)
+	except (ValueError, TypeError):
+		return None
+
+
+def _soma_positivos(valores):
+	# Soma dos valores positivos (excedente sobre o SIISP); None se o resultado não for inteiro
+	try:
+		total = sum(max(0, float(x)) if x is not None else 0 for x in valores)
+	except (ValueError, TypeError):
+		return None
+	return int(total) if float(total).is_integer() else None
+
+
+def _atributo_mapa(mapa, campo):
+	if isinstance(mapa, dict):
+		return mapa.get(campo)
+	return getattr(mapa, campo, None)
+
+
+def _calcular_totais_mapa(mapa):
+	"""
+	Calcula os totais persistidos de um mapa (Mapa ou dict de colunas):
+	refeições, SIISP, desvios e quantidade de dias.
+	
+	Returns:
+		dict: {'total_<campo>': int, 'desvio_<campo>': int, 'total_dias': int}
+	"""
+	totais = {}
+	total_dias = 0
+	for campo in _CAMPOS_MAPA_DIA:
+		serie = decodificar_serie(_atributo_mapa(mapa, campo))
+		total_dias = max(total_dias, len(serie))
+		totais[f'total_{campo}'] = _soma_inteira(serie)
+	for campo in _CAMPOS_REFEICOES:
+		serie = decodificar_serie(_atributo_mapa(mapa, f'{campo}_siisp'))
+		totais[f'desvio_{campo}'] = _soma_positivos(serie)
+	totais['total_dias'] = total_dias
+	return totais
+
+
+def _atualizar_totais_mapa(mapa):
+	"""
+	Recalcula os totais persistidos de um Mapa.
+	Não faz commit: deve ser chamada dentro da transação de quem salvou o mapa.
+	"""
+	for campo, valor in _calcular_totais_mapa(mapa).items():
+		setattr(mapa, campo, valor)
+
+
+def total_campo_mapa(mapa, campo):
+	"""
+	Total mensal de uma série do mapa (Mapa ou dict serializado).
+	Usa o total persistido; se ausente, soma a série.
+	"""
+	total = _atributo_mapa(mapa, f'total_{campo}')
+	if total is not None:
+		return total
+	return somar_serie(_atributo_mapa(mapa, campo))
+
+
+def desvio_campo_mapa(mapa, campo):
+	"""
+	Soma dos excedentes positivos de <campo>_siisp (Mapa ou dict serializado).
+	Usa o total persistido; se ausente, soma a série.
+	"""
+	total = _atributo_mapa(mapa, f'desvio_{campo}')
+	if total is not None:
+		return total
+	serie = decodificar_serie(_atributo_mapa(mapa, f'{campo}_siisp'))
+	try:
+		return sum(max(0, float(x)) if x is not None else 0 for x in serie)
+	except (ValueError, TypeError):
+		return 0
+
+
+def preencher_totais_mapas(lote_tamanho=200):
+	"""
+	Calcula os totais persistidos dos mapas que ainda não os possuem (migração).
+	
+	Returns:
+		int: quantidade de mapas atualizados
+	"""
+	try:
+		ids = [row[0] for row in db.session.query(Mapa.id).filter(Mapa.total_dias.is_(None)).all()]
+		for inicio in range(0, len(ids), lote_tamanho):
+			for mapa in Mapa.query.filter(Mapa.id.in_(ids[inicio:inicio + lote_tamanho])).all():
+				_atualizar_totais_mapa(mapa)
+			db.session.commit()
+		if ids:
+			print(f"✅ Totais calculados para {len(ids)} mapas")
+		return len(ids)
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao calcular totais dos mapas: {e}")
+		return 0
+
+
+def preencher_unidade_normalizada():
+	"""
+	Preenche unidade_normalizada dos mapas gravados antes da coluna existir (migração).
+	
+	Returns:
+		int: quantidade de mapas atualizados
+	"""
+	try:
+		pendentes = db.session.query(Mapa.id, Mapa.unidade).filter(Mapa.unidade_normalizada.is_(None)).all()
+		if pendentes:
+			db.session.bulk_update_mappings(Mapa, [
+				{'id': row.id, 'unidade_normalizada': ultra_normalizar_nome(row.unidade or '')} for row in pendentes
+			])
+			db.session.commit()
+			print(f"✅ Nome normalizado preenchido em {len(pendentes)} mapas")
+		return len(pendentes)
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao preencher nomes normalizados dos mapas: {e}")
+		return 0
+
+
 # ----- Main Map Operations -----
 
+def _montar_registro_mapa(entry):
+	"""
+	Monta o registro de um mapa a partir de uma entrada do payload de importação
+	(texto tabular ou listas), já com as séries codificadas e os campos *_siisp calculados.
+	
+	Returns:
+		dict com as colunas de Mapa, ou None se faltar mes/ano/unidade/lote_id
+	"""
+	# Lista de todos os campos do modelo Mapa
+	mapa_fields = [
+		'lote_id', 'mes', 'ano', 'unidade', 'linhas', 'colunas_count',
+		'dados_siisp', 'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
+		'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario',
+		'datas', 'criado_em', 'atualizado_em',
+		'cafe_interno_siisp', 'cafe_funcionario_siisp', 'almoco_interno_siisp', 'almoco_funcionario_siisp',
+		'lanche_interno_siisp', 'lanche_funcionario_siisp', 'jantar_interno_siisp', 'jantar_funcionario_siisp'
+	]
+	mes, ano = _detect_mes_ano_from_entry(entry)
+	unidade = entry.get('unidade')
+	lote_id = entry.get('lote_id')
+	if not (mes and ano and unidade and lote_id):
+		return None
+	# Se houver campo texto tabular, converter para listas
+	possible_text_keys = ('texto', 'conteudo', 'dados', 'texto_raw', 'texto_mapas', 'mapa_texto')
+	text_val = None
+	used_text_key = None
+	for k in possible_text_keys:
+		if k in entry and entry.get(k) is not None:
+			text_val = entry.get(k)
+			used_text_key = k
+			break
+	if text_val is not None:
+		parsed = parse_texto_tabular(text_val)
+		if parsed.get('ok'):
+			cols = parsed.get('colunas') or {}
+			for ck, cv in cols.items():
+				entry[ck] = cv
+			entry['linhas'] = parsed.get('linhas')
+			entry['colunas_count'] = parsed.get('colunas_count')
+			col_count = int(parsed.get('colunas_count') or 0)
+			if col_count == 1:
+				if 'coluna_0' in entry:
+					entry['dados_siisp'] = entry.pop('coluna_0')
+				else:
+					entry['dados_siisp'] = []
+			else:
+				col_rename_map = {
+					'coluna_1': 'cafe_interno',
+					'coluna_2': 'cafe_funcionario',
+					'coluna_3': 'almoco_interno',
+					'coluna_4': 'almoco_funcionario',
+					'coluna_5': 'lanche_interno',
+					'coluna_6': 'lanche_funcionario',
+					'coluna_7': 'jantar_interno',
+					'coluna_8': 'jantar_funcionario'
+				}
+				for oldk, newk in col_rename_map.items():
+					if oldk in entry:
+						entry[newk] = entry.pop(oldk)
+				if 'coluna_0' in entry:
+					try:
+						datas = _normalizar_datas_coluna(entry.get('coluna_0'), entry)
+						entry.pop('coluna_0', None)
+						entry['datas'] = datas
+					except Exception:
+						pass
+			# --- Recorte dos arrays após parsing tabular ---
+				# Só recorta se houver data_inicio/data_fim, mes, ano
+				data_inicio = entry.get('data_inicio')
+				data_fim = entry.get('data_fim')
+				mes = entry.get('mes')
+				ano = entry.get('ano')
+				if data_inicio and data_fim and mes and ano:
+					try:
+						data_inicio_dt = datetime.strptime(str(data_inicio), "%Y-%m-%d")
+						data_fim_dt = datetime.strptime(str(data_fim), "%Y-%m-%d")
+						dias_do_mes = [datetime(int(ano), int(mes), d+1) for d in range(calendar.monthrange(int(ano), int(mes))[1])]
+						indices_validos = [i for i, dia in enumerate(dias_do_mes) if data_inicio_dt <= dia <= data_fim_dt]
+						campos_refeicoes = [
+							'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
+							'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario'
+						]
+						for campo in campos_refeicoes:
+							vals = entry.get(campo)
+							if isinstance(vals, list):
+								entry[campo] = [vals[i] for i in indices_validos]
+						# Recortar dados_siisp usando os mesmos índices válidos, mesmo se já for lista
+						if 'dados_siisp' in entry and isinstance(entry['dados_siisp'], list):
+							entry['dados_siisp'] = [entry['dados_siisp'][i] for i in indices_validos if i < len(entry['dados_siisp'])]
+						if 'datas' in entry and isinstance(entry['datas'], list):
+							entry['datas'] = [entry['datas'][i] for i in indices_validos if i < len(entry['datas'])]
+					except Exception as e:
+						pass
+		if used_text_key:
+			try:
+				entry.pop(used_text_key, None)
+			except Exception:
+				pass
+	mapa_data = {}
+
+	# Usar o tamanho real dos arrays recortados
+	meal_fields = [
+		'cafe_interno', 'cafe_funcionario',
+		'almoco_interno', 'almoco_funcionario',
+		'lanche_interno', 'lanche_funcionario',
+		'jantar_interno', 'jantar_funcionario'
+	]
+	# Descobrir o tamanho real dos dados (prioridade: primeiro campo de refeição válido, depois dados_siisp, depois datas)
+	tamanho_real = None
+	for field in meal_fields:
+		val = entry.get(field)
+		if isinstance(val, list) and len(val) > 0:
+			tamanho_real = len(val)
+			break
+	if tamanho_real is None or tamanho_real == 0:
+		dados_siisp = entry.get('dados_siisp')
+		if isinstance(dados_siisp, list) and len(dados_siisp) > 0:
+			tamanho_real = len(dados_siisp)
+	if tamanho_real is None or tamanho_real == 0:
+		datas = entry.get('datas')
+		if isinstance(datas, list) and len(datas) > 0:
+			tamanho_real = len(datas)
+	# Se ainda for None ou zero, usa o número de dias do mês
+	if (tamanho_real is None or tamanho_real == 0) and mes and ano:
+		try:
+			tamanho_real = calendar.monthrange(int(ano), int(mes))[1]
+		except Exception:
+			tamanho_real = 0
+	if tamanho_real is None:
+		tamanho_real = 0
+
+	# Preencher dados_siisp corretamente (parse string if needed)
+	dados_siisp = entry.get('dados_siisp')
+	if isinstance(dados_siisp, str):
+		parsed_siisp = parse_texto_tabular(dados_siisp)
+		if parsed_siisp.get('ok') and 'coluna_0' in parsed_siisp.get('colunas', {}):
+			dados_siisp = parsed_siisp['colunas']['coluna_0']
+		else:
+			dados_siisp = None
+	# Garante que dados_siisp seja sempre uma lista de zeros se estiver vazio ou não for lista
+	if not isinstance(dados_siisp, list) or len(dados_siisp) == 0:
+		dados_siisp = [0] * tamanho_real
+	# Se por algum motivo ainda estiver vazio, força preenchimento
+	if isinstance(dados_siisp, list) and len(dados_siisp) == 0 and tamanho_real > 0:
+		dados_siisp = [0] * tamanho_real
+	# Se houver indices_validos, recorta usando eles; senão, recorta para o tamanho real
+	if 'indices_validos' in locals() and isinstance(indices_validos, list) and len(indices_validos) == tamanho_real:
+		dados_siisp = [dados_siisp[i] for i in indices_validos if i < len(dados_siisp)]
+	elif len(dados_siisp) != tamanho_real:
+		dados_siisp = dados_siisp[:tamanho_real]
+	# Força preenchimento com zeros se ainda estiver vazio
+	if isinstance(dados_siisp, list) and len(dados_siisp) == 0 and tamanho_real > 0:
+		dados_siisp = [0] * tamanho_real
+	mapa_data['dados_siisp'] = codificar_serie(dados_siisp)
+
+	# Preencher campos de refeições
+	series_refeicoes = {}
+	for field in meal_fields:
+		val = entry.get(field)
+		if isinstance(val, list):
+			if len(val) != tamanho_real:
+				val = val[:tamanho_real]
+		else:
+			val = [0] * tamanho_real
+		series_refeicoes[field] = val
+		mapa_data[field] = codificar_serie(val)
+
+	# Calcular *_siisp = campo - dados_siisp
+	for field in meal_fields:
+		campo = series_refeicoes[field]
+		siisp = [campo[i] - dados_siisp[i] if i < len(campo) and i < len(dados_siisp) else 0 for i in range(tamanho_real)]
+		mapa_data[f'{field}_siisp'] = codificar_serie(siisp)
+
+	# Preencher datas
+	datas = entry.get('datas')
+	if isinstance(datas, list):
+		if len(datas) != tamanho_real:
+			datas = datas[:tamanho_real]
+		mapa_data['datas'] = json.dumps(datas)
+	else:
+		mapa_data['datas'] = json.dumps([])
+
+	# Preencher outros campos
+	for field in mapa_fields:
+		if field in mapa_data:
+			continue
+		val = entry.get(field)
+		if isinstance(val, list):
+			mapa_data[field] = json.dumps(val)
+		elif val is not None:
+			mapa_data[field] = val
+		elif field in ['linhas', 'colunas_count', 'lote_id', 'mes', 'ano']:
+			mapa_data[field] = 0
+		elif field in ['criado_em', 'atualizado_em']:
+			mapa_data[field] = datetime.now().isoformat()
+		else:
+			mapa_data[field] = ''
+	return mapa_data
+
+
 def salvar_mapas_raw(payload):
 	try:
 		entries = payload if isinstance(payload, list) else [payload or {}]
 		saved_ids = []
-		saved_records = []
-		# Lista de todos os campos do modelo Mapa
-		mapa_fields = [
-			'lote_id', 'mes', 'ano', 'unidade', 'linhas', 'colunas_count',
-			'dados_siisp', 'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
-			'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario',
-			'datas', 'criado_em', 'atualizado_em',
-			'cafe_interno_siisp', 'cafe_funcionario_siisp', 'almoco_interno_siisp', 'almoco_funcionario_siisp',
-			'lanche_interno_siisp', 'lanche_funcionario_siisp', 'jantar_interno_siisp', 'jantar_funcionario_siisp'
-		]
 		for entry in entries:
-			mes, ano = _detect_mes_ano_from_entry(entry)
-			unidade = entry.get('unidade')
-			lote_id = entry.get('lote_id')
-			if not (mes and ano and unidade and lote_id):
+			mapa_data = _montar_registro_mapa(entry)
+			if mapa_data is None:
 				continue
-			# Se houver campo texto tabular, converter para listas
-			possible_text_keys = ('texto', 'conteudo', 'dados', 'texto_raw', 'texto_mapas', 'mapa_texto')
-			text_val = None
-			used_text_key = None
-			for k in possible_text_keys:
-				if k in entry and entry.get(k) is not None:
-					text_val = entry.get(k)
-					used_text_key = k
-					break
-			if text_val is not None:
-				parsed = parse_texto_tabular(text_val)
-				if parsed.get('ok'):
-					cols = parsed.get('colunas') or {}
-					for ck, cv in cols.items():
-						entry[ck] = cv
-					entry['linhas'] = parsed.get('linhas')
-					entry['colunas_count'] = parsed.get('colunas_count')
-					col_count = int(parsed.get('colunas_count') or 0)
-					if col_count == 1:
-						if 'coluna_0' in entry:
-							entry['dados_siisp'] = entry.pop('coluna_0')
-						else:
-							entry['dados_siisp'] = []
-					else:
-						col_rename_map = {
-							'coluna_1': 'cafe_interno',
-							'coluna_2': 'cafe_funcionario',
-							'coluna_3': 'almoco_interno',
-							'coluna_4': 'almoco_funcionario',
-							'coluna_5': 'lanche_interno',
-							'coluna_6': 'lanche_funcionario',
-							'coluna_7': 'jantar_interno',
-							'coluna_8': 'jantar_funcionario'
-						}
-						for oldk, newk in col_rename_map.items():
-							if oldk in entry:
-								entry[newk] = entry.pop(oldk)
-						if 'coluna_0' in entry:
-							try:
-								datas = _normalizar_datas_coluna(entry.get('coluna_0'), entry)
-								entry.pop('coluna_0', None)
-								entry['datas'] = datas
-							except Exception:
-								pass
-					# --- Recorte dos arrays após parsing tabular ---
-						# Só recorta se houver data_inicio/data_fim, mes, ano
-						data_inicio = entry.get('data_inicio')
-						data_fim = entry.get('data_fim')
-						mes = entry.get('mes')
-						ano = entry.get('ano')
-						if data_inicio and data_fim and mes and ano:
-							try:
-								data_inicio_dt = datetime.strptime(str(data_inicio), "%Y-%m-%d")
-								data_fim_dt = datetime.strptime(str(data_fim), "%Y-%m-%d")
-								dias_do_mes = [datetime(int(ano), int(mes), d+1) for d in range(calendar.monthrange(int(ano), int(mes))[1])]
-								indices_validos = [i for i, dia in enumerate(dias_do_mes) if data_inicio_dt <= dia <= data_fim_dt]
-								campos_refeicoes = [
-									'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
-									'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario'
-								]
-								for campo in campos_refeicoes:
-									vals = entry.get(campo)
-									if isinstance(vals, list):
-										entry[campo] = [vals[i] for i in indices_validos]
-								# Recortar dados_siisp usando os mesmos índices válidos, mesmo se já for lista
-								if 'dados_siisp' in entry and isinstance(entry['dados_siisp'], list):
-									entry['dados_siisp'] = [entry['dados_siisp'][i] for i in indices_validos if i < len(entry['dados_siisp'])]
-								if 'datas' in entry and isinstance(entry['datas'], list):
-									entry['datas'] = [entry['datas'][i] for i in indices_validos if i < len(entry['datas'])]
-							except Exception as e:
-								pass
-				if used_text_key:
-					try:
-						entry.pop(used_text_key, None)
-					except Exception:
-						pass
-			mapa = Mapa.query.filter_by(mes=mes, ano=ano, unidade=unidade, lote_id=lote_id).first()
-			mapa_data = {}
-
-			# Usar o tamanho real dos arrays recortados
-			meal_fields = [
-				'cafe_interno', 'cafe_funcionario',
-				'almoco_interno', 'almoco_funcionario',
-				'lanche_interno', 'lanche_funcionario',
-				'jantar_interno', 'jantar_funcionario'
-			]
-			# Descobrir o tamanho real dos dados (prioridade: primeiro campo de refeição válido, depois dados_siisp, depois datas)
-			tamanho_real = None
-			for field in meal_fields:
-				val = entry.get(field)
-				if isinstance(val, list) and len(val) > 0:
-					tamanho_real = len(val)
-					break
-			if tamanho_real is None or tamanho_real == 0:
-				dados_siisp = entry.get('dados_siisp')
-				if isinstance(dados_siisp, list) and len(dados_siisp) > 0:
-					tamanho_real = len(dados_siisp)
-			if tamanho_real is None or tamanho_real == 0:
-				datas = entry.get('datas')
-				if isinstance(datas, list) and len(datas) > 0:
-					tamanho_real = len(datas)
-			# Se ainda for None ou zero, usa o número de dias do mês
-			if (tamanho_real is None or tamanho_real == 0) and mes and ano:
-				try:
-					tamanho_real = calendar.monthrange(int(ano), int(mes))[1]
-				except Exception:
-					tamanho_real = 0
-			if tamanho_real is None:
-				tamanho_real = 0
-
-			# Preencher dados_siisp corretamente (parse string if needed)
-			dados_siisp = entry.get('dados_siisp')
-			if isinstance(dados_siisp, str):
-				parsed_siisp = parse_texto_tabular(dados_siisp)
-				if parsed_siisp.get('ok') and 'coluna_0' in parsed_siisp.get('colunas', {}):
-					dados_siisp = parsed_siisp['colunas']['coluna_0']
-				else:
-					dados_siisp = None
-			# Garante que dados_siisp seja sempre uma lista de zeros se estiver vazio ou não for lista
-			if not isinstance(dados_siisp, list) or len(dados_siisp) == 0:
-				dados_siisp = [0] * tamanho_real
-			# Se por algum motivo ainda estiver vazio, força preenchimento
-			if isinstance(dados_siisp, list) and len(dados_siisp) == 0 and tamanho_real > 0:
-				dados_siisp = [0] * tamanho_real
-			# Se houver indices_validos, recorta usando eles; senão, recorta para o tamanho real
-			if 'indices_validos' in locals() and isinstance(indices_validos, list) and len(indices_validos) == tamanho_real:
-				dados_siisp = [dados_siisp[i] for i in indices_validos if i < len(dados_siisp)]
-			elif len(dados_siisp) != tamanho_real:
-				dados_siisp = dados_siisp[:tamanho_real]
-			# Força preenchimento com zeros se ainda estiver vazio
-			if isinstance(dados_siisp, list) and len(dados_siisp) == 0 and tamanho_real > 0:
-				dados_siisp = [0] * tamanho_real
-			mapa_data['dados_siisp'] = json.dumps(dados_siisp)
-
-			# Preencher campos de refeições
-			for field in meal_fields:
-				val = entry.get(field)
-				if isinstance(val, list):
-					if len(val) != tamanho_real:
-						val = val[:tamanho_real]
-					mapa_data[field] = json.dumps(val)
-				else:
-					mapa_data[field] = json.dumps([0] * tamanho_real)
+			mapa_id = _upsert_mapa(mapa_data)
+			db.session.commit()
+			invalidar_mapas()
+			saved_ids.append(mapa_id)
+		return {'success': True, 'ids': saved_ids, 'registros': list(saved_ids)}
+	except Exception as e:
+		db.session.rollback()
+		return {'success': False, 'error': f'Erro ao salvar mapas: {e}'}
 
-			# Calcular *_siisp = campo - dados_siisp
-			for field in meal_fields:
-				campo = json.loads(mapa_data[field])
-				siisp = [campo[i] - dados_siisp[i] if i < len(campo) and i < len(dados_siisp) else 0 for i in range(tamanho_real)]
-				mapa_data[f'{field}_siisp'] = json.dumps(siisp)
-
-			# Preencher datas
-			datas = entry.get('datas')
-			if isinstance(datas, list):
-				if len(datas) != tamanho_real:
-					datas = datas[:tamanho_real]
-				mapa_data['datas'] = json.dumps(datas)
-			else:
-				mapa_data['datas'] = json.dumps([])
-
-			# Preencher outros campos
-			for field in mapa_fields:
-				if field in mapa_data:
-					continue
-				val = entry.get(field)
-				if isinstance(val, list):
-					mapa_data[field] = json.dumps(val)
-				elif val is not None:
-					mapa_data[field] = val
-				elif field in ['linhas', 'colunas_count', 'lote_id', 'mes', 'ano']:
-					mapa_data[field] = 0
-				elif field in ['criado_em', 'atualizado_em']:
-					mapa_data[field] = datetime.now().isoformat()
-				else:
-					mapa_data[field] = ''
-			if mapa:
-				for k, v in mapa_data.items():
-					setattr(mapa, k, v)
-				mapa.atualizado_em = datetime.now().isoformat()
-				db.session.commit()
-				saved_ids.append(mapa.id)
-				saved_records.append(mapa)
-			else:
-				novo_mapa = Mapa(**mapa_data)
-				db.session.add(novo_mapa)
-				db.session.commit()
-				saved_ids.append(novo_mapa.id)
-				saved_records.append(novo_mapa)
-		return {'success': True, 'ids': saved_ids, 'registros': [m.id for m in saved_records]}
+
+def _aplicar_periodo_contrato(entry, lote):
+	"""
+	Valida o mês/ano da entrada contra a vigência do lote e prepara o recorte dos dias
+	fora do contrato (mesmas regras de /api/adicionar-dados).
+	
+	Returns:
+		str com a mensagem de erro, ou None se a entrada for válida
+	"""
+	if lote is None:
+		return f"Lote {entry.get('lote_id')} não encontrado"
+	data_inicio = getattr(lote, 'data_inicio', None)
+	data_fim = getattr(lote, 'data_fim', None)
+	mes, ano = _detect_mes_ano_from_entry(entry)
+	if not (data_inicio and data_fim and mes and ano):
+		return None
+	try:
+		data_inicio_dt = datetime.strptime(str(data_inicio), "%Y-%m-%d")
+		data_fim_dt = datetime.strptime(str(data_fim), "%Y-%m-%d")
+	except Exception:
+		return None
+	dias_do_mes = [datetime(int(ano), int(mes), d + 1) for d in range(calendar.monthrange(int(ano), int(mes))[1])]
+	if dias_do_mes[-1] < data_inicio_dt or dias_do_mes[0] > data_fim_dt:
+		return f"O mapa ({mes}/{ano}) está fora do período do lote ({data_inicio} a {data_fim}) e não será salvo."
+	# Listas já enviadas são recortadas aqui; texto tabular é recortado em _montar_registro_mapa
+	indices_validos = [i for i, dia in enumerate(dias_do_mes) if data_inicio_dt <= dia <= data_fim_dt]
+	for campo in _CAMPOS_REFEICOES + ['datas']:
+		vals = entry.get(campo)
+		if isinstance(vals, list) and len(vals) == len(dias_do_mes):
+			entry[campo] = [vals[i] for i in indices_validos]
+	entry['data_inicio'] = data_inicio
+	entry['data_fim'] = data_fim
+	return None
+
+
+def _ids_mapas_por_chave(chaves):
+	# {(lote_id, ano, mes, unidade): id} dos mapas existentes, com uma única consulta
+	chaves = list(chaves)
+	if not chaves:
+		return {}
+	return {
+		(row.lote_id, row.ano, row.mes, row.unidade): row.id
+		for row in db.session.query(Mapa.id, Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade).filter(
+			tuple_(Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade).in_(chaves)
+		)
+	}
+
+
+def salvar_mapas_lote(payload):
+	"""
+	Importação em lote de mapas: registros montados em memória e gravação em uma
+	única transação, com o mesmo INSERT ... ON CONFLICT (lote_id, ano, mes, unidade)
+	DO UPDATE de _upsert_mapa executado para todas as entradas (executemany). Um
+	mapa inserido por outra gravação durante a importação é atualizado, não falha.
+	
+	Args:
+		payload: lista de entradas no mesmo formato de salvar_mapas_raw
+	
+	Returns:
+		dict: {'success', 'resultados': [...por entrada], 'inseridos', 'atualizados',
+		       'erros', 'tempos_ms': {...}}
+	"""
+	from .models import Lote
+
+	inicio = time.perf_counter()
+	entries = payload if isinstance(payload, list) else [payload or {}]
+	resultados = [None] * len(entries)
+	registros = {}  # chave (lote_id, ano, mes, unidade) -> (índice, mapa_data)
+	lotes_cache = {}
+
+	# 1. Montar todos os registros em memória
+	for indice, entry in enumerate(entries):
+		if not isinstance(entry, dict):
+			resultados[indice] = {'indice': indice, 'success': False, 'error': 'Entrada inválida'}
+			continue
+		try:
+			lote_id = int(entry.get('lote_id'))
+		except (ValueError, TypeError):
+			resultados[indice] = {'indice': indice, 'success': False, 'error': 'lote_id inválido'}
+			continue
+		if lote_id not in lotes_cache:
+			lotes_cache[lote_id] = db.session.get(Lote, lote_id)
+		erro = _aplicar_periodo_contrato(entry, lotes_cache[lote_id])
+		if erro:
+			resultados[indice] = {'indice': indice, 'success': False, 'error': erro}
+			continue
+		try:
+			mapa_data = _montar_registro_mapa(entry)
+		except Exception as e:
+			resultados[indice] = {'indice': indice, 'success': False, 'error': f'Erro ao processar entrada: {e}'}
+			continue
+		if mapa_data is None:
+			resultados[indice] = {'indice': indice, 'success': False, 'error': 'Campos obrigatórios ausentes: lote_id, mes, ano, unidade'}
+			continue
+		mapa_data['lote_id'] = lote_id
+		mapa_data['mes'] = int(mapa_data['mes'])
+		mapa_data['ano'] = int(mapa_data['ano'])
+		mapa_data.update(_calcular_totais_mapa(mapa_data))
+		mapa_data['unidade_normalizada'] = ultra_normalizar_nome(mapa_data['unidade'])
+		chave = (lote_id, mapa_data['ano'], mapa_data['mes'], mapa_data['unidade'])
+		if chave in registros:
+			# A última entrada para a mesma chave prevalece
+			indice_anterior = registros[chave][0]
+			resultados[indice_anterior] = {'indice': indice_anterior, 'success': False, 'error': f'Substituída pela entrada {indice}'}
+		registros[chave] = (indice, mapa_data)
+	tempo_preparo = time.perf_counter()
+
+	# 2. Chaves já existentes (só para informar inserido/atualizado no resultado)
+	existentes = _ids_mapas_por_chave(registros.keys())
+	tempo_consulta = time.perf_counter()
+
+	# 3. Gravar tudo em uma transação: UPSERT em executemany e linhas de mapa_dia
+	colunas = set(Mapa.__table__.columns.keys()) - {'id'}
+	agora = datetime.now().isoformat()
+	grupos = defaultdict(list)  # colunas enviadas -> linhas (um executemany por conjunto de colunas)
+	for indice, mapa_data in registros.values():
+		mapa_data['atualizado_em'] = agora
+		mapa_data['criado_em'] = mapa_data.get('criado_em') or agora
+		linha = {k: v for k, v in mapa_data.items() if k in colunas}
+		grupos[tuple(sorted(linha))].append(linha)
+	try:
+		for nomes, linhas in grupos.items():
+			stmt = sqlite_insert(Mapa)
+			# Em caso de conflito preserva criado_em do registro original (como em _upsert_mapa)
+			stmt = stmt.on_conflict_do_update(
+				index_elements=_CHAVE_MAPA,
+				set_={k: stmt.excluded[k] for k in nomes if k not in _CHAVE_MAPA and k != 'criado_em'}
+			)
+			db.session.execute(stmt, linhas)
+		ids = _ids_mapas_por_chave(registros.keys())
+		for chave, (indice, mapa_data) in registros.items():
+			mapa_data['id'] = ids[chave]
+		if ids:
+			MapaDia.query.filter(MapaDia.mapa_id.in_(list(ids.values()))).delete(synchronize_session=False)
+			linhas_dia = []
+			for indice, mapa_data in registros.values():
+				linhas_dia.extend(_linhas_mapa_dia(mapa_data))
+			if linhas_dia:
+				db.session.bulk_insert_mappings(MapaDia, linhas_dia)
+		db.session.commit()
+		invalidar_mapas()
 	except Exception as e:
 		db.session.rollback()
 		return {'success': False, 'error': f'Erro ao salvar mapas: {e}'}
+	tempo_gravacao = time.perf_counter()
+
+	for chave, (indice, mapa_data) in registros.items():
+		resultados[indice] = {
+			'indice': indice,
+			'success': True,
+			'id': mapa_data['id'],
+			'operacao': 'atualizado' if chave in existentes else 'inserido',
+			'unidade': mapa_data['unidade'],
+			'mes': mapa_data['mes'],
+			'ano': mapa_data['ano']
+		}
+	erros = sum(1 for r in resultados if not r or not r.get('success'))
+	return {
+		'success': True,
+		'resultados': resultados,
+		'inseridos': sum(1 for chave in registros if chave not in existentes),
+		'atualizados': sum(1 for chave in registros if chave in existentes),
+		'erros': erros,
+		'tempos_ms': {
+			'preparo': round((tempo_preparo - inicio) * 1000, 2),
+			'consulta': round((tempo_consulta - tempo_preparo) * 1000, 2),
+			'gravacao': round((tempo_gravacao - tempo_consulta) * 1000, 2),
+			'total': round((tempo_gravacao - inicio) * 1000, 2)
+		}
+	}
 
 
 def preparar_dados_entrada_manual(data):
@@ -906,19 +1413,72 @@ def excluir_mapa(payload):
 		return {'success': False, 'error': f'Mapa não encontrado para Unidade "{unidade}", período {mes:02d}/{ano}.'}
 	mapa_id = mapa.id
 	try:
+		_remover_mapa_dia(mapa_id=mapa_id)
 		db.session.delete(mapa)
 		db.session.commit()
+		invalidar_mapas()
 		return {'success': True, 'mensagem': f'Mapa {mapa_id} da unidade "{unidade}" ({mes:02d}/{ano}) excluído com sucesso.', 'id': mapa_id}
 	except Exception as e:
 		db.session.rollback()
 		return {'success': False, 'error': f'Erro ao excluir mapa: {e}'}
 
 
+def _vetor_precos_metricas(precos):
+	# Preço unitário de cada refeição (ordem de _CAMPOS_REFEICOES); inválido ou ausente: 0.0
+	if not isinstance(precos, dict):
+		precos = {}
+	vetor = []
+	for campo in _CAMPOS_REFEICOES:
+		refeicao, tipo = campo.split('_', 1)
+		if isinstance(precos.get(refeicao), dict):
+			valor = precos[refeicao].get(tipo, 0)
+		else:
+			valor = precos.get(campo, 0)
+		try:
+			vetor.append(float(valor))
+		except (ValueError, TypeError):
+			vetor.append(0.0)
+	return vetor
+
+
+def _somar_grupos_sequencial(valores, mapas_por_grupo, pesos=None):
+	"""
+	Soma os valores (mapas × campos) de cada grupo de mapas, vetorizado entre os grupos.
+	
+	Cada grupo acumula mapa a mapa e campo a campo, na mesma ordem de uma soma
+	sequencial em Python, para que os resultados em ponto flutuante sejam idênticos.
+	
+	Args:
+		valores: ndarray (mapas × campos)
+		mapas_por_grupo: ndarray (grupos × máximo de mapas) com índices dos mapas (-1: vazio)
+		pesos: ndarray (grupos × campos) multiplicado campo a campo (ex.: preços)
+	
+	Returns:
+		ndarray com a soma de cada grupo
+	"""
+	dtype = np.float64 if pesos is not None else valores.dtype
+	acumulado = np.zeros(mapas_por_grupo.shape[0], dtype=dtype)
+	for k in range(mapas_por_grupo.shape[1]):
+		indices = mapas_por_grupo[:, k]
+		ativos = indices >= 0
+		linhas = valores[indices[ativos]]
+		for c in range(valores.shape[1]):
+			if pesos is None:
+				acumulado[ativos] += linhas[:, c]
+			else:
+				acumulado[ativos] += linhas[:, c] * pesos[ativos, c]
+	return acumulado
+
+
 def calcular_metricas_lotes(lotes, mapas):
 	"""
 	Calcula métricas de refeições, custos e desvios para cada lote.
 	Modifica os lotes in-place adicionando as métricas calculadas.
 	
+	Os totais persistidos dos mapas são empilhados em matrizes (mapas × 8 refeições)
+	e reduzidos com NumPy por lote/mês; custo e desvio usam o vetor de preços do lote
+	de origem de cada mapa, montado uma vez por lote.
+	
 	Args:
 		lotes: Lista de lotes
 		mapas: Lista de mapas
@@ -926,121 +1486,93 @@ def calcular_metricas_lotes(lotes, mapas):
 	Returns:
 		None (modifica os lotes in-place)
 	"""
-	# print removido: [DEBUG] Iniciando calcular_metricas_lotes
-	meses_por_lote = defaultdict(set)
-	totais_refeicoes_por_lote = {}
-	totais_custos_por_lote = {}
-	totais_desvios_por_lote = {}
-
-	# NOVO: Calcular refeições por mês para cada lote
-	campos_refeicoes = [
-		'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
-		'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario'
-	]
-	mapas_por_lote_mes = defaultdict(lambda: defaultdict(list))
-	for m in (mapas or []):
-		# Garante que m seja dict
-		if not isinstance(m, dict):
-			try:
-				m = serialize_mapa(m)
-			except Exception:
-				continue
-		lote_id = str(m.get('lote_id'))
-		mes = m.get('mes')
-		ano = m.get('ano')
-		mapas_por_lote_mes[lote_id][f'{mes}/{ano}'].append(m)
-
-	# Criar mapeamento de lotes por ID para buscar predecessores
+	mapas = list(mapas or [])
+
+	# Grupos (lote, mês/ano) na ordem em que aparecem; aceita Mapa ou dict (totais persistidos)
+	grupos_por_lote = defaultdict(dict)  # lote_id (str) -> {mes_ano: índice do grupo}
+	mapas_grupo = []
+	totais = []
+	desvios = []
+	for m in mapas:
+		lote_id = str(_atributo_mapa(m, 'lote_id'))
+		mes_ano = f"{_atributo_mapa(m, 'mes')}/{_atributo_mapa(m, 'ano')}"
+		grupo = grupos_por_lote[lote_id].get(mes_ano)
+		if grupo is None:
+			grupo = len(mapas_grupo)
+			grupos_por_lote[lote_id][mes_ano] = grupo
+			mapas_grupo.append([])
+		mapas_grupo[grupo].append(len(totais))
+		totais.append([total_campo_mapa(m, campo) for campo in _CAMPOS_REFEICOES])
+		desvios.append([desvio_campo_mapa(m, campo) for campo in _CAMPOS_REFEICOES])
+
+	# Matrizes (mapas × campos): int64 quando todos os totais são inteiros
+	def _matriz(linhas):
+		if linhas and all(isinstance(v, int) for linha in linhas for v in linha):
+			return np.array(linhas, dtype=np.int64)
+		return np.array(linhas, dtype=np.float64).reshape(len(linhas), len(_CAMPOS_REFEICOES))
+	matriz_totais = _matriz(totais)
+	matriz_desvios = _matriz(desvios)
+	grupo_com_float = [any(isinstance(v, float) for i in grupo for v in totais[i]) for grupo in mapas_grupo]
+
+	largura = max([len(g) for g in mapas_grupo] + [0])
+	indices_grupo = np.full((len(mapas_grupo), largura), -1, dtype=np.intp)
+	for g, indices in enumerate(mapas_grupo):
+		indices_grupo[g, :len(indices)] = indices
+
+	# Refeições por grupo (lote, mês)
+	refeicoes_grupo = _somar_grupos_sequencial(matriz_totais, indices_grupo).tolist()
+
+	# Vetor de preços de cada lote, montado uma vez
 	lotes_por_id = {lote.get('id'): lote for lote in lotes}
+	precos_por_lote = {str(lote.get('id')): _vetor_precos_metricas(lote.get('precos', {})) for lote in lotes}
 
+	# Pares (grupo, lote cujos preços se aplicam) usados pelos lotes e suas linhagens
+	cadeias = {}
+	pares = {}
 	for lote in lotes:
 		lid = str(lote.get('id'))
-		refeicoes_por_mes = {}
-		meses_count = 0
-		custo_total = 0.0
-		desvio_total = 0.0
-		total_refeicoes = 0
-
-		# Expandir para incluir predecessores (como nos relatórios)
+		# Predecessores seguidos pela própria lista de lotes (a cadeia para no primeiro
+		# ausente ou ao repetir um lote)
 		lotes_ids_para_buscar = [lid]
 		predecessor_id = lote.get('lote_predecessor_id')
-		while predecessor_id:
+		while predecessor_id and str(predecessor_id) not in lotes_ids_para_buscar:
 			lotes_ids_para_buscar.append(str(predecessor_id))
 			lote_predecessor = lotes_por_id.get(predecessor_id)
 			if lote_predecessor:
 				predecessor_id = lote_predecessor.get('lote_predecessor_id')
 			else:
 				break
-		
-		# Para cada mês/ano, agregue os mapas e calcule as métricas (incluindo predecessores)
+		cadeia = []
 		for lote_id_busca in lotes_ids_para_buscar:
-			# Usar preços do lote correto (cada predecessor pode ter preços diferentes)
-			lote_id_int = int(lote_id_busca) if isinstance(lote_id_busca, str) else lote_id_busca
-			lote_atual = lotes_por_id.get(lote_id_int) if lote_id_busca != lid else lote
-			precos_lote = lote_atual.get('precos', {}) if lote_atual else lote.get('precos', {})
-			
-			for mes_ano, mapas_mes in mapas_por_lote_mes[lote_id_busca].items():
-				if mes_ano not in refeicoes_por_mes:
-					refeicoes_por_mes[mes_ano] = 0
-				
-				total_mes = 0
-				custo_mes = 0.0
-				desvio_mes = 0.0
-				for mapa in mapas_mes:
-					# Soma refeições
-					for campo in campos_refeicoes:
-						vals = mapa.get(campo, [])
-						if isinstance(vals, list):
-							total_mes += sum(int(x) if x is not None else 0 for x in vals)
-					# Cálculo de custo e desvio por mapa
-					def get_preco(refeicao, tipo):
-						if isinstance(precos_lote.get(refeicao), dict):
-							valor = precos_lote[refeicao].get(tipo, 0)
-						else:
-							chave = f"{refeicao}_{tipo}"
-							valor = precos_lote.get(chave, 0)
-						try:
-							return float(valor)
-						except (ValueError, TypeError):
-							return 0.0
-					meal_fields = [
-						('cafe_interno', get_preco('cafe', 'interno')),
-						('cafe_funcionario', get_preco('cafe', 'funcionario')),
-						('almoco_interno', get_preco('almoco', 'interno')),
-						('almoco_funcionario', get_preco('almoco', 'funcionario')),
-						('lanche_interno', get_preco('lanche', 'interno')),
-						('lanche_funcionario', get_preco('lanche', 'funcionario')),
-						('jantar_interno', get_preco('jantar', 'interno')),
-						('jantar_funcionario', get_preco('jantar', 'funcionario'))
-					]
-					for field_name, preco_unitario in meal_fields:
-						if field_name in mapa and isinstance(mapa[field_name], list):
-							try:
-								quantidade = sum(int(x) if x is not None else 0 for x in mapa[field_name])
-								custo_mes += quantidade * preco_unitario
-							except Exception:
-								pass
-					# Desvio: soma dos campos *_siisp
-					siisp_fields = [
-						('cafe_interno_siisp', 'cafe', 'interno'),
-						('cafe_funcionario_siisp', 'cafe', 'funcionario'),
-						('almoco_interno_siisp', 'almoco', 'interno'),
-						('almoco_funcionario_siisp', 'almoco', 'funcionario'),
-						('lanche_interno_siisp', 'lanche', 'interno'),
-						('lanche_funcionario_siisp', 'lanche', 'funcionario'),
-						('jantar_interno_siisp', 'jantar', 'interno'),
-						('jantar_funcionario_siisp', 'jantar', 'funcionario')
-					]
-					for field_name, refeicao, tipo in siisp_fields:
-						if field_name in mapa and isinstance(mapa[field_name], list):
-							try:
-								quantidade = sum(max(0, float(x)) if x is not None else 0 for x in mapa[field_name])
-								desvio_mes += quantidade * get_preco(refeicao, tipo)
-							except Exception:
-								pass
-				refeicoes_por_mes[mes_ano] += total_mes
-				custo_total += custo_mes
-				desvio_total += abs(desvio_mes)
+			# Cada predecessor usa seus próprios preços (ou os do lote, se não estiver na lista)
+			origem = lote_id_busca if lote_id_busca != lid and lotes_por_id.get(int(lote_id_busca)) else lid
+			for mes_ano, grupo in grupos_por_lote.get(lote_id_busca, {}).items():
+				pares.setdefault((grupo, origem), len(pares))
+				cadeia.append((mes_ano, grupo, pares[(grupo, origem)]))
+		cadeias[lid] = cadeia
+
+	custos_par = []
+	desvios_par = []
+	if pares:
+		grupos_par = np.array([g for g, _ in pares], dtype=np.intp)
+		precos_par = np.array([precos_por_lote[origem] for _, origem in pares], dtype=np.float64)
+		custos_par = _somar_grupos_sequencial(matriz_totais, indices_grupo[grupos_par], precos_par).tolist()
+		desvios_par = _somar_grupos_sequencial(matriz_desvios, indices_grupo[grupos_par], precos_par).tolist()
+
+	for lote in lotes:
+		lid = str(lote.get('id'))
+		refeicoes_por_mes = {}
+		custo_total = 0.0
+		desvio_total = 0.0
+
+		# Lote e predecessores (como nos relatórios), mês a mês
+		for mes_ano, grupo, par in cadeias[lid]:
+			total_mes = refeicoes_grupo[grupo]
+			if not grupo_com_float[grupo]:
+				total_mes = int(total_mes)
+			refeicoes_por_mes[mes_ano] = refeicoes_por_mes.get(mes_ano, 0) + total_mes
+			custo_total += custos_par[par]
+			desvio_total += abs(desvios_par[par])
 		
 		# Contar meses únicos
 		meses_count = len(refeicoes_por_mes)
@@ -1048,18 +1580,9 @@ def calcular_metricas_lotes(lotes, mapas):
 		
 		lote['refeicoes_por_mes'] = refeicoes_por_mes
 		lote['meses_cadastrados'] = meses_count
-		# Salva os totais para uso posterior
-		lote_id = lote.get('id')
-		totais_custos_por_lote[lote_id] = custo_total
-		totais_desvios_por_lote[lote_id] = desvio_total
 
 		media = total_refeicoes / meses_count if meses_count > 0 else 0
 
-		# Recupera os totais calculados anteriormente
-		lote_id = lote.get('id')
-		custo_total = totais_custos_por_lote.get(lote_id, 0.0)
-		desvio_total = totais_desvios_por_lote.get(lote_id, 0.0)
-
 		if meses_count > 0:
 			lote['refeicoes_mes'] = media
 			lote['custo_mes'] = custo_total / meses_count
@@ -0,0 +1,89 @@
+"""
+Migrações do banco SQLite (o projeto não usa framework de migração).
+Executadas na inicialização da aplicação, logo após db.create_all().
+"""
+from sqlalchemy import inspect, text
+
+from .models import db, Mapa, MapaDia
+from .mapas import migrar_mapa_dia, preencher_totais_mapas, preencher_unidade_normalizada
+
+
+def _adicionar_colunas_ausentes(model):
+	"""
+	Adiciona via ALTER TABLE as colunas do modelo que ainda não existem na tabela.
+	(db.create_all() cria tabelas novas, mas não altera tabelas existentes)
+	
+	Returns:
+		list: nomes das colunas adicionadas
+	"""
+	tabela = model.__tablename__
+	existentes = {c['name'] for c in inspect(db.engine).get_columns(tabela)}
+	adicionadas = []
+	try:
+		for coluna in model.__table__.columns:
+			if coluna.name in existentes:
+				continue
+			tipo = coluna.type.compile(dialect=db.engine.dialect)
+			db.session.execute(text(f'ALTER TABLE {tabela} ADD COLUMN {coluna.name} {tipo}'))
+			adicionadas.append(coluna.name)
+		if adicionadas:
+			db.session.commit()
+			print(f"✅ Tabela {tabela}: {len(adicionadas)} coluna(s) adicionada(s)")
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao adicionar colunas em {tabela}: {e}")
+	return adicionadas
+
+
+def _remover_mapas_duplicados():
+	"""
+	Remove mapas duplicados para a mesma chave (lote_id, ano, mes, unidade),
+	mantendo o atualizado mais recentemente. Necessário antes de criar o índice único.
+	
+	Returns:
+		int: quantidade de mapas removidos
+	"""
+	removidos = 0
+	try:
+		duplicados = db.session.query(
+			Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade
+		).group_by(
+			Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade
+		).having(db.func.count(Mapa.id) > 1).all()
+		for lote_id, ano, mes, unidade in duplicados:
+			mapas = Mapa.query.filter_by(lote_id=lote_id, ano=ano, mes=mes, unidade=unidade).order_by(
+				Mapa.atualizado_em.desc(), Mapa.id.desc()
+			).all()
+			for mapa in mapas[1:]:
+				MapaDia.query.filter_by(mapa_id=mapa.id).delete(synchronize_session=False)
+				db.session.delete(mapa)
+				removidos += 1
+			print(f"⚠️ Mapa duplicado: {unidade} {mes:02d}/{ano} (lote {lote_id}) - mantido ID {mapas[0].id}")
+		if removidos:
+			db.session.commit()
+			print(f"🗑️ {removidos} mapa(s) duplicado(s) removido(s)")
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao remover mapas duplicados: {e}")
+	return removidos
+
+
+def _criar_indices(model):
+	# Cria os índices declarados no modelo que ainda não existem (tabelas antigas)
+	for indice in model.__table__.indexes:
+		try:
+			indice.create(bind=db.engine, checkfirst=True)
+		except Exception as e:
+			print(f"❌ Erro ao criar índice {indice.name}: {e}")
+
+
+def executar_migracoes():
+	"""
+	Executa as migrações pendentes. Todas são idempotentes.
+	"""
+	_adicionar_colunas_ausentes(Mapa)
+	_remover_mapas_duplicados()
+	_criar_indices(Mapa)
+	preencher_totais_mapas()
+	preencher_unidade_normalizada()
+	migrar_mapa_dia()
@@ -101,6 +101,78 @@ class Mapa(db.Model):
     lanche_funcionario_siisp = db.Column(db.Text, nullable=True)  # JSON/texto
     jantar_interno_siisp = db.Column(db.Text, nullable=True)  # JSON/texto
     jantar_funcionario_siisp = db.Column(db.Text, nullable=True)  # JSON/texto
+    # Totais persistidos (mantidos na gravação; evitam somar as séries diárias na leitura)
+    total_cafe_interno = db.Column(db.Integer, nullable=True)
+    total_cafe_funcionario = db.Column(db.Integer, nullable=True)
+    total_almoco_interno = db.Column(db.Integer, nullable=True)
+    total_almoco_funcionario = db.Column(db.Integer, nullable=True)
+    total_lanche_interno = db.Column(db.Integer, nullable=True)
+    total_lanche_funcionario = db.Column(db.Integer, nullable=True)
+    total_jantar_interno = db.Column(db.Integer, nullable=True)
+    total_jantar_funcionario = db.Column(db.Integer, nullable=True)
+    total_dados_siisp = db.Column(db.Integer, nullable=True)
+    # Desvio: soma dos valores positivos de <campo>_siisp (excedente sobre o SIISP)
+    desvio_cafe_interno = db.Column(db.Integer, nullable=True)
+    desvio_cafe_funcionario = db.Column(db.Integer, nullable=True)
+    desvio_almoco_interno = db.Column(db.Integer, nullable=True)
+    desvio_almoco_funcionario = db.Column(db.Integer, nullable=True)
+    desvio_lanche_interno = db.Column(db.Integer, nullable=True)
+    desvio_lanche_funcionario = db.Column(db.Integer, nullable=True)
+    desvio_jantar_interno = db.Column(db.Integer, nullable=True)
+    desvio_jantar_funcionario = db.Column(db.Integer, nullable=True)
+    total_dias = db.Column(db.Integer, nullable=True)
+    # Nome da unidade normalizado (ultra_normalizar_nome) para localizar o mapa na importação SIISP
+    unidade_normalizada = db.Column(db.String(128), nullable=True)
+
+    __table_args__ = (
+        # Um único mapa por unidade/mês/ano em cada lote (chave do UPSERT).
+        # Por ser o prefixo do índice, lote_id também fica indexado.
+        db.Index('ux_mapas_lote_ano_mes_unidade', 'lote_id', 'ano', 'mes', 'unidade', unique=True),
+        db.Index('ix_mapas_ano_mes', 'ano', 'mes'),
+        # Última atividade por lote (MAX(atualizado_em) agrupado por lote_id)
+        db.Index('ix_mapas_lote_atualizado_em', 'lote_id', 'atualizado_em'),
+        db.Index('ix_mapas_lote_ano_mes_unidade_normalizada', 'lote_id', 'ano', 'mes', 'unidade_normalizada'),
+    )
 
     def __repr__(self):
         return f'<Mapa {self.id} {self.unidade} {self.mes}/{self.ano}>'
+
+
+# Modelo para MapaDia (fato diário normalizado: uma linha por unidade por dia)
+class MapaDia(db.Model):
+    __tablename__ = 'mapa_dia'
+    id = db.Column(db.Integer, primary_key=True)
+    mapa_id = db.Column(db.Integer, nullable=False, index=True)  # ID do Mapa de origem
+    lote_id = db.Column(db.Integer, nullable=False)
+    unidade = db.Column(db.String(128), nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    dia = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.String(10), nullable=True)  # YYYY-MM-DD
+    cafe_interno = db.Column(db.Integer, default=0)
+    cafe_funcionario = db.Column(db.Integer, default=0)
+    almoco_interno = db.Column(db.Integer, default=0)
+    almoco_funcionario = db.Column(db.Integer, default=0)
+    lanche_interno = db.Column(db.Integer, default=0)
+    lanche_funcionario = db.Column(db.Integer, default=0)
+    jantar_interno = db.Column(db.Integer, default=0)
+    jantar_funcionario = db.Column(db.Integer, default=0)
+    dados_siisp = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.Index('ix_mapa_dia_lote_ano_mes', 'lote_id', 'ano', 'mes'),
+        db.Index('ix_mapa_dia_data', 'data'),
+    )
+
+    def __repr__(self):
+        return f'<MapaDia {self.mapa_id} {self.unidade} {self.data}>'
+
+
+# Modelo para VersaoDados (versões do cache do dashboard, compartilhadas entre os processos do servidor)
+class VersaoDados(db.Model):
+    __tablename__ = 'versoes_dados'
+    grupo = db.Column(db.String(32), primary_key=True)  # 'mapas', 'lotes' ou 'unidades'
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<VersaoDados {self.grupo} {self.versao}>'
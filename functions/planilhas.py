@@ -0,0 +1,428 @@
+"""
+Escrita de planilhas Excel em modo streaming (openpyxl write-only).
+
+O arquivo modelo (dados/modelo.xlsx) é lido uma vez por processo (obter_modelo)
+e relido só quando o arquivo muda. Cada exportação recebe uma cópia de trabalho:
+as abas do modelo são compartilhadas, somente leitura, e os estilos derivados
+ficam na cópia. Cada estilo distinto das abas do modelo é registrado no arquivo
+gerado como um estilo nomeado
+(ex.: 'COMPARATIVO E12'), e as células passam a referenciar esse estilo em vez
+de copiar fonte, borda, preenchimento etc. célula a célula.
+
+As abas geradas são escritas linha a linha, na ordem, e descarregadas para o
+disco pelo openpyxl: a memória fica praticamente constante, qualquer que seja o
+número de linhas. Larguras, alturas, mesclas e configurações de página seguem o
+modelo; a formatação condicional é registrada por intervalo.
+
+Quando as abas precisam ser reorganizadas antes da escrita (exportação de vários
+lotes), elas são montadas como Planilha: linhas, estilos, mesclas e regras em
+memória, sem células do openpyxl, escritas depois com EscritorPlanilhas.renderizar.
+"""
+import io
+import os
+import re
+import threading
+from copy import copy
+from types import MappingProxyType
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, NamedStyle, PatternFill, Protection
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter, range_boundaries
+
+
+_ATRIBUTOS_ESTILO = ('font', 'fill', 'border', 'alignment', 'protection', 'number_format')
+_CONFIGURACOES_ABA = ('sheet_format', 'sheet_properties', 'page_margins', 'page_setup', 'print_options')
+_REFERENCIA_CELULA = re.compile(r'([A-Z]+)(\d+)')
+
+_lock_modelos = threading.Lock()
+_modelos = {}  # caminho absoluto -> ((mtime_ns, tamanho), ModeloPlanilhas)
+
+
+# ----- Modelo -----
+class AbaModelo:
+	"""
+	Conteúdo de uma aba do modelo: células (valor e estilo nomeado), mesclas,
+	larguras de coluna, alturas de linha e configurações de página.
+	Somente leitura: é compartilhada pelas cópias de trabalho do modelo.
+	"""
+
+	def __init__(self, ws, modelo):
+		self.titulo = ws.title
+		linhas = {}
+		estilos = {}
+		for row in ws.iter_rows():
+			for cell in row:
+				if cell.value is None and not cell.has_style:
+					continue
+				estilo = modelo._registrar_estilo(self.titulo, cell) if cell.has_style else None
+				linhas.setdefault(cell.row, {})[cell.column] = (cell.value, estilo)
+				estilos[cell.coordinate] = estilo
+		self.linhas = MappingProxyType({linha: MappingProxyType(celulas) for linha, celulas in linhas.items()})
+		self._estilos = MappingProxyType(estilos)
+		self.mesclas = tuple(str(intervalo) for intervalo in ws.merged_cells.ranges)
+		self.larguras = MappingProxyType({letra: dim.width for letra, dim in ws.column_dimensions.items() if dim.width})
+		self.alturas = MappingProxyType({linha: dim.height for linha, dim in ws.row_dimensions.items() if dim.height})
+		# Copiadas para cada aba gerada (AbaStreaming)
+		self.configuracoes = MappingProxyType({nome: getattr(ws, nome) for nome in _CONFIGURACOES_ABA})
+
+	def estilo(self, coordenada):
+		"""
+		Nome do estilo nomeado da célula do modelo (ex.: 'E12'), ou None.
+		"""
+		return self._estilos.get(coordenada)
+
+	def celulas(self, linha):
+		"""
+		Células da linha do modelo: {coluna: (valor, estilo)}.
+		"""
+		return self.linhas.get(linha, {})
+
+
+class ModeloPlanilhas:
+	"""
+	Arquivo modelo lido uma vez: abas, estilos (um por combinação distinta) e tema.
+	"""
+
+	def __init__(self, caminho):
+		wb = load_workbook(caminho)
+		self.caminho = caminho
+		self.tema = wb.loaded_theme
+		self.estilos = {}
+		self._nomes_por_estilo = {}
+		abas = {}
+		for ws in wb.worksheets:
+			abas[ws.title] = AbaModelo(ws, self)
+		self.abas = MappingProxyType(abas)
+		self.ordem_abas = tuple(abas)
+
+	def copia(self):
+		"""
+		Cópia de trabalho para uma exportação: compartilha as abas e os estilos
+		lidos do modelo, com um dicionário de estilos próprio para os derivados.
+		"""
+		outra = copy(self)
+		outra.estilos = dict(self.estilos)
+		return outra
+
+	def _registrar_estilo(self, titulo_aba, cell):
+		# Um estilo nomeado por combinação distinta, com o nome da primeira célula que a usa
+		nome = self._nomes_por_estilo.get(cell.style_id)
+		if nome is None:
+			nome = f'{titulo_aba} {cell.coordinate}'
+			self.estilos[nome] = {atributo: copy(getattr(cell, atributo)) for atributo in _ATRIBUTOS_ESTILO}
+			self._nomes_por_estilo[cell.style_id] = nome
+		return nome
+
+	def aba(self, titulo=None):
+		"""
+		Aba do modelo pelo título; sem título (ou título inexistente), a primeira aba.
+		"""
+		if titulo in self.abas:
+			return self.abas[titulo]
+		return self.abas[self.ordem_abas[0]] if titulo is None else None
+
+	def derivar_estilo(self, base, sufixo, **alteracoes):
+		"""
+		Registra (uma vez) uma variação de um estilo do modelo.
+
+		Args:
+			base: nome do estilo de origem (ex.: 'COMPARATIVO M12')
+			sufixo: complemento do nome do novo estilo
+			**alteracoes: atributos substituídos (font, fill, border, alignment, protection, number_format)
+
+		Returns:
+			str: nome do estilo derivado
+		"""
+		nome = f'{base} {sufixo}'
+		if nome not in self.estilos:
+			estilo = dict(self.estilos[base])
+			estilo.update(alteracoes)
+			self.estilos[nome] = estilo
+		return nome
+
+	def criar_estilo(self, nome, **atributos):
+		"""
+		Registra (uma vez) um estilo que não vem do modelo; atributos omitidos ficam no padrão
+		do Excel (fonte padrão do workbook, sem preenchimento nem bordas).
+
+		Returns:
+			str: nome do estilo
+		"""
+		if nome not in self.estilos:
+			estilo = {
+				'font': copy(DEFAULT_FONT), 'fill': PatternFill(), 'border': Border(),
+				'alignment': Alignment(), 'protection': Protection(), 'number_format': 'General'
+			}
+			estilo.update(atributos)
+			self.estilos[nome] = estilo
+		return nome
+
+
+def obter_modelo(caminho):
+	"""
+	Modelo lido uma vez por processo e relido só quando o arquivo muda (mtime ou tamanho).
+
+	Args:
+		caminho: caminho do modelo.xlsx
+
+	Returns:
+		ModeloPlanilhas: cópia de trabalho (ver ModeloPlanilhas.copia)
+	"""
+	caminho = os.path.abspath(caminho)
+	info = os.stat(caminho)
+	assinatura = (info.st_mtime_ns, info.st_size)
+	with _lock_modelos:
+		registro = _modelos.get(caminho)
+		if registro is None or registro[0] != assinatura:
+			registro = (assinatura, ModeloPlanilhas(caminho))
+			_modelos[caminho] = registro
+	return registro[1].copia()
+
+
+# ----- Abas -----
+class _Aba:
+	"""
+	Escrita de linhas do modelo e mesclas, comum à aba em streaming e à planilha em memória.
+	As subclasses implementam escrever, mesclar e formatar_condicional.
+	"""
+
+	def escrever_modelo(self, linha_modelo, valores=None):
+		"""
+		Acrescenta uma linha do modelo, com os estilos do modelo.
+
+		Args:
+			linha_modelo: número da linha na aba modelo
+			valores: {coluna: valor} que substituem os do modelo
+
+		Returns:
+			int: número da linha escrita
+		"""
+		celulas = dict(self.modelo.celulas(linha_modelo))
+		for coluna, valor in (valores or {}).items():
+			estilo = celulas[coluna][1] if coluna in celulas else None
+			celulas[coluna] = (valor, estilo)
+		return self.escrever(celulas)
+
+	def mesclar_modelo(self, filtro=None):
+		"""
+		Aplica as mesclas do modelo (as que passam no filtro, se informado).
+
+		Args:
+			filtro: função (min_col, min_row, max_col, max_row) -> bool
+		"""
+		for intervalo in self.modelo.mesclas:
+			if filtro is None or filtro(*range_boundaries(intervalo)):
+				self.mesclar(intervalo)
+
+
+class AbaStreaming(_Aba):
+	"""
+	Aba escrita linha a linha. As linhas são numeradas a partir de 1, na ordem de escrita.
+	"""
+
+	def __init__(self, escritor, titulo, aba_modelo=None, larguras=None):
+		self.escritor = escritor
+		self.modelo = aba_modelo
+		self.ws = escritor.wb.create_sheet(title=titulo)
+		self.linha_atual = 0
+		dimensoes = {}
+		if aba_modelo:
+			for nome, valor in aba_modelo.configuracoes.items():
+				setattr(self.ws, nome, copy(valor))
+			# Alturas pelo número da linha (o write-only as lê ao escrever cada linha)
+			for linha, altura in aba_modelo.alturas.items():
+				self.ws.row_dimensions[linha].height = altura
+			dimensoes.update(aba_modelo.larguras)
+		dimensoes.update(larguras or {})
+		# Larguras vão no início do XML: precisam existir antes da primeira linha
+		for letra, largura in dimensoes.items():
+			self.ws.column_dimensions[letra].width = largura
+
+	def _celula(self, valor, estilo):
+		cell = WriteOnlyCell(self.ws, value=valor)
+		if estilo:
+			cell.style = self.escritor.registrar_estilo(estilo)
+		return cell
+
+	def escrever(self, celulas):
+		"""
+		Acrescenta uma linha.
+
+		Args:
+			celulas: {coluna (1 = A): (valor, estilo)}
+
+		Returns:
+			int: número da linha escrita
+		"""
+		ultima = max(celulas) if celulas else 0
+		linha = [None] * ultima
+		for coluna, (valor, estilo) in celulas.items():
+			linha[coluna - 1] = self._celula(valor, estilo)
+		self.ws.append(linha)
+		self.linha_atual += 1
+		return self.linha_atual
+
+	def mesclar(self, intervalo):
+		self.ws.merged_cells.add(intervalo)
+
+	def formatar_condicional(self, intervalo, regras):
+		"""
+		Registra regras de formatação condicional (na ordem de prioridade) para o intervalo.
+		"""
+		# Cópias: o openpyxl grava a prioridade na regra, e as regras são reaproveitadas entre abas
+		for regra in regras:
+			self.ws.conditional_formatting.add(intervalo, copy(regra))
+
+
+class Planilha(_Aba):
+	"""
+	Aba montada em memória: linhas ({coluna: (valor, estilo)}), mesclas e
+	formatação condicional, escrita depois com EscritorPlanilhas.renderizar.
+
+	Tem a mesma interface de escrita de AbaStreaming, então as funções que montam
+	as abas servem aos dois. Os metadados (ex.: tipo e categoria do RESUMO) ficam
+	com a planilha para quem for consolidá-la.
+	"""
+
+	def __init__(self, titulo, aba_modelo=None, larguras=None, **metadados):
+		self.titulo = titulo
+		self.modelo = aba_modelo
+		self.aba = aba_modelo.titulo if aba_modelo else None
+		self.larguras = dict(aba_modelo.larguras) if aba_modelo else {}
+		self.larguras.update(larguras or {})
+		self.metadados = metadados
+		self.linhas = []
+		self.mesclas = []
+		self.formatacoes = []
+
+	def __getstate__(self):
+		# Enviada entre processos (exportação paralela) sem a aba do modelo: renderizar
+		# a localiza pelo título ('aba') no modelo do processo que escreve o arquivo
+		estado = dict(self.__dict__)
+		estado['modelo'] = None
+		return estado
+
+	@property
+	def linha_atual(self):
+		return len(self.linhas)
+
+	def escrever(self, celulas):
+		self.linhas.append(celulas)
+		return len(self.linhas)
+
+	def mesclar(self, intervalo):
+		self.mesclas.append(intervalo)
+
+	def formatar_condicional(self, intervalo, regras):
+		self.formatacoes.append((intervalo, list(regras)))
+
+	def anexar(self, outra):
+		"""
+		Acrescenta as linhas e mesclas de outra planilha abaixo das atuais,
+		ajustando as referências de linha das fórmulas.
+		"""
+		deslocamento = len(self.linhas)
+		for celulas in outra.linhas:
+			self.linhas.append({
+				coluna: (deslocar_formula(valor, deslocamento), estilo)
+				for coluna, (valor, estilo) in celulas.items()
+			})
+		for intervalo in outra.mesclas:
+			min_col, min_row, max_col, max_row = range_boundaries(intervalo)
+			self.mesclas.append(
+				f'{get_column_letter(min_col)}{min_row + deslocamento}:{get_column_letter(max_col)}{max_row + deslocamento}'
+			)
+
+
+def deslocar_formula(valor, deslocamento):
+	"""
+	Soma 'deslocamento' às linhas das referências (ex.: D13) de uma fórmula.
+	Valores que não são fórmulas são retornados sem alteração.
+	"""
+	if not deslocamento or not isinstance(valor, str) or not valor.startswith('='):
+		return valor
+	return _REFERENCIA_CELULA.sub(lambda m: f'{m.group(1)}{int(m.group(2)) + deslocamento}', valor)
+
+
+# ----- Escrita -----
+class EscritorPlanilhas:
+	"""
+	Workbook write-only com os estilos do modelo registrados como estilos nomeados.
+	"""
+
+	def __init__(self, modelo):
+		self.modelo = modelo
+		self.wb = Workbook(write_only=True)
+		if modelo.tema:
+			self.wb.loaded_theme = modelo.tema
+		self._registrados = set()
+
+	def registrar_estilo(self, nome):
+		if nome not in self._registrados:
+			atributos = {atributo: copy(valor) for atributo, valor in self.modelo.estilos[nome].items()}
+			self.wb.add_named_style(NamedStyle(name=nome, **atributos))
+			self._registrados.add(nome)
+		return nome
+
+	def nova_aba(self, titulo, aba_modelo=None, larguras=None, **metadados):
+		"""
+		Cria uma aba com as dimensões e configurações do modelo.
+
+		Args:
+			titulo: título da aba
+			aba_modelo: AbaModelo de origem (opcional)
+			larguras: {letra: largura} aplicadas sobre as do modelo
+			**metadados: ignorados na escrita direta (ver ColecaoPlanilhas)
+
+		Returns:
+			AbaStreaming
+		"""
+		return AbaStreaming(self, titulo, aba_modelo, larguras)
+
+	def renderizar(self, planilha, titulo=None):
+		"""
+		Escreve uma Planilha montada em memória como uma nova aba.
+
+		Args:
+			planilha: Planilha
+			titulo: título da aba (padrão: o da planilha)
+
+		Returns:
+			AbaStreaming
+		"""
+		aba_modelo = self.modelo.aba(planilha.aba) if planilha.aba else None
+		aba = self.nova_aba(titulo or planilha.titulo, aba_modelo, planilha.larguras)
+		for celulas in planilha.linhas:
+			aba.escrever(celulas)
+		for intervalo in planilha.mesclas:
+			aba.mesclar(intervalo)
+		for intervalo, regras in planilha.formatacoes:
+			aba.formatar_condicional(intervalo, regras)
+		return aba
+
+	def salvar(self):
+		"""
+		Fecha as abas e retorna o arquivo em memória (BytesIO posicionado no início).
+		"""
+		output = io.BytesIO()
+		self.wb.save(output)
+		output.seek(0)
+		return output
+
+
+class ColecaoPlanilhas:
+	"""
+	Destino alternativo a EscritorPlanilhas: nova_aba cria Planilhas em memória,
+	guardadas em 'planilhas' na ordem de criação.
+	"""
+
+	def __init__(self, modelo):
+		self.modelo = modelo
+		self.planilhas = []
+
+	def nova_aba(self, titulo, aba_modelo=None, larguras=None, **metadados):
+		planilha = Planilha(titulo, aba_modelo, larguras, **metadados)
+		self.planilhas.append(planilha)
+		return planilha
@@ -1,12 +1,22 @@
 """
 Funções para geração de relatórios e dados para gráficos
 """
+import logging
 from datetime import datetime, timedelta
-from collections import defaultdict
 from functions.models import db, Mapa, Lote
 from sqlalchemy import and_, or_
+from functions.linhagem import expandir_lotes_com_predecessores
+from functions.graficos import (
+    carregar_totais_mapas, carregar_totais_diarios, filtros_intervalo_meses, meses_parciais
+)
+from functions.agregacao import (
+    PERIODOS_DIARIOS, agregar_mapas, campos_medida, colunas_medida,
+    serie_total, serie_grupo, series_por_campo
+)
 import json
 
+logger = logging.getLogger(__name__)
+
 
 def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None, data_fim=None, modo='acumulado'):
     """
@@ -26,7 +36,7 @@ def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None,
     try:
         # Se não houver lotes ou unidades selecionadas, retornar vazio
         if not lotes_ids or len(lotes_ids) == 0:
-            print("⚠️ Nenhum lote selecionado - retornando dados vazios")
+            logger.debug("Nenhum lote selecionado - retornando dados vazios")
             return {
                 'success': True,
                 'dados': {
@@ -49,7 +59,7 @@ def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None,
             }
         
         if not unidades or len(unidades) == 0:
-            print("⚠️ Nenhuma unidade selecionada - retornando dados vazios")
+            logger.debug("Nenhuma unidade selecionada - retornando dados vazios")
             return {
                 'success': True,
                 'dados': {
@@ -79,23 +89,11 @@ def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None,
             u_limpo = re.sub(r'\s*\(\+\s*\d+\s+agregadas?\)$', '', u)
             unidades_limpas.append(u_limpo)
         
-        print(f"📝 Unidades recebidas: {unidades}")
-        print(f"🧹 Unidades limpas: {unidades_limpas}")
+        logger.debug("Unidades recebidas: %s, limpas: %s", unidades, unidades_limpas)
         
         # Expandir lotes para incluir predecessores (cadeia histórica)
-        lotes_expandidos = set(lotes_ids)
-        for lote_id in lotes_ids:
-            lote = Lote.query.get(lote_id)
-            if lote and lote.lote_predecessor_id:
-                # Adicionar predecessor e seus predecessores (cadeia)
-                predecessor_id = lote.lote_predecessor_id
-                while predecessor_id:
-                    lotes_expandidos.add(predecessor_id)
-                    predecessor = Lote.query.get(predecessor_id)
-                    predecessor_id = predecessor.lote_predecessor_id if predecessor else None
-        
-        lotes_para_buscar = list(lotes_expandidos)
-        print(f"🔗 Lotes expandidos (com predecessores): {lotes_para_buscar}")
+        lotes_para_buscar = expandir_lotes_com_predecessores(lotes_ids)
+        logger.debug("Lotes expandidos (com predecessores): %s", lotes_para_buscar)
         
         # Buscar unidades principais e suas subunidades
         from functions.unidades import Unidade
@@ -120,27 +118,19 @@ def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None,
             for sub in subunidades:
                 nomes_para_buscar.append(sub.nome)
         
-        print(f"🔍 Buscando mapas para unidades (principais + subunidades): {nomes_para_buscar}")
-        
-        # Construir query base
-        query = db.session.query(Mapa)
-        
-        # Filtrar por lotes (incluindo predecessores)
-        query = query.filter(Mapa.lote_id.in_(lotes_para_buscar))
-        
-        # Filtrar por unidades (principais + subunidades)
-        query = query.filter(Mapa.unidade.in_(nomes_para_buscar))
+        logger.debug("Buscando mapas para unidades (principais + subunidades): %s", nomes_para_buscar)
         
-        # Filtrar por período se especificado
-        if data_inicio:
-            query = query.filter(Mapa.ano >= data_inicio.year)
-        if data_fim:
-            query = query.filter(Mapa.ano <= data_fim.year)
+        # Filtrar por lotes (incluindo predecessores) e unidades (principais + subunidades)
+        filtros = [Mapa.lote_id.in_(lotes_para_buscar), Mapa.unidade.in_(nomes_para_buscar)]
         
-        mapas = query.all()
+        # Filtrar por período se especificado (meses em SQL, dias das bordas via mapa_dia)
+        data_inicio, data_fim = normalizar_intervalo(data_inicio, data_fim)
+        mapas = _carregar_totais_intervalo(
+            filtros, periodo, campos_medida('refeicoes') + campos_medida('siisp'), data_inicio, data_fim
+        )
         
-        print(f"📊 Buscar dados gráficos: {len(mapas)} mapas encontrados")
-        print(f"   Lotes: {lotes_ids}, Unidades: {unidades}, Período: {periodo}, Modo: {modo}")
+        logger.info("Dados gráficos: %d registros (lotes=%s, unidades=%d, periodo=%s, modo=%s)",
+                    len(mapas), lotes_ids, len(unidades), periodo, modo)
         
         # Agregar dados por período e modo
         if modo == 'acumulado':
@@ -159,13 +149,66 @@ def buscar_dados_graficos(lotes_ids, unidades, periodo='mes', data_inicio=None,
         }
     
     except Exception as e:
-        print(f"❌ Erro ao buscar dados gráficos: {e}")
+        logger.exception("Erro ao buscar dados gráficos: %s", e)
         return {
             'success': False,
             'error': str(e)
         }
 
 
+def normalizar_intervalo(data_inicio=None, data_fim=None):
+    """
+    Converte as datas do filtro de relatórios em date
+    
+    Args:
+        data_inicio, data_fim: date/datetime, string 'YYYY-MM-DD' ou 'DD/MM/YYYY', ou vazio
+    
+    Returns:
+        tuple (data_inicio, data_fim) com date ou None
+    
+    Raises:
+        ValueError: data inválida ou início posterior ao fim
+    """
+    def converter(valor, nome):
+        if not valor:
+            return None
+        if isinstance(valor, datetime):
+            return valor.date()
+        if hasattr(valor, 'year'):
+            return valor
+        for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                return datetime.strptime(str(valor).strip(), formato).date()
+            except ValueError:
+                continue
+        raise ValueError(f"{nome} inválida: {valor}")
+    
+    data_inicio = converter(data_inicio, 'Data de início')
+    data_fim = converter(data_fim, 'Data de fim')
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise ValueError('Data de início posterior à data de fim')
+    return data_inicio, data_fim
+
+
+def _carregar_totais_intervalo(filtros, periodo, campos, data_inicio=None, data_fim=None):
+    # Dia/semana: totais diários de mapa_dia recortados pelas datas.
+    # Mês/ano: totais persistidos dos meses do intervalo; meses de borda parciais
+    # entram com os dias de mapa_dia dentro do intervalo
+    filtros = filtros + filtros_intervalo_meses(Mapa, data_inicio, data_fim)
+    if periodo in PERIODOS_DIARIOS:
+        return carregar_totais_diarios(filtros, campos, data_inicio, data_fim)
+    
+    colunas = colunas_medida('refeicoes', campos)
+    parciais = meses_parciais(data_inicio, data_fim)
+    if not parciais:
+        return carregar_totais_mapas(filtros, colunas)
+    
+    mes_parcial = or_(*[and_(Mapa.ano == ano, Mapa.mes == mes) for ano, mes in parciais])
+    mapas = carregar_totais_mapas(filtros + [~mes_parcial], colunas)
+    mapas += carregar_totais_diarios(filtros + [mes_parcial], campos, data_inicio, data_fim)
+    return mapas
+
+
 def agregar_por_periodo(mapas, periodo='mes'):
     """
     Agrega dados de mapas por período
@@ -173,131 +216,17 @@ def agregar_por_periodo(mapas, periodo='mes'):
     Returns:
         dict com labels e valores para o gráfico
     """
-    dados_por_periodo = defaultdict(lambda: {
-        'cafe_interno': 0,
-        'cafe_funcionario': 0,
-        'almoco_interno': 0,
-        'almoco_funcionario': 0,
-        'lanche_interno': 0,
-        'lanche_funcionario': 0,
-        'jantar_interno': 0,
-        'jantar_funcionario': 0,
-        'dados_siisp': 0,
-        'total_refeicoes': 0
-    })
+    refeicoes = agregar_mapas(mapas, 'refeicoes', periodo=periodo)
+    siisp = agregar_mapas(mapas, 'siisp', periodo=periodo)
     
-    campos_refeicoes = [
-        'cafe_interno', 'cafe_funcionario', 
-        'almoco_interno', 'almoco_funcionario',
-        'lanche_interno', 'lanche_funcionario', 
-        'jantar_interno', 'jantar_funcionario'
-    ]
+    datasets = series_por_campo(refeicoes)
+    datasets['dados_siisp'] = series_por_campo(siisp)['dados_siisp']
+    datasets['total_refeicoes'] = serie_total(refeicoes)
     
-    for mapa in mapas:
-        # Criar chave baseada no período
-        if periodo == 'dia':
-            # Precisamos iterar por cada dia do mapa
-            datas = mapa.datas or []
-            for i, data_str in enumerate(datas):
-                chave = data_str  # YYYY-MM-DD
-                for campo in campos_refeicoes:
-                    valores = getattr(mapa, campo, []) or []
-                    if i < len(valores):
-                        dados_por_periodo[chave][campo] += valores[i]
-                        dados_por_periodo[chave]['total_refeicoes'] += valores[i]
-                
-                # SIISP
-                valores_siisp = mapa.dados_siisp or []
-                if i < len(valores_siisp):
-                    dados_por_periodo[chave]['dados_siisp'] += valores_siisp[i]
-        
-        elif periodo == 'mes':
-            # Agrupar por mês (YYYY-MM)
-            chave = f"{mapa.ano}-{mapa.mes:02d}"
-            
-            print(f"📅 Processando mapa: {chave}, Unidade: {mapa.unidade}, Lote ID: {mapa.lote_id}")
-            
-            for campo in campos_refeicoes:
-                valores = getattr(mapa, campo, []) or []
-                print(f"  {campo}: tipo={type(valores)}, len={len(valores) if isinstance(valores, list) else 'N/A'}, sample={valores[:3] if isinstance(valores, list) and len(valores) > 0 else valores}")
-                
-                # Verificar se é string JSON que precisa ser parseado
-                if isinstance(valores, str):
-                    try:
-                        import json
-                        valores = json.loads(valores)
-                    except:
-                        valores = []
-                
-                total_campo = sum(valores) if isinstance(valores, list) else 0
-                dados_por_periodo[chave][campo] += total_campo
-                dados_por_periodo[chave]['total_refeicoes'] += total_campo
-                
-                if total_campo > 0:
-                    print(f"  ✅ {campo}: {total_campo}")
-            
-            valores_siisp = mapa.dados_siisp or []
-            if isinstance(valores_siisp, str):
-                try:
-                    import json
-                    valores_siisp = json.loads(valores_siisp)
-                except:
-                    valores_siisp = []
-            total_siisp = sum(valores_siisp) if isinstance(valores_siisp, list) else 0
-            dados_por_periodo[chave]['dados_siisp'] += total_siisp
-            
-            print(f"  Total do período {chave}: {dados_por_periodo[chave]['total_refeicoes']}")
-        
-        elif periodo == 'ano':
-            # Agrupar por ano
-            chave = str(mapa.ano)
-            
-            print(f"📅 Processando mapa ANO: {chave}, Unidade: {mapa.unidade}, Lote ID: {mapa.lote_id}")
-            
-            for campo in campos_refeicoes:
-                valores = getattr(mapa, campo, []) or []
-                
-                # Verificar se é string JSON
-                if isinstance(valores, str):
-                    try:
-                        import json
-                        valores = json.loads(valores)
-                    except:
-                        valores = []
-                
-                total_campo = sum(valores) if isinstance(valores, list) else 0
-                dados_por_periodo[chave][campo] += total_campo
-                dados_por_periodo[chave]['total_refeicoes'] += total_campo
-                
-                if total_campo > 0:
-                    print(f"  ✅ {campo}: {total_campo}")
-            
-            valores_siisp = mapa.dados_siisp or []
-            if isinstance(valores_siisp, str):
-                try:
-                    import json
-                    valores_siisp = json.loads(valores_siisp)
-                except:
-                    valores_siisp = []
-            total_siisp = sum(valores_siisp) if isinstance(valores_siisp, list) else 0
-            dados_por_periodo[chave]['dados_siisp'] += total_siisp
-            
-            print(f"  Total do período {chave}: {dados_por_periodo[chave]['total_refeicoes']}")
-    
-    # Ordenar por período
-    labels_ordenados = sorted(dados_por_periodo.keys())
-    
-    # Preparar dados para o gráfico
-    resultado = {
-        'labels': labels_ordenados,
-        'datasets': {}
+    return {
+        'labels': refeicoes['periodos'],
+        'datasets': datasets
     }
-    
-    # Adicionar cada tipo de refeição
-    for campo in campos_refeicoes + ['dados_siisp', 'total_refeicoes']:
-        resultado['datasets'][campo] = [dados_por_periodo[label][campo] for label in labels_ordenados]
-    
-    return resultado
 
 
 def formatar_label_periodo(chave, periodo):
@@ -317,6 +246,20 @@ def formatar_label_periodo(chave, periodo):
     elif periodo == 'ano':
         return chave
     
+    elif periodo == 'dia':
+        # Formato: 2025-01-31 -> 31/01/2025
+        try:
+            return datetime.strptime(chave, '%Y-%m-%d').strftime('%d/%m/%Y')
+        except:
+            return chave
+    
+    elif periodo == 'semana':
+        # Formato: 2025-W05 -> Sem 05/2025 (semana ISO)
+        ano, _, semana = chave.partition('-W')
+        if ano and semana:
+            return f"Sem {semana}/{ano}"
+        return chave
+    
     return chave
 
 
@@ -325,101 +268,30 @@ def agregar_por_grupo(mapas, periodo='mes', tipo_grupo='unidade', lotes_ids=None
     Agrega dados de mapas por grupo (unidade ou lote) e período
     
     Args:
-        mapas: Lista de objetos Mapa
+        mapas: Lista de mapas (dicts de carregar_totais_mapas ou objetos Mapa)
         periodo: 'dia', 'semana', 'mes' ou 'ano'
-        tipo_grupo: 'unidade' ou 'lote'
-        lotes_ids: Lista de IDs de lotes (usado para pegar nomes dos lotes)
+        tipo_grupo: 'unidade' (subunidades somadas na principal) ou 'lote'
+        lotes_ids: Lista de IDs de lotes (não usado; mantido por compatibilidade)
     
     Returns:
         dict com labels, grupos e valores para múltiplas linhas no gráfico
     """
-    from collections import defaultdict
-    import json
-    
-    # Estrutura: {grupo_nome: {periodo: total}}
-    dados_por_grupo = defaultdict(lambda: defaultdict(int))
-    
-    campos_refeicoes = [
-        'cafe_interno', 'cafe_funcionario', 
-        'almoco_interno', 'almoco_funcionario',
-        'lanche_interno', 'lanche_funcionario', 
-        'jantar_interno', 'jantar_funcionario'
+    agregado = agregar_mapas(
+        mapas, 'refeicoes',
+        agrupar_por='unidade_nome' if tipo_grupo == 'unidade' else 'lote_nome',
+        periodo=periodo
+    )
+    return _formatar_grupos(agregado)
+
+
+def _formatar_grupos(agregado):
+    # Uma linha por grupo (ordem alfabética), com None nos períodos sem dados
+    grupos = [
+        {'nome': grupo_nome, 'valores': serie_grupo(agregado, grupo_nome, nulo_sem_dados=True)}
+        for grupo_nome in sorted(agregado['grupos'])
     ]
-    
-    # Se tipo_grupo == 'unidade', criar mapeamento de subunidades -> principais
-    mapeamento_unidade = {}
-    if tipo_grupo == 'unidade':
-        from functions.unidades import Unidade
-        
-        # Obter todas as unidades dos mapas
-        nomes_unidades = list(set(m.unidade for m in mapas))
-        unidades = Unidade.query.filter(Unidade.nome.in_(nomes_unidades)).all()
-        
-        for unidade in unidades:
-            if unidade.unidade_principal_id:
-                # É subunidade - mapear para a principal
-                principal = db.session.get(Unidade, unidade.unidade_principal_id)
-                if principal:
-                    mapeamento_unidade[unidade.nome] = principal.nome
-                    print(f"📎 Mapeando subunidade '{unidade.nome}' -> principal '{principal.nome}'")
-            else:
-                # É principal - mapear para si mesma
-                mapeamento_unidade[unidade.nome] = unidade.nome
-    
-    # Processar cada mapa
-    for mapa in mapas:
-        # Determinar o nome do grupo
-        if tipo_grupo == 'unidade':
-            # Mapear subunidade para principal (ou manter se já é principal)
-            grupo_nome = mapeamento_unidade.get(mapa.unidade, mapa.unidade)
-        else:  # tipo_grupo == 'lote'
-            # Buscar nome do lote
-            from functions.lotes import Lote
-            lote = db.session.get(Lote, mapa.lote_id)
-            grupo_nome = lote.nome if lote else f"Lote {mapa.lote_id}"
-        
-        # Determinar a chave do período
-        if periodo == 'mes':
-            chave_periodo = f"{mapa.ano}-{mapa.mes:02d}"
-        elif periodo == 'ano':
-            chave_periodo = str(mapa.ano)
-        else:
-            chave_periodo = f"{mapa.ano}-{mapa.mes:02d}"
-        
-        # Para períodos agregados (mes, semana, ano)
-        total = 0
-        for campo in campos_refeicoes:
-            valores = getattr(mapa, campo, []) or []
-            if isinstance(valores, str):
-                try:
-                    valores = json.loads(valores)
-                except:
-                    valores = []
-            total += sum(valores) if isinstance(valores, list) else 0
-        
-        dados_por_grupo[grupo_nome][chave_periodo] += total
-    
-    # Obter todos os períodos únicos e ordenar
-    todos_periodos = set()
-    for grupo_dados in dados_por_grupo.values():
-        todos_periodos.update(grupo_dados.keys())
-    
-    periodos_ordenados = sorted(list(todos_periodos))
-    
-    # Preparar dados no formato esperado pelo frontend
-    grupos = []
-    for grupo_nome in sorted(dados_por_grupo.keys()):
-        # Usar None quando não há dados ao invés de 0
-        valores = [dados_por_grupo[grupo_nome].get(periodo, None) if periodo in dados_por_grupo[grupo_nome] else None for periodo in periodos_ordenados]
-        grupos.append({
-            'nome': grupo_nome,
-            'valores': valores
-        })
-    
-    print(f"✅ Agregação por {tipo_grupo}: {len(grupos)} grupos, {len(periodos_ordenados)} períodos")
-    
     return {
-        'labels': periodos_ordenados,
+        'labels': agregado['periodos'],
         'grupos': grupos,
         'datasets': {}  # Vazio pois usamos grupos
     }
@@ -627,9 +499,8 @@ def calcular_projecao(dados, periodo='mes', meses_futuros=None):
             valor_projetado = max(0, valor_projetado)
             valores_projetados.append(round(valor_projetado))
         
-        print(f"📊 Projeção calculada: {len(labels_projetados)} períodos, média histórica: {media_historica:.0f}, tendência: {tendencia}")
-        if grupos_projetados:
-            print(f"📊 Grupos projetados: {len(grupos_projetados)} grupos")
+        logger.debug("Projeção calculada: %d períodos, %d grupos, média histórica: %.0f, tendência: %s",
+                     len(labels_projetados), len(grupos_projetados), media_historica, tendencia)
         
         return {
             'labels_projetados': labels_projetados,
@@ -641,9 +512,7 @@ def calcular_projecao(dados, periodo='mes', meses_futuros=None):
         }
     
     except Exception as e:
-        print(f"❌ Erro ao calcular projeção: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro ao calcular projeção: %s", e)
         return {
             'labels_projetados': [],
             'valores_projetados': [],
@@ -670,7 +539,7 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
     """
     try:
         if not lotes_ids or len(lotes_ids) == 0:
-            print("⚠️ Nenhum lote selecionado - retornando gastos vazios")
+            logger.debug("Nenhum lote selecionado - retornando gastos vazios")
             return {
                 'success': True,
                 'dados': {'labels': [], 'labels_formatados': [], 'datasets': {}, 'grupos': []},
@@ -678,7 +547,7 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
             }
         
         if not unidades or len(unidades) == 0:
-            print("⚠️ Nenhuma unidade selecionada - retornando gastos vazios")
+            logger.debug("Nenhuma unidade selecionada - retornando gastos vazios")
             return {
                 'success': True,
                 'dados': {'labels': [], 'labels_formatados': [], 'datasets': {}, 'grupos': []},
@@ -692,22 +561,11 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
             u_limpo = re.sub(r'\s*\(\+\s*\d+\s+agregadas?\)$', '', u)
             unidades_limpas.append(u_limpo)
         
-        print(f"💰 Unidades recebidas (gastos): {unidades}")
-        print(f"💰 Unidades limpas (gastos): {unidades_limpas}")
+        logger.debug("Unidades recebidas (gastos): %s, limpas: %s", unidades, unidades_limpas)
         
         # Expandir lotes para incluir predecessores (cadeia histórica) - GASTOS
-        lotes_expandidos = set(lotes_ids)
-        for lote_id in lotes_ids:
-            lote = db.session.get(Lote, lote_id)
-            if lote and lote.lote_predecessor_id:
-                predecessor_id = lote.lote_predecessor_id
-                while predecessor_id:
-                    lotes_expandidos.add(predecessor_id)
-                    predecessor = db.session.get(Lote, predecessor_id)
-                    predecessor_id = predecessor.lote_predecessor_id if predecessor else None
-        
-        lotes_para_buscar = list(lotes_expandidos)
-        print(f"💰 Lotes expandidos (gastos, com predecessores): {lotes_para_buscar}")
+        lotes_para_buscar = expandir_lotes_com_predecessores(lotes_ids)
+        logger.debug("Lotes expandidos (gastos, com predecessores): %s", lotes_para_buscar)
         
         # Buscar unidades principais e suas subunidades
         from functions.unidades import Unidade
@@ -731,7 +589,7 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
             for sub in subunidades:
                 nomes_para_buscar.append(sub.nome)
         
-        print(f"💰 Buscando mapas gastos para: {nomes_para_buscar}")
+        logger.debug("Buscando mapas de gastos para: %s", nomes_para_buscar)
         
         # Buscar preços dos lotes e coletar valores contratuais
         precos_por_lote = {}
@@ -740,9 +598,8 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
         
         for lote_id in lotes_para_buscar:  # Incluir predecessores
             lote = db.session.get(Lote, lote_id)
-            print(f"💰 Verificando lote {lote_id}: encontrado={lote is not None}")
             if lote:
-                print(f"💰 Lote {lote_id} - precos={lote.precos}, tipo={type(lote.precos)}")
+                logger.debug("Lote %s - precos=%r", lote_id, lote.precos)
                 # Coletar valor contratual APENAS do lote atual (não predecessores)
                 if lote.valor_contratual and lote_id in lotes_ids:
                     valores_contratuais.append({
@@ -767,32 +624,28 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
                         
                         if valor_total > 0:
                             valores_contratuais_unidades[unidade_principal.nome] = float(valor_total)
-                            print(f"💰 Valor contratual agregado para '{unidade_principal.nome}': R$ {valor_total}")
+                            logger.debug("Valor contratual agregado para '%s': R$ %s", unidade_principal.nome, valor_total)
+            else:
+                logger.debug("Lote %s não encontrado", lote_id)
             
             if lote and lote.precos:
                 try:
                     precos = json.loads(lote.precos) if isinstance(lote.precos, str) else lote.precos
                     precos_por_lote[lote_id] = precos
-                    print(f"💰 Preços carregados do lote {lote_id}: {precos}")
                 except Exception as e:
-                    print(f"❌ Erro ao parsear preços do lote {lote_id}: {e}")
+                    logger.warning("Erro ao parsear preços do lote %s: %s", lote_id, e)
                     precos_por_lote[lote_id] = {}
             else:
-                print(f"⚠️ Lote {lote_id} sem preços definidos")
+                logger.debug("Lote %s sem preços definidos", lote_id)
                 precos_por_lote[lote_id] = {}
         
-        # Buscar mapas
-        query = db.session.query(Mapa)
-        query = query.filter(Mapa.lote_id.in_(lotes_para_buscar))  # Incluir predecessores
-        query = query.filter(Mapa.unidade.in_(nomes_para_buscar))
+        # Buscar totais dos mapas (incluindo predecessores)
+        filtros = [Mapa.lote_id.in_(lotes_para_buscar), Mapa.unidade.in_(nomes_para_buscar)]
         
-        if data_inicio:
-            query = query.filter(Mapa.ano >= data_inicio.year)
-        if data_fim:
-            query = query.filter(Mapa.ano <= data_fim.year)
-        
-        mapas = query.all()
-        print(f"💰 Buscar gastos: {len(mapas)} mapas encontrados")
+        data_inicio, data_fim = normalizar_intervalo(data_inicio, data_fim)
+        mapas = _carregar_totais_intervalo(filtros, periodo, campos_medida('gastos'), data_inicio, data_fim)
+        logger.info("Dados gastos: %d registros (lotes=%s, unidades=%d, periodo=%s, modo=%s)",
+                    len(mapas), lotes_ids, len(unidades), periodo, modo)
         
         # Agregar gastos por período e modo
         if modo == 'acumulado':
@@ -819,9 +672,7 @@ def buscar_dados_gastos(lotes_ids, unidades, periodo='mes', data_inicio=None, da
         }
     
     except Exception as e:
-        print(f"❌ Erro ao buscar gastos: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro ao buscar gastos: %s", e)
         return {
             'success': False,
             'error': str(e)
@@ -835,91 +686,15 @@ def agregar_gastos_por_periodo(mapas, periodo='mes', precos_por_lote=None):
     Returns:
         dict com labels e valores de gastos para o gráfico
     """
-    if precos_por_lote is None:
-        precos_por_lote = {}
+    agregado = agregar_mapas(mapas, 'gastos', periodo=periodo, precos_por_lote=precos_por_lote)
     
-    dados_por_periodo = defaultdict(lambda: {
-        'cafe_interno': 0, 'cafe_funcionario': 0,
-        'almoco_interno': 0, 'almoco_funcionario': 0,
-        'lanche_interno': 0, 'lanche_funcionario': 0,
-        'jantar_interno': 0, 'jantar_funcionario': 0,
-        'total_gastos': 0
-    })
-    
-    campos_refeicoes = [
-        'cafe_interno', 'cafe_funcionario', 
-        'almoco_interno', 'almoco_funcionario',
-        'lanche_interno', 'lanche_funcionario', 
-        'jantar_interno', 'jantar_funcionario'
-    ]
+    datasets = series_por_campo(agregado)
+    datasets['total_gastos'] = serie_total(agregado)
     
-    for mapa in mapas:
-        # Obter preços do lote
-        precos = precos_por_lote.get(mapa.lote_id, {})
-        
-        # Criar chave baseada no período
-        if periodo == 'mes':
-            chave = f"{mapa.ano}-{mapa.mes:02d}"
-        elif periodo == 'ano':
-            chave = str(mapa.ano)
-        else:
-            chave = f"{mapa.ano}-{mapa.mes:02d}"
-        
-        print(f"💰 Processando gastos: {chave}, Unidade: {mapa.unidade}, Lote ID: {mapa.lote_id}")
-        
-        for campo in campos_refeicoes:
-            valores = getattr(mapa, campo, []) or []
-            
-            if isinstance(valores, str):
-                try:
-                    valores = json.loads(valores)
-                except:
-                    valores = []
-            
-            total_refeicoes = sum(valores) if isinstance(valores, list) else 0
-            
-            # Mapear campo para estrutura de preços
-            # cafe_interno -> cafe.interno, cafe_funcionario -> cafe.funcionario
-            partes = campo.split('_')  # ['cafe', 'interno'] ou ['almoco', 'funcionario']
-            if len(partes) == 2:
-                tipo_refeicao = partes[0]  # 'cafe', 'almoco', 'lanche', 'jantar'
-                tipo_pessoa = partes[1]     # 'interno', 'funcionario'
-                
-                # Buscar preço na estrutura: precos['cafe']['interno']
-                preco = 0
-                if tipo_refeicao in precos and tipo_pessoa in precos[tipo_refeicao]:
-                    preco_str = precos[tipo_refeicao][tipo_pessoa]
-                    try:
-                        preco = float(preco_str)
-                    except:
-                        preco = 0
-            else:
-                preco = 0
-            
-            gasto_campo = total_refeicoes * preco
-            
-            dados_por_periodo[chave][campo] += gasto_campo
-            dados_por_periodo[chave]['total_gastos'] += gasto_campo
-            
-            if gasto_campo > 0:
-                print(f"  ✅ {campo}: {total_refeicoes} refeições × R$ {preco:.2f} = R$ {gasto_campo:.2f}")
-        
-        print(f"  Total gastos período {chave}: R$ {dados_por_periodo[chave]['total_gastos']:.2f}")
-    
-    # Ordenar por período
-    labels_ordenados = sorted(dados_por_periodo.keys())
-    
-    # Preparar dados para o gráfico
-    resultado = {
-        'labels': labels_ordenados,
-        'datasets': {}
+    return {
+        'labels': agregado['periodos'],
+        'datasets': datasets
     }
-    
-    # Adicionar cada tipo de refeição e total
-    for campo in campos_refeicoes + ['total_gastos']:
-        resultado['datasets'][campo] = [dados_por_periodo[label][campo] for label in labels_ordenados]
-    
-    return resultado
 
 
 def agregar_gastos_por_grupo(mapas, periodo='mes', tipo_grupo='unidade', precos_por_lote=None, lotes_ids=None):
@@ -929,110 +704,10 @@ def agregar_gastos_por_grupo(mapas, periodo='mes', tipo_grupo='unidade', precos_
     Returns:
         dict com labels, grupos e valores de gastos para múltiplas linhas no gráfico
     """
-    if precos_por_lote is None:
-        precos_por_lote = {}
-    
-    # Estrutura: {grupo_nome: {periodo: total}}
-    dados_por_grupo = defaultdict(lambda: defaultdict(float))
-    
-    campos_refeicoes = [
-        'cafe_interno', 'cafe_funcionario', 
-        'almoco_interno', 'almoco_funcionario',
-        'lanche_interno', 'lanche_funcionario', 
-        'jantar_interno', 'jantar_funcionario'
-    ]
-    
-    # Se tipo_grupo == 'unidade', criar mapeamento de subunidades -> principais (gastos)
-    mapeamento_unidade = {}
-    if tipo_grupo == 'unidade':
-        from functions.unidades import Unidade
-        
-        nomes_unidades = list(set(m.unidade for m in mapas))
-        unidades = Unidade.query.filter(Unidade.nome.in_(nomes_unidades)).all()
-        
-        for unidade in unidades:
-            if unidade.unidade_principal_id:
-                principal = db.session.get(Unidade, unidade.unidade_principal_id)
-                if principal:
-                    mapeamento_unidade[unidade.nome] = principal.nome
-                    print(f"💰 Mapeando subunidade '{unidade.nome}' -> principal '{principal.nome}' (gastos)")
-            else:
-                mapeamento_unidade[unidade.nome] = unidade.nome
-    
-    for mapa in mapas:
-        # Determinar o nome do grupo
-        if tipo_grupo == 'unidade':
-            # Mapear subunidade para principal (ou manter se já é principal)
-            grupo_nome = mapeamento_unidade.get(mapa.unidade, mapa.unidade)
-        else:  # tipo_grupo == 'lote'
-            lote = db.session.get(Lote, mapa.lote_id)
-            grupo_nome = lote.nome if lote else f"Lote {mapa.lote_id}"
-        
-        # Determinar a chave do período
-        if periodo == 'mes':
-            chave_periodo = f"{mapa.ano}-{mapa.mes:02d}"
-        elif periodo == 'ano':
-            chave_periodo = str(mapa.ano)
-        else:
-            chave_periodo = f"{mapa.ano}-{mapa.mes:02d}"
-        
-        # Obter preços do lote
-        precos = precos_por_lote.get(mapa.lote_id, {})
-        
-        # Calcular gastos
-        total_gastos = 0
-        for campo in campos_refeicoes:
-            valores = getattr(mapa, campo, []) or []
-            if isinstance(valores, str):
-                try:
-                    valores = json.loads(valores)
-                except:
-                    valores = []
-            
-            total_refeicoes = sum(valores) if isinstance(valores, list) else 0
-            
-            # Mapear campo para estrutura de preços
-            partes = campo.split('_')
-            if len(partes) == 2:
-                tipo_refeicao = partes[0]
-                tipo_pessoa = partes[1]
-                
-                preco = 0
-                if tipo_refeicao in precos and tipo_pessoa in precos[tipo_refeicao]:
-                    preco_str = precos[tipo_refeicao][tipo_pessoa]
-                    try:
-                        preco = float(preco_str)
-                    except:
-                        preco = 0
-            else:
-                preco = 0
-            
-            gasto_campo = total_refeicoes * preco
-            total_gastos += gasto_campo
-        
-        dados_por_grupo[grupo_nome][chave_periodo] += total_gastos
-    
-    # Obter todos os períodos únicos e ordenar
-    todos_periodos = set()
-    for grupo_dados in dados_por_grupo.values():
-        todos_periodos.update(grupo_dados.keys())
-    
-    periodos_ordenados = sorted(list(todos_periodos))
-    
-    # Preparar dados no formato esperado pelo frontend
-    grupos = []
-    for grupo_nome in sorted(dados_por_grupo.keys()):
-        # Usar None quando não há dados ao invés de 0
-        valores = [dados_por_grupo[grupo_nome].get(periodo, None) if periodo in dados_por_grupo[grupo_nome] else None for periodo in periodos_ordenados]
-        grupos.append({
-            'nome': grupo_nome,
-            'valores': valores
-        })
-    
-    print(f"✅ Agregação gastos por {tipo_grupo}: {len(grupos)} grupos, {len(periodos_ordenados)} períodos")
-    
-    return {
-        'labels': periodos_ordenados,
-        'grupos': grupos,
-        'datasets': {}
-    }
+    agregado = agregar_mapas(
+        mapas, 'gastos',
+        agrupar_por='unidade_nome' if tipo_grupo == 'unidade' else 'lote_nome',
+        periodo=periodo,
+        precos_por_lote=precos_por_lote
+    )
+    return _formatar_grupos(agregado)
@@ -0,0 +1,191 @@
+"""
+Codificação das séries diárias dos mapas (refeições, SIISP e diferenças).
+
+As séries podem estar gravadas em dois formatos:
+- 'json': texto JSON, ex. "[320, 11, 320]" (formato original)
+- 'binario': BLOB com inteiros int32 little-endian empacotados
+
+A leitura aceita os dois formatos, o que permite converter o banco aos poucos.
+O formato de escrita é definido pela variável de ambiente SGMRP_FORMATO_SERIES.
+"""
+import json
+import os
+import sys
+from array import array
+
+import numpy as np
+
+
+FORMATO_JSON = 'json'
+FORMATO_BINARIO = 'binario'
+FORMATO_SERIES = os.environ.get('SGMRP_FORMATO_SERIES', FORMATO_JSON).strip().lower()
+
+# Séries numéricas do Mapa ('datas' continua em JSON, pois são textos)
+CAMPOS_SERIES = [
+	'dados_siisp',
+	'cafe_interno', 'cafe_funcionario',
+	'almoco_interno', 'almoco_funcionario',
+	'lanche_interno', 'lanche_funcionario',
+	'jantar_interno', 'jantar_funcionario',
+	'cafe_interno_siisp', 'cafe_funcionario_siisp',
+	'almoco_interno_siisp', 'almoco_funcionario_siisp',
+	'lanche_interno_siisp', 'lanche_funcionario_siisp',
+	'jantar_interno_siisp', 'jantar_funcionario_siisp'
+]
+
+_INT32_MIN = -2 ** 31
+_INT32_MAX = 2 ** 31 - 1
+_DTYPE_INT32 = np.dtype('<i4')
+
+
+def _eh_binario(valor):
+	return isinstance(valor, (bytes, bytearray, memoryview))
+
+
+def _empacotar_int32(valores):
+	# Retorna bytes int32 little-endian ou None se algum valor não couber em int32
+	try:
+		inteiros = []
+		for v in valores:
+			if isinstance(v, bool):
+				v = int(v)
+			if isinstance(v, float):
+				if not v.is_integer():
+					return None
+				v = int(v)
+			if not isinstance(v, int) or v < _INT32_MIN or v > _INT32_MAX:
+				return None
+			inteiros.append(v)
+		buf = array('i', inteiros)
+		if buf.itemsize != 4:
+			return np.asarray(inteiros, dtype=_DTYPE_INT32).tobytes()
+		if sys.byteorder == 'big':
+			buf.byteswap()
+		return buf.tobytes()
+	except (TypeError, ValueError, OverflowError):
+		return None
+
+
+def codificar_serie(valores, formato=None):
+	"""
+	Codifica uma série diária para gravação no banco.
+
+	Args:
+		valores: lista de números
+		formato: 'json' ou 'binario' (padrão: SGMRP_FORMATO_SERIES)
+
+	Returns:
+		str (JSON) ou bytes (int32 little-endian). Séries com valores não inteiros
+		são sempre gravadas em JSON para não perder informação.
+	"""
+	formato = formato or FORMATO_SERIES
+	if valores is None:
+		valores = []
+	if _eh_binario(valores):
+		valores = decodificar_serie(valores)
+	if formato == FORMATO_BINARIO:
+		empacotado = _empacotar_int32(valores)
+		if empacotado is not None:
+			return empacotado
+	return json.dumps(list(valores))
+
+
+def decodificar_serie(valor):
+	"""
+	Decodifica uma série gravada em qualquer formato para lista Python.
+
+	Returns:
+		list (vazia se o valor for nulo ou inválido)
+	"""
+	if valor is None:
+		return []
+	if isinstance(valor, list):
+		return valor
+	if _eh_binario(valor):
+		buf = array('i')
+		if buf.itemsize != 4:
+			return np.frombuffer(valor, dtype=_DTYPE_INT32).tolist()
+		buf.frombytes(valor)
+		if sys.byteorder == 'big':
+			buf.byteswap()
+		return buf.tolist()
+	if isinstance(valor, str):
+		if not valor:
+			return []
+		try:
+			dados = json.loads(valor)
+			return dados if isinstance(dados, list) else []
+		except Exception:
+			return []
+	return []
+
+
+def serie_como_array(valor):
+	"""
+	Retorna a série como numpy.ndarray.
+	Para BLOBs int32 o array é uma visão direta do buffer (sem cópia e sem lista intermediária).
+	"""
+	if _eh_binario(valor):
+		return np.frombuffer(valor, dtype=_DTYPE_INT32)
+	valores = decodificar_serie(valor)
+	if not valores:
+		return np.zeros(0, dtype=np.int64)
+	try:
+		return np.asarray(valores)
+	except Exception:
+		return np.zeros(0, dtype=np.int64)
+
+
+def somar_serie(valor):
+	"""
+	Soma os valores de uma série em qualquer formato.
+	"""
+	if _eh_binario(valor):
+		return int(np.frombuffer(valor, dtype=_DTYPE_INT32).sum(dtype=np.int64))
+	valores = decodificar_serie(valor)
+	try:
+		return sum(valores)
+	except TypeError:
+		return 0
+
+
+def converter_formato_series(formato=FORMATO_BINARIO, lote_tamanho=200, compactar=True):
+	"""
+	Converte (one-shot) todas as séries dos mapas gravados para o formato informado.
+
+	Args:
+		formato: 'binario' ou 'json'
+		lote_tamanho: quantidade de mapas por commit
+		compactar: executa VACUUM ao final para devolver o espaço ao sistema
+
+	Returns:
+		dict: {'success': bool, 'convertidos': int, 'error'?: str}
+	"""
+	from .models import db, Mapa
+
+	if formato not in (FORMATO_JSON, FORMATO_BINARIO):
+		return {'success': False, 'error': f'Formato inválido: {formato}'}
+	convertidos = 0
+	try:
+		ids = [row[0] for row in db.session.query(Mapa.id).order_by(Mapa.id).all()]
+		for inicio in range(0, len(ids), lote_tamanho):
+			mapas = Mapa.query.filter(Mapa.id.in_(ids[inicio:inicio + lote_tamanho])).all()
+			for mapa in mapas:
+				for campo in CAMPOS_SERIES:
+					atual = getattr(mapa, campo, None)
+					if atual is None:
+						continue
+					novo = codificar_serie(decodificar_serie(atual), formato)
+					if novo != atual:
+						setattr(mapa, campo, novo)
+				convertidos += 1
+			db.session.commit()
+		if compactar:
+			with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+				conn.exec_driver_sql('VACUUM')
+		print(f"✅ {convertidos} mapas convertidos para o formato '{formato}'")
+		return {'success': True, 'convertidos': convertidos}
+	except Exception as e:
+		db.session.rollback()
+		print(f"❌ Erro ao converter séries dos mapas: {e}")
+		return {'success': False, 'convertidos': convertidos, 'error': str(e)}
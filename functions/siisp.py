@@ -1,28 +1,63 @@
-# Função de normalização ultra tolerante para nomes de unidade
-def ultra_normalizar_nome(nome):
-	if not isinstance(nome, str):
-		nome = str(nome)
-	nome = nome.lower().strip()
-	nome = nome.replace('ups', '').replace('upsl', '').replace('unidade', '').replace('posto', '')
-	nome = nome.replace('-', ' ').replace('_', ' ').replace('.', ' ')
-	nome = ''.join(c for c in nome if c.isalnum() or c.isspace())
-	nome = ' '.join(nome.split())
-	return nome
 import json
 import calendar
+import logging
 from datetime import datetime
+from sqlalchemy import tuple_, update
+from .models import db, Lote, Mapa, MapaDia
+from .series import codificar_serie, decodificar_serie
+from .cache import invalidar_mapas
 from .mapas import (
+	ultra_normalizar_nome,
+	_load_mapas_partitioned,
 	_calcular_campos_comparativos_siisp,
+	_calcular_totais_mapa,
+	_linhas_mapa_dia,
 	parse_texto_tabular,
-	_load_mapas_partitioned,
-	_save_mapas_partitioned,
 	_get_lote_data_inicio,
-	_get_lote_data_fim
+	_get_lote_data_fim,
+	_CAMPOS_REFEICOES
 )
 
+logger = logging.getLogger(__name__)
+
 
 # ----- SIISP Operations -----
-def adicionar_siisp_em_mapa(payload):
+def _data_contrato(valor):
+	try:
+		return datetime.strptime(valor, '%Y-%m-%d') if valor else None
+	except Exception:
+		return None
+
+
+def _periodos_lotes(lote_ids):
+	"""
+	Datas de início e fim do contrato de vários lotes, com uma única consulta.
+	
+	Returns:
+		dict: {lote_id: (data_inicio, data_fim)} (datetime ou None)
+	"""
+	if not lote_ids:
+		return {}
+	linhas = db.session.query(Lote.id, Lote.data_inicio, Lote.data_fim).filter(Lote.id.in_(list(lote_ids))).all()
+	return {
+		lote_id: (_data_contrato(data_inicio), _data_contrato(data_fim))
+		for lote_id, data_inicio, data_fim in linhas
+	}
+
+
+def _preparar_siisp(payload, periodos=None):
+	"""
+	Valida um payload SIISP e recorta a série ao período do contrato do lote.
+	
+	Args:
+		payload: dict com unidade, mes, ano, lote_id e dados_siisp
+		periodos: {lote_id: (data_inicio, data_fim)} já consultado (importação em
+		          lote); sem ele, as datas do lote são consultadas aqui
+	
+	Returns:
+		dict: {'success': True, 'lote_id', 'ano', 'mes', 'unidade', 'dados_siisp', 'dias_esperados'}
+		      ou {'success': False, 'error'}
+	"""
 	if not isinstance(payload, dict):
 		return {'success': False, 'error': 'Payload inválido'}
 	
@@ -86,8 +121,11 @@ def adicionar_siisp_em_mapa(payload):
 		}
 	
 	# Validar data de início e fim do contrato
-	data_inicio = _get_lote_data_inicio(lote_id)
-	data_fim = _get_lote_data_fim(lote_id)
+	if periodos is None:
+		data_inicio = _get_lote_data_inicio(lote_id)
+		data_fim = _get_lote_data_fim(lote_id)
+	else:
+		data_inicio, data_fim = periodos.get(lote_id, (None, None))
 	
 	if data_inicio or data_fim:
 		# Verificar se o mês/ano está fora do período do contrato
@@ -126,80 +164,77 @@ def adicionar_siisp_em_mapa(payload):
 		if len(indices_validos) < len(dados_siisp_list):
 			dados_siisp_filtrados = [dados_siisp_list[i] for i in indices_validos]
 			
-			msg_filtro = f"📅 Filtrando SIISP: Contrato"
-			if data_inicio:
-				msg_filtro += f" inicia em {data_inicio.strftime('%d/%m/%Y')}"
-			if data_fim:
-				msg_filtro += f" termina em {data_fim.strftime('%d/%m/%Y')}"
-			print(msg_filtro)
-			print(f"   Original: {len(dados_siisp_list)} elementos")
-			print(f"   Filtrado: {len(dados_siisp_filtrados)} elementos")
+			logger.debug(
+				"Filtrando SIISP pelo contrato (início %s, fim %s): %d -> %d elementos",
+				data_inicio, data_fim, len(dados_siisp_list), len(dados_siisp_filtrados)
+			)
 			
 			dados_siisp_list = dados_siisp_filtrados
 	
-	mapas_raw = _load_mapas_partitioned(mes, ano)
-	from .mapas import serialize_mapa
-	mapas_existentes = [serialize_mapa(m) for m in mapas_raw]
-	if not mapas_existentes:
-		return {
-			'success': False,
-			'error': f'Nenhum mapa encontrado para {mes:02d}/{ano}. Adicione dados de refeições primeiro.'
-		}
+	return {
+		'success': True,
+		'lote_id': lote_id,
+		'ano': ano,
+		'mes': mes,
+		'unidade': unidade,
+		'dados_siisp': dados_siisp_list,
+		'dias_esperados': dias_esperados
+	}
+
+
+# Colunas lidas do mapa para recalcular os comparativos SIISP (sem carregar as séries *_siisp antigas)
+_COLUNAS_BUSCA_SIISP = ['id', 'lote_id', 'ano', 'mes', 'unidade', 'linhas', 'datas'] + _CAMPOS_REFEICOES
+
+
+def _buscar_mapas_siisp(chaves):
+	"""
+	Localiza os mapas pela chave (lote_id, ano, mes, unidade normalizada) em uma única
+	consulta indexada.
+	
+	Args:
+		chaves: lista de tuplas (lote_id, ano, mes, unidade)
+	
+	Returns:
+		dict: (lote_id, ano, mes, unidade normalizada) -> linhas encontradas
+	"""
+	normalizadas = list({(l, a, m, ultra_normalizar_nome(u)) for l, a, m, u in chaves})
+	encontrados = {}
+	if not normalizadas:
+		return encontrados
+	colunas = [getattr(Mapa, c) for c in _COLUNAS_BUSCA_SIISP] + [Mapa.unidade_normalizada]
+	for row in db.session.query(*colunas).filter(
+		tuple_(Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade_normalizada).in_(normalizadas)
+	).all():
+		chave = (row.lote_id, row.ano, row.mes, row.unidade_normalizada)
+		encontrados.setdefault(chave, []).append(row)
+	return encontrados
+
+
+def _escolher_mapa_siisp(encontrados, dados):
+	# Entre mapas com o mesmo nome normalizado, prefere o de nome idêntico (sem diferenciar maiúsculas)
+	candidatos = encontrados.get((dados['lote_id'], dados['ano'], dados['mes'], ultra_normalizar_nome(dados['unidade'])), [])
+	for row in candidatos:
+		if str(row.unidade).strip().lower() == dados['unidade'].lower():
+			return row
+	return candidatos[0] if candidatos else None
+
+
+def _montar_atualizacao_siisp(row, dados):
+	"""
+	Monta o registro atualizado do mapa com a nova série SIISP, os comparativos
+	<refeição>_siisp e os totais persistidos.
+	
+	Returns:
+		tuple (registro, erro)
+	"""
+	registro = {c: getattr(row, c) for c in _COLUNAS_BUSCA_SIISP}
+	for campo in _CAMPOS_REFEICOES + ['datas']:
+		registro[campo] = decodificar_serie(registro[campo])
+	dados_siisp_list = dados['dados_siisp']
+	dias_esperados = dados['dias_esperados']
 
-	unidade_normalizada = ultra_normalizar_nome(unidade)
-	for i, m in enumerate(mapas_existentes):
-		if not isinstance(m, dict):
-			continue
-		m_unidade = str(m.get('unidade', '')).strip()
-		m_lote_id = m.get('lote_id')
-		m_mes = m.get('mes')
-		m_ano = m.get('ano')
-		m_unidade_normalizada = ultra_normalizar_nome(m_unidade)
-		print(f'  - [{i}] Unidade: "{m_unidade}" (normalizada: "{m_unidade_normalizada}") | lote_id: {m_lote_id} | mes: {m_mes} | ano: {m_ano}')
-		try:
-			match_unidade = (m_unidade_normalizada == unidade_normalizada)
-			match_lote = (int(m_lote_id) == int(lote_id))
-			match_mes = (int(m_mes) == int(mes))
-			match_ano = (int(m_ano) == int(ano))
-			print(f'      Comparação: unidade={match_unidade}, lote={match_lote}, mes={match_mes}, ano={match_ano}')
-			if match_unidade and match_lote and match_mes and match_ano:
-				print(f'      >>> MAPA ENCONTRADO!')
-				mapa_encontrado = m
-				indice_mapa = i
-				break
-		except Exception as e:
-			print(f'      Erro na comparação: {e}')
-			continue
-	
-	mapa_encontrado = None
-	indice_mapa = None
-	for i, m in enumerate(mapas_existentes):
-		if not isinstance(m, dict):
-			continue
-		m_unidade = str(m.get('unidade', '')).strip()
-		m_lote_id = m.get('lote_id')
-		m_mes = m.get('mes')
-		m_ano = m.get('ano')
-		
-		try:
-			if (m_unidade.lower() == unidade.lower() and 
-				int(m_lote_id) == int(lote_id) and
-				int(m_mes) == int(mes) and
-				int(m_ano) == int(ano)):
-				mapa_encontrado = m
-				indice_mapa = i
-				break
-		except Exception:
-			continue
-	
-	if mapa_encontrado is None:
-		return {
-			'success': False,
-			'error': f'Mapa não encontrado para Unidade "{unidade}", Lote {lote_id}, período {mes:02d}/{ano}. Adicione dados de refeições primeiro.'
-		}
-	
 	# Verificar se o mapa já está filtrado (campo 'linhas' indica dados filtrados)
-	linhas_mapa = mapa_encontrado.get('linhas')
+	linhas_mapa = registro.get('linhas')
 	if linhas_mapa and linhas_mapa < dias_esperados:
 		# Mapa está filtrado, ajustar SIISP para o mesmo tamanho
 		if len(dados_siisp_list) != linhas_mapa:
@@ -207,27 +242,149 @@ def adicionar_siisp_em_mapa(payload):
 			if len(dados_siisp_list) > linhas_mapa:
 				# Pegar os últimos N elementos (dias válidos do final do mês)
 				dados_siisp_list = dados_siisp_list[-linhas_mapa:]
-				print(f"⚠️ Ajustando SIISP para {linhas_mapa} elementos (mapa filtrado)")
+				logger.debug("Ajustando SIISP para %d elementos (mapa filtrado)", linhas_mapa)
 			else:
-				return {
-					'success': False,
-					'error': f'Dados SIISP insuficientes: mapa possui {linhas_mapa} dias, mas SIISP tem apenas {len(dados_siisp_list)} elementos'
-				}
-	
-	mapa_encontrado['dados_siisp'] = dados_siisp_list
-	mapa_encontrado['atualizado_em'] = datetime.now().isoformat()
-	
-	_calcular_campos_comparativos_siisp(mapa_encontrado)
-	
-	mapas_existentes[indice_mapa] = mapa_encontrado
-	
-	if not _save_mapas_partitioned(mapas_existentes, mes, ano):
+				return (None, f'Dados SIISP insuficientes: mapa possui {linhas_mapa} dias, mas SIISP tem apenas {len(dados_siisp_list)} elementos')
+
+	registro['dados_siisp'] = dados_siisp_list
+	registro['atualizado_em'] = datetime.now().isoformat()
+	_calcular_campos_comparativos_siisp(registro)
+	return (registro, None)
+
+
+def _gravar_siisp(registros):
+	"""
+	Grava a série SIISP, os comparativos e os totais de vários mapas com um único
+	UPDATE por chave primária (executemany) e regrava as linhas de mapa_dia.
+	Não faz commit.
+	"""
+	if not registros:
+		return
+	campos_series = ['dados_siisp'] + [f'{campo}_siisp' for campo in _CAMPOS_REFEICOES]
+	valores = []
+	linhas_dia = []
+	for registro in registros:
+		totais = _calcular_totais_mapa(registro)
+		valor = {'id': registro['id'], 'atualizado_em': registro['atualizado_em']}
+		valor.update({campo: codificar_serie(registro[campo]) for campo in campos_series})
+		valor['total_dados_siisp'] = totais['total_dados_siisp']
+		valor.update({f'desvio_{campo}': totais[f'desvio_{campo}'] for campo in _CAMPOS_REFEICOES})
+		valor['total_dias'] = totais['total_dias']
+		valores.append(valor)
+		linhas_dia.extend(_linhas_mapa_dia(registro))
+	db.session.execute(update(Mapa), valores)
+	MapaDia.query.filter(MapaDia.mapa_id.in_([r['id'] for r in registros])).delete(synchronize_session=False)
+	if linhas_dia:
+		db.session.bulk_insert_mappings(MapaDia, linhas_dia)
+
+
+def adicionar_siisp_em_mapa(payload):
+	"""
+	Adiciona os dados SIISP de um mês ao mapa da unidade, localizado pela chave
+	(lote, ano, mês, nome normalizado da unidade), atualizando apenas essa linha.
+	"""
+	dados = _preparar_siisp(payload)
+	if not dados.get('success'):
+		return dados
+	lote_id, ano, mes, unidade = dados['lote_id'], dados['ano'], dados['mes'], dados['unidade']
+
+	row = _escolher_mapa_siisp(_buscar_mapas_siisp([(lote_id, ano, mes, unidade)]), dados)
+	if row is None:
+		return {
+			'success': False,
+			'error': f'Mapa não encontrado para Unidade "{unidade}", Lote {lote_id}, período {mes:02d}/{ano}. Adicione dados de refeições primeiro.'
+		}
+
+	registro, erro = _montar_atualizacao_siisp(row, dados)
+	if erro:
+		return {'success': False, 'error': erro}
+	try:
+		_gravar_siisp([registro])
+		db.session.commit()
+		invalidar_mapas()
+	except Exception as e:
+		db.session.rollback()
+		logger.exception("Erro ao salvar dados SIISP: %s", e)
 		return {'success': False, 'error': 'Erro ao salvar dados'}
 	
 	return {
 		'success': True,
-		'registro': mapa_encontrado,
-		'mensagem': f'Dados SIISP adicionados com sucesso ao mapa {mapa_encontrado.get("id")}'
+		'registro': registro,
+		'mensagem': f'Dados SIISP adicionados com sucesso ao mapa {registro.get("id")}'
+	}
+
+
+def adicionar_siisp_em_mapas_lote(payloads):
+	"""
+	Adiciona dados SIISP de várias unidades/meses em uma chamada: uma consulta para
+	as datas de contrato dos lotes, uma para localizar todos os mapas e um único
+	UPDATE (executemany) em uma transação.
+	
+	Args:
+		payloads: lista de payloads no formato de adicionar_siisp_em_mapa
+	
+	Returns:
+		dict: {'success', 'resultados': [{'indice', 'success', 'id'?, 'error'?}], 'atualizados', 'erros'}
+	"""
+	payloads = payloads if isinstance(payloads, list) else [payloads]
+	resultados = [None] * len(payloads)
+	preparados = []
+	lote_ids = set()
+	for payload in payloads:
+		try:
+			lote_ids.add(int(payload.get('lote_id')))
+		except (AttributeError, TypeError, ValueError):
+			continue
+	periodos = _periodos_lotes(lote_ids)
+	for indice, payload in enumerate(payloads):
+		dados = _preparar_siisp(payload, periodos)
+		if dados.get('success'):
+			preparados.append((indice, dados))
+		else:
+			resultados[indice] = {'indice': indice, 'success': False, 'error': dados.get('error')}
+
+	encontrados = _buscar_mapas_siisp([(d['lote_id'], d['ano'], d['mes'], d['unidade']) for _, d in preparados])
+	registros = {}  # id do mapa -> (índice, registro); a última entrada para o mesmo mapa prevalece
+	for indice, dados in preparados:
+		row = _escolher_mapa_siisp(encontrados, dados)
+		if row is None:
+			resultados[indice] = {
+				'indice': indice,
+				'success': False,
+				'error': f'Mapa não encontrado para Unidade "{dados["unidade"]}", Lote {dados["lote_id"]}, período {dados["mes"]:02d}/{dados["ano"]}. Adicione dados de refeições primeiro.'
+			}
+			continue
+		registro, erro = _montar_atualizacao_siisp(row, dados)
+		if erro:
+			resultados[indice] = {'indice': indice, 'success': False, 'error': erro}
+			continue
+		if row.id in registros:
+			indice_anterior = registros[row.id][0]
+			resultados[indice_anterior] = {'indice': indice_anterior, 'success': False, 'error': f'Substituída pela entrada {indice}'}
+		registros[row.id] = (indice, registro)
+
+	try:
+		_gravar_siisp([registro for _, registro in registros.values()])
+		db.session.commit()
+		invalidar_mapas()
+	except Exception as e:
+		db.session.rollback()
+		return {'success': False, 'error': f'Erro ao salvar dados SIISP: {e}'}
+
+	for mapa_id, (indice, registro) in registros.items():
+		resultados[indice] = {
+			'indice': indice,
+			'success': True,
+			'id': mapa_id,
+			'unidade': registro['unidade'],
+			'mes': registro['mes'],
+			'ano': registro['ano']
+		}
+	return {
+		'success': True,
+		'resultados': resultados,
+		'atualizados': len(registros),
+		'erros': sum(1 for r in resultados if not r or not r.get('success'))
 	}
 
 
@@ -0,0 +1,298 @@
+"""
+Exportações Excel assíncronas (tarefas em segundo plano).
+
+Uma exportação enfileirada roda em um pool de threads de tamanho limitado, fora
+da requisição. O arquivo gerado é gravado em dados/exportacoes/ e fica disponível
+para download até expirar. O progresso (fase e lotes concluídos / total) pode ser
+consultado enquanto a tarefa roda. Pedidos idênticos feitos enquanto uma tarefa
+está na fila ou em execução recebem a mesma tarefa.
+
+O estado de cada tarefa é gravado em dados/exportacoes/<id>.json, ao lado do
+arquivo, a cada mudança: a consulta e o download funcionam em qualquer processo
+do servidor (ex.: outro worker do gunicorn), não só no que recebeu o pedido. O
+dicionário em memória é só o caminho rápido do processo que executa a tarefa.
+Tarefas e arquivos expirados (inclusive os que sobraram de execuções anteriores)
+são removidos a cada novo pedido ou consulta.
+
+Configuração (variáveis de ambiente):
+- SGMRP_EXPORTACAO_TAREFAS: exportações simultâneas (padrão: 2)
+- SGMRP_EXPORTACAO_TTL: segundos que uma tarefa concluída e o arquivo ficam disponíveis (padrão: 3600)
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .cache_exportacoes import normalizar_parametros_exportacao, obter_exportacao
+
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_EXPORTACOES = os.path.join(BASE_DIR, '..', 'dados', 'exportacoes')
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+
+
+def _inteiro_env(nome, padrao):
+	try:
+		return int(os.environ.get(nome, padrao))
+	except (TypeError, ValueError):
+		logger.warning("Valor inválido em %s; usando %s", nome, padrao)
+		return padrao
+
+
+TAREFAS_SIMULTANEAS = max(1, _inteiro_env('SGMRP_EXPORTACAO_TAREFAS', 2))
+TTL_SEGUNDOS = _inteiro_env('SGMRP_EXPORTACAO_TTL', 3600)
+
+_ID_TAREFA = re.compile(r'[0-9a-f]{32}')
+
+_lock = threading.Lock()
+_lock_importacao = threading.Lock()
+_tarefas = {}  # id -> dict da tarefa
+_em_andamento = {}  # chave dos parâmetros -> id (pendente ou executando)
+_executor = None
+
+
+def _obter_executor():
+	global _executor
+	with _lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(max_workers=TAREFAS_SIMULTANEAS, thread_name_prefix='exportacao')
+		return _executor
+
+
+# ----- Parâmetros -----
+def _chave(parametros):
+	return hashlib.sha256(json.dumps(parametros, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# ----- Estado em disco -----
+def _caminhos(tarefa_id):
+	base = os.path.join(DIRETORIO_EXPORTACOES, tarefa_id)
+	return base + '.xlsx', base + '.json'
+
+
+def _gravar_estado(tarefa):
+	# Chamada com _lock: gravações da mesma tarefa não se cruzam
+	_, caminho_estado = _caminhos(tarefa['id'])
+	temporario = f'{caminho_estado}.{threading.get_ident()}.tmp'
+	try:
+		os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+		with open(temporario, 'w', encoding='utf-8') as f:
+			json.dump(tarefa, f, ensure_ascii=False)
+		os.replace(temporario, caminho_estado)
+	except OSError as e:
+		logger.warning("Não foi possível gravar o estado da exportação %s: %s", tarefa['id'], e)
+
+
+def _carregar_tarefa(tarefa_id):
+	"""
+	Tarefa deste processo (memória) ou de outro (estado gravado em disco).
+
+	Returns:
+		dict ou None: None se o ID é inválido ou a tarefa não existe
+	"""
+	if not isinstance(tarefa_id, str) or not _ID_TAREFA.fullmatch(tarefa_id):
+		return None
+	with _lock:
+		tarefa = _tarefas.get(tarefa_id)
+		if tarefa:
+			return dict(tarefa)
+	_, caminho_estado = _caminhos(tarefa_id)
+	try:
+		with open(caminho_estado, encoding='utf-8') as f:
+			tarefa = json.load(f)
+	except (OSError, ValueError):
+		return None
+	return tarefa if isinstance(tarefa, dict) and tarefa.get('id') == tarefa_id else None
+
+
+# ----- Execução -----
+def _atualizar(tarefa_id, **campos):
+	with _lock:
+		tarefa = _tarefas.get(tarefa_id)
+		if tarefa:
+			tarefa.update(campos)
+			tarefa['atualizada_em'] = time.time()
+			_gravar_estado(tarefa)
+
+
+def _executar(app, tarefa_id, parametros):
+	def progresso(fase, concluidos=None, total=None):
+		campos = {'fase': fase}
+		if total is not None:
+			campos.update(lotes_concluidos=concluidos, lotes_total=total)
+		_atualizar(tarefa_id, **campos)
+
+	_atualizar(tarefa_id, status=EXECUTANDO, fase='iniciando')
+	# Importação do openpyxl (feita sob demanda) uma thread por vez: duas threads
+	# importando o pacote ao mesmo tempo podem ver o módulo parcialmente inicializado
+	with _lock_importacao:
+		try:
+			from . import planilhas  # noqa: F401
+		except ImportError:
+			pass  # a geração retorna o erro de biblioteca não instalada
+	try:
+		with app.app_context():
+			# Do cache de exportações quando os dados não mudaram (ver cache_exportacoes.py)
+			resultado = obter_exportacao(parametros, progresso=progresso)
+
+		if not resultado.get('success'):
+			erro = resultado.get('error', 'Erro desconhecido')
+			_atualizar(
+				tarefa_id, status=ERRO, fase=None, erro=erro, concluida_em=time.time(),
+				no_data='Nenhum' in erro and ('dados' in erro or 'lote' in erro)
+			)
+			return
+
+		os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+		caminho, _ = _caminhos(tarefa_id)
+		temporario = caminho + '.tmp'
+		if resultado.get('caminho'):
+			shutil.copyfile(resultado['caminho'], temporario)
+		else:
+			with open(temporario, 'wb') as f:
+				f.write(resultado['output'].getbuffer())
+		os.replace(temporario, caminho)
+		_atualizar(
+			tarefa_id, status=CONCLUIDA, fase=None, arquivo=caminho,
+			filename=resultado['filename'], concluida_em=time.time()
+		)
+		logger.info("Exportação %s concluída: %s", tarefa_id, resultado['filename'])
+	except Exception as e:
+		logger.exception("Erro na exportação %s", tarefa_id)
+		_atualizar(tarefa_id, status=ERRO, fase=None, erro=str(e), concluida_em=time.time())
+	finally:
+		with _lock:
+			chave = _tarefas.get(tarefa_id, {}).get('chave')
+			if _em_andamento.get(chave) == tarefa_id:
+				del _em_andamento[chave]
+
+
+def enfileirar_exportacao(dados):
+	"""
+	Enfileira uma exportação (ou reaproveita uma idêntica que ainda está na fila ou rodando).
+
+	Deve ser chamada dentro de um app context (a tarefa roda com o mesmo app).
+
+	Args:
+		dados: parâmetros da exportação (ver cache_exportacoes.normalizar_parametros_exportacao)
+
+	Returns:
+		dict: {'success': True, 'tarefa': {...}, 'reaproveitada': bool} ou {'success': False, 'error': ...}
+	"""
+	normalizados = normalizar_parametros_exportacao(dados)
+	if not normalizados.get('success'):
+		return normalizados
+	parametros = normalizados['parametros']
+	chave = _chave(parametros)
+
+	limpar_expiradas()
+	with _lock:
+		existente = _em_andamento.get(chave)
+		if existente in _tarefas:
+			return {'success': True, 'tarefa': _resumo(_tarefas[existente]), 'reaproveitada': True}
+
+		tarefa_id = uuid.uuid4().hex
+		agora = time.time()
+		_tarefas[tarefa_id] = {
+			'id': tarefa_id, 'chave': chave, 'parametros': parametros,
+			'status': PENDENTE, 'fase': 'na fila',
+			'lotes_concluidos': 0, 'lotes_total': None,
+			'criada_em': agora, 'atualizada_em': agora, 'concluida_em': None,
+			'arquivo': None, 'filename': None, 'erro': None, 'no_data': False
+		}
+		_em_andamento[chave] = tarefa_id
+		_gravar_estado(_tarefas[tarefa_id])
+		tarefa = _resumo(_tarefas[tarefa_id])
+
+	_obter_executor().submit(_executar, current_app._get_current_object(), tarefa_id, parametros)
+	logger.info("Exportação %s enfileirada: %s", tarefa_id, parametros)
+	return {'success': True, 'tarefa': tarefa, 'reaproveitada': False}
+
+
+# ----- Consulta -----
+def _resumo(tarefa):
+	# Estado público da tarefa (sem caminho do arquivo nem chave interna)
+	resumo = {campo: valor for campo, valor in tarefa.items() if campo not in ('chave', 'arquivo')}
+	if tarefa['concluida_em'] and TTL_SEGUNDOS > 0:
+		resumo['expira_em'] = tarefa['concluida_em'] + TTL_SEGUNDOS
+	return resumo
+
+
+def obter_tarefa_exportacao(tarefa_id):
+	"""
+	Estado de uma tarefa: status, fase, lotes concluídos / total, erro e nome do arquivo.
+
+	Returns:
+		dict ou None: None se a tarefa não existe (ou já expirou)
+	"""
+	limpar_expiradas()
+	tarefa = _carregar_tarefa(tarefa_id)
+	return _resumo(tarefa) if tarefa else None
+
+
+def arquivo_tarefa_exportacao(tarefa_id):
+	"""
+	Arquivo de uma tarefa concluída.
+
+	Returns:
+		dict: {'success': True, 'caminho', 'filename'} ou {'success': False, 'error', 'status'}
+		('status' é o da tarefa, ou None se ela não existe)
+	"""
+	limpar_expiradas()
+	tarefa = _carregar_tarefa(tarefa_id)
+	if not tarefa:
+		return {'success': False, 'error': 'Exportação não encontrada ou expirada', 'status': None}
+	if tarefa['status'] != CONCLUIDA:
+		return {'success': False, 'error': tarefa['erro'] or 'Exportação ainda não concluída', 'status': tarefa['status']}
+	# Caminho a partir do ID (não do estado gravado), no diretório de exportações deste processo
+	caminho, _ = _caminhos(tarefa_id)
+	filename = tarefa['filename']
+	if not os.path.exists(caminho):
+		return {'success': False, 'error': 'Arquivo da exportação não encontrado', 'status': None}
+	return {'success': True, 'caminho': caminho, 'filename': filename}
+
+
+# ----- Limpeza -----
+def limpar_expiradas():
+	"""
+	Remove as tarefas concluídas há mais de TTL_SEGUNDOS e os arquivos expirados
+	do diretório de exportações (inclusive os de execuções anteriores do servidor).
+
+	Returns:
+		int: quantidade de tarefas removidas
+	"""
+	if TTL_SEGUNDOS <= 0:
+		return 0
+	limite = time.time() - TTL_SEGUNDOS
+	with _lock:
+		expiradas = [
+			tarefa_id for tarefa_id, tarefa in _tarefas.items()
+			if tarefa['concluida_em'] and tarefa['concluida_em'] < limite
+		]
+		for tarefa_id in expiradas:
+			del _tarefas[tarefa_id]
+		ativos = {os.path.basename(c) for tarefa_id in _tarefas for c in _caminhos(tarefa_id)}
+
+	if os.path.isdir(DIRETORIO_EXPORTACOES):
+		for nome in os.listdir(DIRETORIO_EXPORTACOES):
+			caminho = os.path.join(DIRETORIO_EXPORTACOES, nome)
+			try:
+				if nome not in ativos and os.path.getmtime(caminho) < limite:
+					os.remove(caminho)
+			except OSError:
+				continue
+	return len(expiradas)
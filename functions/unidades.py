@@ -2,6 +2,7 @@ import json
 import os
 from datetime import datetime
 from .models import Unidade, db
+from .cache import invalidar_unidades
 
 
 # ----- Data Loading/Saving -----
@@ -55,6 +56,7 @@ def criar_unidade(nome, lote_id=None):
 	)
 	db.session.add(nova_unidade)
 	db.session.commit()
+	invalidar_unidades()
 	return {'success': True, 'id': new_id, 'unidade': {
 		'id': nova_unidade.id,
 		'nome': nova_unidade.nome,
@@ -88,6 +90,7 @@ def editar_unidade(unidade_id, novo_nome=None, novo_lote_id=None):
 			unidade.lote_id = None
 	unidade.atualizado_em = datetime.now().isoformat()
 	db.session.commit()
+	invalidar_unidades()
 	return {'success': True, 'unidade': {
 		'id': unidade.id,
 		'nome': unidade.nome,
@@ -110,6 +113,7 @@ def deletar_unidade(unidade_id):
 		return {'success': False, 'error': f'Unidade {unidade_id} não encontrada'}
 	db.session.delete(unidade)
 	db.session.commit()
+	invalidar_unidades()
 	return {'success': True, 'mensagem': f'Unidade {unidade_id} deletada com sucesso'}
 
 
@@ -339,6 +343,7 @@ def api_adicionar_unidade(lote_id, nome, quantitativos_unidade, valor_contratual
 			lote.unidades = json.dumps(unidades_atuais)
 		
 		db.session.commit()
+		invalidar_unidades()
 		
 		return {
 			'success': True,
@@ -467,6 +472,7 @@ def api_editar_unidade(unidade_id, nome=None, quantitativos_unidade=None, valor_
 			unidade.delegacia = delegacia
 		
 		db.session.commit()
+		invalidar_unidades()
 		
 		return {
 			'success': True,
@@ -535,6 +541,7 @@ def api_excluir_unidade(unidade_id):
 				db.session.delete(unidade_para_excluir)
 		
 		db.session.commit()
+		invalidar_unidades()
 		
 		# Mensagem de sucesso
 		if len(nomes_excluidos) > 1:
@@ -2,6 +2,17 @@
 # - auth.py: Autenticação e validação de usuários
 # - mapas.py: Operações com mapas de refeições
 # - siisp.py: Operações SIISP
+# - importacao.py: Importação de textos com vários meses
+# - cache.py: Cache em memória dos dados do dashboard
+# - logs.py: Configuração do logging (níveis por variável de ambiente)
+# - instrumentacao.py: Métricas por requisição e rota /metrics
+# - linhagem.py: Cadeia de lotes predecessores
+# - graficos.py: Carregamento dos dados dos gráficos do dashboard
+# - agregacao.py: Motor de agregação dos gráficos e relatórios
+# - planilhas.py: Escrita das planilhas Excel em streaming (exportação)
+# - exportacao.py: Montagem das abas por lote, em série ou em pool de processos
+# - cache_exportacoes.py: Cache em disco das exportações Excel (chave pela versão dos dados)
+# - tarefas.py: Exportações Excel assíncronas (fila, progresso e arquivos temporários)
 # - lotes.py: Operações com lotes
 # - unidades.py: Operações com unidades
 # - validation.py: Funções de validação e conversão
@@ -21,14 +32,37 @@ from .unidades import (
     listar_unidades, obter_mapa_unidades
 )
 from .mapas import (
-    salvar_mapas_raw, preparar_dados_entrada_manual,
-    reordenar_registro_mapas, excluir_mapa, calcular_metricas_lotes
+    salvar_mapas_raw, salvar_mapas_lote, preparar_dados_entrada_manual,
+    reordenar_registro_mapas, excluir_mapa, calcular_metricas_lotes,
+    migrar_mapa_dia, agregar_mapa_dia,
+    total_campo_mapa, desvio_campo_mapa
 )
 from .siisp import (
-    adicionar_siisp_em_mapa, validar_dados_siisp,
+    adicionar_siisp_em_mapa, adicionar_siisp_em_mapas_lote, validar_dados_siisp,
     processar_texto_siisp, calcular_discrepancias_siisp,
     obter_resumo_siisp
 )
+from .importacao import importar_texto_multimes, dividir_blocos_mensais
+from .series import (
+    codificar_serie, decodificar_serie, converter_formato_series
+)
+from .migracoes import executar_migracoes
+from .cache import estatisticas_cache, limpar_cache
+from .logs import configurar_logs
+from .instrumentacao import instrumentar_app, registro_metricas
+from .cache_exportacoes import normalizar_parametros_exportacao, chave_exportacao, obter_exportacao
+from .tarefas import enfileirar_exportacao, obter_tarefa_exportacao, arquivo_tarefa_exportacao
+from .linhagem import (
+    ancestrais_lote, descendentes_lote, linhagem_lote,
+    expandir_lotes_com_predecessores, mapear_grupos_linhagem, info_lote
+)
+from .graficos import (
+    carregar_mapas_graficos, carregar_totais_mapas, carregar_totais_diarios, obter_indice_unidades
+)
+from .agregacao import (
+    agregar_mapas, serie_total, serie_grupo, series_por_campo,
+    valores_por_periodo_grupo, preco_refeicao, chaves_periodo_datas
+)
 from .auth import (
     cadastrar_novo_usuario, validar_login,
     validar_cpf, validar_email, validar_telefone,
@@ -65,17 +99,60 @@ __all__ = [
     '_load_unidades_data',
     # Mapas
     'salvar_mapas_raw',
+    'salvar_mapas_lote',
     'preparar_dados_entrada_manual',
     'reordenar_registro_mapas',
     'excluir_mapa',
     'calcular_metricas_lotes',
     '_load_mapas_partitioned',
+    'migrar_mapa_dia',
+    'agregar_mapa_dia',
+    'total_campo_mapa',
+    'desvio_campo_mapa',
     # SIISP
     'adicionar_siisp_em_mapa',
+    'adicionar_siisp_em_mapas_lote',
     'validar_dados_siisp',
     'processar_texto_siisp',
     'calcular_discrepancias_siisp',
     'obter_resumo_siisp',
+    # Importação
+    'importar_texto_multimes',
+    'dividir_blocos_mensais',
+    # Séries
+    'codificar_serie',
+    'decodificar_serie',
+    'converter_formato_series',
+    # Migrações
+    'executar_migracoes',
+    # Cache
+    'estatisticas_cache',
+    'limpar_cache',
+    # Logs
+    'configurar_logs',
+    # Instrumentação
+    'instrumentar_app',
+    'registro_metricas',
+    # Linhagem
+    'ancestrais_lote',
+    'descendentes_lote',
+    'linhagem_lote',
+    'expandir_lotes_com_predecessores',
+    'mapear_grupos_linhagem',
+    'info_lote',
+    # Gráficos
+    'carregar_mapas_graficos',
+    'carregar_totais_mapas',
+    'carregar_totais_diarios',
+    'obter_indice_unidades',
+    # Agregação
+    'agregar_mapas',
+    'serie_total',
+    'serie_grupo',
+    'series_por_campo',
+    'valores_por_periodo_grupo',
+    'preco_refeicao',
+    'chaves_periodo_datas',
     # Auth
     'cadastrar_novo_usuario',
     'validar_login',
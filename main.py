@@ -1,11 +1,13 @@
 from flask import Flask, request, jsonify, render_template, session, flash, redirect, url_for, abort, send_file
 from flask_sqlalchemy import SQLAlchemy
 from functools import wraps
+import click
 import os
 import json
 import re
 import io
 import calendar
+import logging
 from datetime import datetime
 from copy import copy
 from functions.models import db, Usuario, Lote
@@ -26,17 +28,38 @@ from functions.utils import (
     carregar_lotes_para_dashboard,
     normalizar_precos,
     salvar_mapas_raw,
+    salvar_mapas_lote,
+    importar_texto_multimes,
     calcular_metricas_lotes,
     preparar_dados_entrada_manual,
     reordenar_registro_mapas,
     adicionar_siisp_em_mapa,
+    adicionar_siisp_em_mapas_lote,
     excluir_mapa,
     _load_mapas_partitioned,
-    gerar_excel_exportacao,
-    gerar_excel_exportacao_multiplos_lotes,
-    calcular_ultima_atividade_lotes
+    calcular_ultima_atividade_lotes,
+    executar_migracoes,
+    converter_formato_series,
+    estatisticas_cache,
+    ancestrais_lote,
+    carregar_mapas_graficos,
+    agregar_mapas,
+    serie_total,
+    serie_grupo,
+    valores_por_periodo_grupo,
+    configurar_logs,
+    instrumentar_app,
+    enfileirar_exportacao,
+    obter_tarefa_exportacao,
+    arquivo_tarefa_exportacao,
+    normalizar_parametros_exportacao,
+    chave_exportacao,
+    obter_exportacao
 )
 
+configurar_logs()
+logger = logging.getLogger('main')
+
 app = Flask(__name__)
 app.secret_key = 'sgmrp_seap_2025_secret_key_desenvolvimento'
 app.config['DEBUG'] = True
@@ -54,6 +77,21 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    # Colunas novas, totais dos mapas e tabela diária (mapa_dia) em bancos existentes
+    executar_migracoes()
+
+# Tempo, SQL e tamanho por requisição (/metrics, para usuários logados ou com SGMRP_METRICAS_TOKEN)
+instrumentar_app(app)
+
+
+@app.cli.command('converter-series')
+@click.argument('formato', default='binario')
+def converter_series_command(formato):
+    """Converte as séries diárias dos mapas para 'binario' (int32) ou 'json'"""
+    resultado = converter_formato_series(formato)
+    if not resultado.get('success'):
+        raise click.ClickException(resultado.get('error', 'Erro ao converter séries'))
+    click.echo(f"{resultado.get('convertidos', 0)} mapas convertidos para '{formato}'")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DADOS_DIR = os.path.join(BASE_DIR, 'dados')
@@ -340,30 +378,11 @@ def home():
     usuario_nome = session.get('usuario_nome', '')
     dashboard_data = carregar_lotes_para_dashboard()
     lotes = dashboard_data.get('lotes', [])
-    from functions.mapas import carregar_mapas_db, serialize_mapa
-    mapas_dados = carregar_mapas_db()
-    # Agrupar mapas por lote_id
-    mapas_por_lote = {}
-    for mapa in mapas_dados:
-        lid = str(mapa.get('lote_id'))
-        if lid not in mapas_por_lote:
-            mapas_por_lote[lid] = []
-        mapas_por_lote[lid].append(mapa)
-    # Calcular total de refeições por lote
-    campos_refeicoes = [
-        'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
-        'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario'
-    ]
+    # Mapas e totais já carregados na mesma passagem do dashboard (uma consulta)
+    mapas_dados = dashboard_data.get('mapas_dados', [])
+    refeicoes_por_lote = dashboard_data.get('refeicoes_por_lote', {})
     for lote in lotes:
-        lid = str(lote.get('id'))
-        mapas_lote = mapas_por_lote.get(lid, [])
-        total_refeicoes = 0
-        for mapa in mapas_lote:
-            for campo in campos_refeicoes:
-                vals = mapa.get(campo, [])
-                if isinstance(vals, list):
-                    total_refeicoes += sum(int(x) if x is not None else 0 for x in vals)
-        lote['total_refeicoes'] = total_refeicoes
+        lote['total_refeicoes'] = refeicoes_por_lote.get(str(lote.get('id')), 0)
     
     # Ordenar lotes: ativos primeiro, depois inativos
     lotes.sort(key=lambda x: (not x.get('ativo', True), x.get('id', 0)))
@@ -376,10 +395,8 @@ def home():
 @login_required
 def lotes():
     #Página de listagem de lotes
-    data = carregar_lotes_para_dashboard()
+    data = carregar_lotes_para_dashboard(incluir_mapas=False)
     lotes = data.get('lotes', [])
-    from functions.mapas import carregar_mapas_db
-    mapas = carregar_mapas_db()
     # Nota: calcular_metricas_lotes já foi chamada dentro de carregar_lotes_para_dashboard()
     # Nota: calcular_ultima_atividade_lotes já foi chamada dentro de _load_lotes_data() via lote_to_dict()
     # Não precisamos chamar novamente, pois isso sobrescreveria os valores
@@ -642,12 +659,10 @@ def api_adicionar_dados():
             'cafe_interno', 'cafe_funcionario', 'almoco_interno', 'almoco_funcionario',
             'lanche_interno', 'lanche_funcionario', 'jantar_interno', 'jantar_funcionario', 'dados_siisp'
         ]
-        for campo in campos_refeicoes:
-            vals = data.get(campo)
-            if isinstance(vals, list):
-                print(f"  {campo}: {vals}")
-        if 'datas' in data and isinstance(data['datas'], list):
-            print(f"  datas: {data['datas']}")
+        if logger.isEnabledFor(logging.DEBUG):
+            for campo in campos_refeicoes + ['datas']:
+                if isinstance(data.get(campo), list):
+                    logger.debug("  %s: %s", campo, data[campo])
 
         res = salvar_mapas_raw(data)
         if res.get('success'):
@@ -715,6 +730,55 @@ def api_adicionar_dados():
     except Exception:
         return jsonify({'success': False, 'error': 'Erro interno'}), 200
 
+@app.route('/api/adicionar-dados/lote', methods=['POST'])
+@login_required
+def api_adicionar_dados_lote():
+    # Endpoint para importar vários mapas (lista de entradas) em uma única transação
+    try:
+        data = request.get_json(force=True, silent=True)
+        if isinstance(data, dict):
+            data = data.get('mapas')
+        if not isinstance(data, list) or not data:
+            return jsonify({'success': False, 'error': 'Envie uma lista de mapas (ou {"mapas": [...]})'}), 400
+
+        res = salvar_mapas_lote(data)
+        if not res.get('success'):
+            return jsonify({'success': False, 'error': res.get('error', 'Erro ao salvar')}), 200
+        logger.info("Importação em lote: %s inseridos, %s atualizados, %s erros em %s ms",
+                    res.get('inseridos'), res.get('atualizados'), res.get('erros'), res.get('tempos_ms', {}).get('total'))
+        return jsonify(res), 200
+    except Exception:
+        return jsonify({'success': False, 'error': 'Erro interno'}), 200
+
+@app.route('/api/importar-texto', methods=['POST'])
+@login_required
+def api_importar_texto():
+    # Endpoint para importar um texto com vários meses (ex.: dados/dados.txt) de uma unidade
+    try:
+        arquivo = request.files.get('arquivo')
+        if arquivo:
+            dados = request.form
+            # Lê o arquivo enviado linha a linha, sem carregar tudo em memória
+            texto = (linha.decode('utf-8-sig', errors='replace') for linha in arquivo.stream)
+        else:
+            dados = request.get_json(force=True, silent=True) or {}
+            texto = dados.get('texto')
+        if not texto:
+            return jsonify({'success': False, 'error': 'Envie o campo "texto" ou um arquivo em "arquivo"'}), 400
+
+        res = importar_texto_multimes(
+            texto,
+            dados.get('lote_id'),
+            dados.get('unidade'),
+            ano=dados.get('ano') or None,
+            tipo=dados.get('tipo') or 'refeicoes'
+        )
+        if res.get('success'):
+            logger.info("Importação de texto: %s meses salvos, %s com erro", res.get('salvos'), res.get('erros'))
+        return jsonify(res), 200
+    except Exception:
+        return jsonify({'success': False, 'error': 'Erro interno'}), 200
+
 @app.route('/api/entrada-manual', methods=['POST'])
 @login_required
 def api_entrada_manual():
@@ -830,6 +894,24 @@ def api_adicionar_siisp():
         print(f'❌ Exception: {str(e)}')
         return jsonify({'success': False, 'error': 'Erro interno'}), 200
 
+@app.route('/api/adicionar-siisp/lote', methods=['POST'])
+@login_required
+def api_adicionar_siisp_lote():
+    # Endpoint para adicionar dados SIISP de várias unidades/meses em uma única transação
+    try:
+        data = request.get_json(force=True, silent=True)
+        if isinstance(data, dict):
+            data = data.get('mapas')
+        if not isinstance(data, list) or not data:
+            return jsonify({'success': False, 'error': 'Envie uma lista de dados SIISP (ou {"mapas": [...]})'}), 400
+
+        res = adicionar_siisp_em_mapas_lote(data)
+        if not res.get('success'):
+            return jsonify({'success': False, 'error': res.get('error', 'Erro ao adicionar SIISP')}), 200
+        return jsonify(res), 200
+    except Exception:
+        return jsonify({'success': False, 'error': 'Erro interno'}), 200
+
 @app.route('/api/excluir-dados', methods=['DELETE'])
 @login_required
 def api_excluir_dados():
@@ -853,6 +935,24 @@ def api_excluir_dados():
         print(f'❌ Exception: {str(e)}')
         return jsonify({'success': False, 'error': 'Erro interno'}), 200
 
+def _exportacao_nao_modificada(chave):
+    """Resposta 304 quando o cliente já tem o arquivo desta versão (If-None-Match com a chave)"""
+    if chave in request.if_none_match:
+        resposta = app.response_class(status=304)
+        resposta.set_etag(chave)
+        return resposta
+    return None
+
+def _enviar_exportacao(resultado):
+    """Envia o arquivo exportado (do cache em disco ou em memória) com a chave como ETag"""
+    return send_file(
+        resultado.get('caminho') or resultado['output'],
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=resultado['filename'],
+        etag=resultado['chave']
+    )
+
 @app.route('/exportar-tabela')
 @login_required
 def exportar_tabela():
@@ -870,22 +970,25 @@ def exportar_tabela():
         print("❌ Erro: lote_id não fornecido")
         return jsonify({'error': 'lote_id é obrigatório'}), 400
 
-    # Chamar função auxiliar para gerar Excel
-    resultado = gerar_excel_exportacao(lote_id, unidades_list, data_inicio, data_fim)
+    parametros = normalizar_parametros_exportacao({
+        'lote_id': lote_id, 'unidades': unidades_list, 'data_inicio': data_inicio, 'data_fim': data_fim
+    })['parametros']
+    chave = chave_exportacao(parametros)
+    nao_modificada = _exportacao_nao_modificada(chave)
+    if nao_modificada:
+        return nao_modificada
+
+    # Gerar Excel (ou reaproveitar do cache de exportações)
+    resultado = obter_exportacao(parametros, chave=chave)
     
     if not resultado.get('success'):
         erro = resultado.get('error', 'Erro desconhecido')
         print(f"❌ Erro: {erro}")
         return jsonify({'error': erro}), 500
     
-    print(f"✅ Arquivo gerado: {resultado['filename']}")
+    logger.info("Arquivo gerado: %s (%s)", resultado['filename'], resultado['origem'])
     
-    return send_file(
-        resultado['output'],
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=resultado['filename']
-    )
+    return _enviar_exportacao(resultado)
 
 @app.route('/exportar-dashboard')
 @login_required
@@ -902,15 +1005,21 @@ def exportar_dashboard():
         print("❌ Erro: data_inicio e data_fim são obrigatórios")
         return jsonify({'error': 'data_inicio e data_fim são obrigatórios'}), 400
 
-    if exportar_todos:
-        # Exportar todos os lotes do período
-        resultado = gerar_excel_exportacao_multiplos_lotes(data_inicio, data_fim)
-    else:
-        # Exportar apenas um lote específico
-        if lote_id is None:
-            print("❌ Erro: lote_id não fornecido")
-            return jsonify({'error': 'lote_id é obrigatório quando exportar_todos_lotes=false'}), 400
-        resultado = gerar_excel_exportacao(lote_id, [], data_inicio, data_fim)
+    if not exportar_todos and lote_id is None:
+        print("❌ Erro: lote_id não fornecido")
+        return jsonify({'error': 'lote_id é obrigatório quando exportar_todos_lotes=false'}), 400
+
+    # Todos os lotes do período ou apenas um lote específico
+    parametros = normalizar_parametros_exportacao({
+        'exportar_todos_lotes': exportar_todos, 'lote_id': lote_id,
+        'data_inicio': data_inicio, 'data_fim': data_fim
+    })['parametros']
+    chave = chave_exportacao(parametros)
+    nao_modificada = _exportacao_nao_modificada(chave)
+    if nao_modificada:
+        return nao_modificada
+
+    resultado = obter_exportacao(parametros, chave=chave)
     
     if not resultado.get('success'):
         erro = resultado.get('error', 'Erro desconhecido')
@@ -922,10 +1031,50 @@ def exportar_dashboard():
         
         return jsonify({'error': erro}), 500
     
-    print(f"✅ Arquivo gerado: {resultado['filename']}")
+    logger.info("Arquivo gerado: %s (%s)", resultado['filename'], resultado['origem'])
     
+    return _enviar_exportacao(resultado)
+
+@app.route('/api/exportacoes', methods=['POST'])
+@login_required
+def api_criar_exportacao():
+    """Enfileira uma exportação Excel (mesmos parâmetros de /exportar-tabela e /exportar-dashboard)"""
+    dados = request.get_json(silent=True) or request.form.to_dict() or request.args.to_dict()
+    resultado = enfileirar_exportacao(dados)
+    if not resultado.get('success'):
+        return jsonify({'success': False, 'error': resultado.get('error')}), 400
+
+    tarefa = resultado['tarefa']
+    logger.info("Exportação %s (%s)", tarefa['id'], 'reaproveitada' if resultado['reaproveitada'] else 'nova')
+    return jsonify({
+        'success': True,
+        'reaproveitada': resultado['reaproveitada'],
+        'tarefa': tarefa,
+        'url_status': url_for('api_status_exportacao', tarefa_id=tarefa['id']),
+        'url_arquivo': url_for('api_arquivo_exportacao', tarefa_id=tarefa['id'])
+    }), 202
+
+@app.route('/api/exportacoes/<tarefa_id>', methods=['GET'])
+@login_required
+def api_status_exportacao(tarefa_id):
+    """Status e progresso de uma exportação (fase, lotes concluídos / total)"""
+    tarefa = obter_tarefa_exportacao(tarefa_id)
+    if tarefa is None:
+        return jsonify({'success': False, 'error': 'Exportação não encontrada ou expirada'}), 404
+    return jsonify({'success': True, 'tarefa': tarefa}), 200
+
+@app.route('/api/exportacoes/<tarefa_id>/arquivo', methods=['GET'])
+@login_required
+def api_arquivo_exportacao(tarefa_id):
+    """Download do arquivo de uma exportação concluída"""
+    resultado = arquivo_tarefa_exportacao(tarefa_id)
+    if not resultado.get('success'):
+        # 404: inexistente/expirada; 409: ainda em andamento ou terminou com erro
+        codigo = 404 if resultado.get('status') is None else 409
+        return jsonify({'success': False, 'error': resultado.get('error'), 'status': resultado.get('status')}), codigo
+
     return send_file(
-        resultado['output'],
+        resultado['caminho'],
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
         download_name=resultado['filename']
@@ -946,23 +1095,15 @@ def dashboard():
     lotes_raw = _load_lotes_data()
     
     # Filtrar apenas lotes ATIVOS e adicionar informação de predecessores
-    from functions.lotes import Lote
     from functions.unidades import Unidade
     
     lotes = []
     for lote_dict in lotes_raw:
         lote_id = lote_dict.get('id')
-        lote_obj = db.session.get(Lote, lote_id)
         
-        if lote_obj and lote_obj.ativo:
+        if lote_dict.get('ativo'):
             # Contar quantos predecessores este lote tem (cadeia histórica)
-            num_predecessores = 0
-            predecessor_id = lote_obj.lote_predecessor_id
-            
-            while predecessor_id:
-                num_predecessores += 1
-                predecessor = db.session.get(Lote, predecessor_id)
-                predecessor_id = predecessor.lote_predecessor_id if predecessor else None
+            num_predecessores = len(ancestrais_lote(lote_id))
             
             # Adicionar indicação de histórico no nome
             lote_dict_modificado = lote_dict.copy()
@@ -1020,14 +1161,8 @@ def api_dashboard_grafico_refeicoes():
         tipo_visualizacao = data.get('tipo', 'normal')  # 'normal' ou 'acumulada'
         tipo_agrupamento = data.get('agrupamento', 'total')  # 'total', 'por-lote' ou 'por-unidade'
         
-        print(f"\n{'='*80}")
-        print(f"📊 API GRÁFICO REFEIÇÕES")
-        print(f"{'='*80}")
-        print(f"Lotes recebidos: {lotes_ids}")
-        print(f"Unidades recebidas (RAW): {unidades_ids}")
-        print(f"Tipo visualização: {tipo_visualizacao}")
-        print(f"Tipo agrupamento: {tipo_agrupamento}")
-        print(f"{'='*80}\n")
+        logger.debug("Gráfico refeições - lotes: %s, unidades: %s, tipo: %s, agrupamento: %s",
+                     lotes_ids, unidades_ids, tipo_visualizacao, tipo_agrupamento)
         
         # Validar entrada
         if not lotes_ids or len(lotes_ids) == 0:
@@ -1037,186 +1172,42 @@ def api_dashboard_grafico_refeicoes():
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         unidades_ids = [int(uid) for uid in unidades_ids if uid] if unidades_ids else []
         
-        print(f"🔍 Unidades recebidas: {unidades_ids}")
-        print(f"🔍 Tipo de agrupamento: {tipo_agrupamento}")
-        
-        # Buscar mapas dos lotes selecionados + predecessores
-        from functions.mapas import carregar_mapas_db
-        from functions.lotes import Lote
-        from functions.unidades import Unidade
+        # Buscar mapas dos lotes selecionados + predecessores (uma consulta, filtro de unidades no SQL)
+        # Cada lote selecionado é seu próprio grupo; predecessores entram no grupo do sucessor
+        carga = carregar_mapas_graficos(lotes_ids, unidades_ids)
+        mapas_dados = carga['mapas']
+        lotes_info = carga['lotes_info']
+        lote_para_grupo = carga['lote_para_grupo']
         
-        mapas_dados = []
-        lotes_info = {}
+        logger.debug("Mapeamento lote->grupo: %s", lote_para_grupo)
         
-        # Mapear cada lote selecionado para seus predecessores
-        lote_para_grupo = {}  # {lote_id_qualquer: lote_principal_id}
-        
-        # Função recursiva para buscar predecessores
-        def buscar_predecessores_recursivo(lote_id, lote_principal_id):
-            """Busca recursivamente todos os predecessores de um lote e mapeia para o lote principal"""
-            lote = db.session.get(Lote, lote_id)
-            if lote:
-                lote_para_grupo[lote_id] = lote_principal_id
-                
-                # Buscar info do lote
-                lotes_info[lote_id] = {
-                    'id': lote_id,
-                    'nome': lote.nome,
-                    'empresa': lote.empresa
-                }
-                
-                # Se tem predecessor, continuar recursão
-                if lote.lote_predecessor_id and lote.lote_predecessor_id not in lote_para_grupo:
-                    print(f"  📦 Lote {lote_id} -> Predecessor: Lote {lote.lote_predecessor_id} (grupo: {lote_principal_id})")
-                    buscar_predecessores_recursivo(lote.lote_predecessor_id, lote_principal_id)
-        
-        # Para cada lote selecionado, buscar seus predecessores
-        for lote_id in lotes_ids:
-            print(f"📦 Processando Lote {lote_id} e seus predecessores...")
-            buscar_predecessores_recursivo(lote_id, lote_id)  # O lote é seu próprio grupo
-        
-        print(f"📊 Mapeamento lote->grupo: {lote_para_grupo}")
-        
-        # Buscar mapas de todos os lotes (principais + predecessores)
-        for lote_id in lote_para_grupo.keys():
-            mapas = carregar_mapas_db({'lote_id': lote_id})
-            for mapa in mapas:
-                mapa['lote_info'] = lotes_info[lote_id]
-                mapa['lote_grupo'] = lote_para_grupo[lote_id]  # Adicionar grupo
-                mapas_dados.append(mapa)
-        
-        if not mapas_dados:
+        if not carga['existem_mapas']:
             return jsonify({'success': False, 'error': 'Nenhum dado encontrado para os lotes selecionados'}), 404
         
-        # Organizar dados por período (ano-mês)
-        # Estrutura depende do tipo de agrupamento
-        if tipo_agrupamento == 'por-unidade':
-            periodos_dados = {}  # {periodo: {unidade_id: total_refeicoes}}
-        else:
-            periodos_dados = {}  # {periodo: {lote_grupo_id: total_refeicoes}}
-        
-        # Criar mapeamento de unidade_id -> nome para o agrupamento por unidade
-        unidades_info = {}
-        # Criar mapeamento de nome -> id para converter os nomes dos mapas em IDs
-        # (Necessário para filtrar por unidades em todos os modos)
-        unidade_nome_para_id = {}
-        # Criar mapeamento de subunidade -> unidade principal
-        subunidade_para_principal = {}
-        
-        todas_unidades = Unidade.query.all()
-        for u in todas_unidades:
-            unidade_nome_para_id[u.nome] = u.id
-            
-            # Se é subunidade, mapear para a unidade principal
-            if u.unidade_principal_id:
-                subunidade_para_principal[u.id] = u.unidade_principal_id
-            
-            if tipo_agrupamento == 'por-unidade':
-                if not unidades_ids or u.id in unidades_ids:
-                    unidades_info[u.id] = {
-                        'id': u.id,
-                        'nome': u.nome,
-                        'lote_id': u.lote_id
-                    }
-        
-        campos_refeicoes = [
-            'cafe_interno', 'cafe_funcionario',
-            'almoco_interno', 'almoco_funcionario',
-            'lanche_interno', 'lanche_funcionario',
-            'jantar_interno', 'jantar_funcionario'
-        ]
-        
-        print(f"🔍 Total de mapas a processar: {len(mapas_dados)}")
-        mapas_com_unidade = sum(1 for m in mapas_dados if m.get('unidade'))
-        unidades_unicas = set(m.get('unidade') for m in mapas_dados if m.get('unidade'))
-        print(f"🔍 Mapas com unidade definida: {mapas_com_unidade}")
-        print(f"🔍 Nomes de unidades encontrados nos mapas: {sorted(unidades_unicas) if unidades_unicas else 'Nenhum'}")
-        if len(mapas_dados) > 0:
-            exemplos = mapas_dados[:3]
-            for i, ex in enumerate(exemplos, 1):
-                print(f"🔍 Exemplo mapa {i}: lote_id={ex.get('lote_id')}, unidade={ex.get('unidade')}, ano={ex.get('ano')}, mes={ex.get('mes')}")
-        
-        mapas_processados = 0
-        mapas_filtrados = 0
-        
-        for mapa in mapas_dados:
-            ano = mapa.get('ano')
-            mes = mapa.get('mes')
-            lote_grupo = mapa.get('lote_grupo')
-            unidade_nome = mapa.get('unidade')
-            # Converter nome da unidade para ID (necessário para filtrar por unidades)
-            unidade_id = unidade_nome_para_id.get(unidade_nome) if unidade_nome else None
-            
-            # Se é subunidade, agregar na unidade principal
-            if unidade_id and unidade_id in subunidade_para_principal:
-                unidade_id = subunidade_para_principal[unidade_id]
-            
-            if not ano or not mes:
-                continue
-            
-            # Se há unidades selecionadas, filtrar apenas essas unidades (aplica em todos os modos)
-            if unidades_ids and unidade_id and unidade_id not in unidades_ids:
-                mapas_filtrados += 1
-                continue
-            
-            mapas_processados += 1
-            
-            periodo = f"{ano}-{mes:02d}"
-            
-            if periodo not in periodos_dados:
-                periodos_dados[periodo] = {}
-            
-            # Determinar a chave de agrupamento
-            if tipo_agrupamento == 'por-unidade':
-                if not unidade_id:
-                    print(f"⚠️ Mapa sem unidade válida (nome: '{unidade_nome}') - Lote: {mapa.get('lote_id')}, Ano/Mês: {ano}/{mes}")
-                    continue
-                grupo_key = unidade_id
-            else:
-                if not lote_grupo:
-                    continue
-                grupo_key = lote_grupo
-            
-            if grupo_key not in periodos_dados[periodo]:
-                periodos_dados[periodo][grupo_key] = 0
-            
-            # Calcular total de refeições no mapa
-            total_mapa = 0
-            for campo in campos_refeicoes:
-                valores = mapa.get(campo, [])
-                if isinstance(valores, list):
-                    total_mapa += sum(int(v) if v is not None else 0 for v in valores)
-            
-            periodos_dados[periodo][grupo_key] += total_mapa
-        
-        print(f"🔍 Mapas processados: {mapas_processados}, Mapas filtrados por unidade: {mapas_filtrados}")
+        # Agregar por período (ano-mês) e grupo: lote selecionado (+ predecessores) ou unidade principal
+        agregado = agregar_mapas(
+            mapas_dados,
+            medida='refeicoes',
+            agrupar_por='unidade' if tipo_agrupamento == 'por-unidade' else 'lote_grupo',
+            acumulado=(tipo_visualizacao == 'acumulada'),
+            indice_unidades=carga['unidades']
+        )
+        periodos_ordenados = agregado['periodos']
+        unidades_info = carga['unidades']['info']
         
-        # Ordenar períodos
-        periodos_ordenados = sorted(periodos_dados.keys())
+        # Mapas excluídos pelo filtro de unidades sempre têm unidade cadastrada
+        mapas_com_unidade = sum(1 for m in mapas_dados if m.get('unidade')) + carga['mapas_filtrados']
+        logger.debug("Mapas processados: %d, filtrados por unidade: %d", len(mapas_dados), carga['mapas_filtrados'])
         
         # Preparar resposta baseada no tipo de agrupamento
         if tipo_agrupamento == 'total':
             # Somar todos os lotes/unidades
-            valores = []
-            for periodo in periodos_ordenados:
-                total_periodo = sum(periodos_dados[periodo].values())
-                valores.append(total_periodo)
-            
-            # Acumular se necessário
-            if tipo_visualizacao == 'acumulada':
-                valores_acumulados = []
-                acumulado = 0
-                for v in valores:
-                    acumulado += v
-                    valores_acumulados.append(acumulado)
-                valores = valores_acumulados
-            
             resultado = {
                 'success': True,
                 'labels': periodos_ordenados,
                 'datasets': [{
                     'label': 'Total de Refeições',
-                    'data': valores
+                    'data': serie_total(agregado)
                 }],
                 'tipo': tipo_visualizacao,
                 'agrupamento': tipo_agrupamento
@@ -1225,28 +1216,10 @@ def api_dashboard_grafico_refeicoes():
         elif tipo_agrupamento == 'por-lote':
             # Separar por lote (cada lote inclui seus predecessores)
             datasets = []
-            
             for lote_id in lotes_ids:
-                lote_nome = lotes_info.get(lote_id, {}).get('nome', f'Lote {lote_id}')
-                valores = []
-                
-                for periodo in periodos_ordenados:
-                    # Buscar dados do grupo (lote + predecessores)
-                    valor = periodos_dados[periodo].get(lote_id, 0)
-                    valores.append(valor)
-                
-                # Acumular se necessário
-                if tipo_visualizacao == 'acumulada':
-                    valores_acumulados = []
-                    acumulado = 0
-                    for v in valores:
-                        acumulado += v
-                        valores_acumulados.append(acumulado)
-                    valores = valores_acumulados
-                
                 datasets.append({
-                    'label': lote_nome,
-                    'data': valores,
+                    'label': (lotes_info.get(lote_id) or {}).get('nome', f'Lote {lote_id}'),
+                    'data': serie_grupo(agregado, lote_id),
                     'lote_id': lote_id
                 })
             
@@ -1259,15 +1232,6 @@ def api_dashboard_grafico_refeicoes():
             }
         
         else:  # por-unidade
-            # Separar por unidade
-            datasets = []
-            
-            print(f"🔍 Modo por-unidade - unidades_ids recebidas: {unidades_ids}")
-            print(f"🔍 Períodos dados keys (primeiros 3): {list(periodos_dados.keys())[:3]}")
-            if periodos_dados:
-                primeiro_periodo = list(periodos_dados.keys())[0]
-                print(f"🔍 Exemplo - período {primeiro_periodo}: {periodos_dados[primeiro_periodo]}")
-            
             # Verificar se há mapas com unidade válida
             if mapas_com_unidade == 0:
                 return jsonify({
@@ -1277,48 +1241,13 @@ def api_dashboard_grafico_refeicoes():
             
             # Se unidades_ids está vazio, usar todas as unidades que aparecem nos dados
             if not unidades_ids:
-                unidades_ids_processadas = set()
-                for periodo_data in periodos_dados.values():
-                    unidades_ids_processadas.update(periodo_data.keys())
-                unidades_ids = sorted(unidades_ids_processadas)
-                
-                print(f"🔍 Nenhuma unidade selecionada - usando todas: {unidades_ids}")
-                
-                # Carregar info das unidades
-                for uid in unidades_ids:
-                    if uid not in unidades_info:
-                        unidade = db.session.get(Unidade, uid)
-                        if unidade:
-                            unidades_info[uid] = {
-                                'id': uid,
-                                'nome': unidade.nome,
-                                'lote_id': unidade.lote_id
-                            }
-            
-            print(f"🔍 Total de unidades a processar: {len(unidades_ids)}")
+                unidades_ids = sorted(agregado['grupos'])
             
+            datasets = []
             for unidade_id in unidades_ids:
-                unidade_nome = unidades_info.get(unidade_id, {}).get('nome', f'Unidade {unidade_id}')
-                valores = []
-                
-                for periodo in periodos_ordenados:
-                    valor = periodos_dados[periodo].get(unidade_id, 0)
-                    valores.append(valor)
-                
-                print(f"🔍 Unidade {unidade_id} ({unidade_nome}): {len(valores)} valores, soma={sum(valores)}")
-                
-                # Acumular se necessário
-                if tipo_visualizacao == 'acumulada':
-                    valores_acumulados = []
-                    acumulado = 0
-                    for v in valores:
-                        acumulado += v
-                        valores_acumulados.append(acumulado)
-                    valores = valores_acumulados
-                
                 datasets.append({
-                    'label': unidade_nome,
-                    'data': valores,
+                    'label': unidades_info.get(unidade_id, {}).get('nome', f'Unidade {unidade_id}'),
+                    'data': serie_grupo(agregado, unidade_id),
                     'unidade_id': unidade_id
                 })
             
@@ -1330,13 +1259,12 @@ def api_dashboard_grafico_refeicoes():
                 'agrupamento': tipo_agrupamento
             }
         
-        print(f"✅ Retornando dados: {len(periodos_ordenados)} períodos, {len(resultado['datasets'])} dataset(s)")
+        logger.info("Gráfico refeições: %d mapas, %d períodos, %d dataset(s)",
+                    len(mapas_dados), len(periodos_ordenados), len(resultado['datasets']))
         return jsonify(resultado), 200
     
     except Exception as e:
-        print(f"❌ Erro na API gráfico refeições: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro na API gráfico refeições: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -1344,7 +1272,6 @@ def api_dashboard_grafico_refeicoes():
 def api_dashboard_grafico_gastos():
     """Endpoint para buscar dados do gráfico de gastos (R$)"""
     try:
-        import json
         data = request.get_json(force=True, silent=True) or {}
 
         lotes_ids = data.get('lotes', [])
@@ -1360,177 +1287,37 @@ def api_dashboard_grafico_gastos():
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         unidades_ids = [int(uid) for uid in unidades_ids if uid] if unidades_ids else []
 
-        # Buscar mapas dos lotes selecionados + predecessores
-        from functions.mapas import carregar_mapas_db
-        from functions.lotes import Lote
-        from functions.unidades import Unidade
-
-        mapas_dados = []
-        lotes_info = {}
-
-        # Mapear cada lote selecionado para seus predecessores
-        lote_para_grupo = {}  # {lote_id_qualquer: lote_principal_id}
-
-        def buscar_predecessores_recursivo(lote_id, lote_principal_id):
-            lote = db.session.get(Lote, lote_id)
-            if not lote:
-                return
-            lote_para_grupo[lote_id] = lote_principal_id
-            # Guardar preços do lote (podem diferir dos predecessores)
-            try:
-                precos = json.loads(lote.precos) if lote.precos else {}
-            except Exception:
-                precos = {}
-            lotes_info[lote_id] = {
-                'id': lote_id,
-                'nome': lote.nome,
-                'precos': precos
-            }
-
-            # Mapas do lote (não do grupo), mas agregaremos no grupo
-            mapas = carregar_mapas_db({'lote_id': lote_id})
-            for mapa in mapas:
-                mapa['lote_grupo'] = lote_principal_id
-                mapa['lote_id'] = lote_id  # para pegar o preço correto
-                mapas_dados.append(mapa)
+        # Buscar mapas dos lotes selecionados + predecessores (uma consulta, filtro de unidades no SQL)
+        # Cada mapa mantém seu lote_id (preços do lote, que podem diferir dos predecessores)
+        # e é agregado no grupo do lote selecionado
+        carga = carregar_mapas_graficos(lotes_ids, unidades_ids)
+        mapas_dados = carga['mapas']
+        lotes_info = carga['lotes_info']
+        lote_para_grupo = carga['lote_para_grupo']
 
-            if lote.lote_predecessor_id and lote.lote_predecessor_id not in lote_para_grupo:
-                buscar_predecessores_recursivo(lote.lote_predecessor_id, lote_principal_id)
-
-        for lote_id in lotes_ids:
-            buscar_predecessores_recursivo(lote_id, lote_id)
-
-        if not mapas_dados:
+        if not carga['existem_mapas']:
             return jsonify({'success': False, 'error': 'Nenhum dado encontrado para os lotes selecionados'}), 404
 
-        # Estruturas por período
-        if tipo_agrupamento == 'por-unidade':
-            periodos_dados = {}  # {periodo: {unidade_id: total_gastos}}
-        else:
-            periodos_dados = {}  # {periodo: {lote_grupo_id: total_gastos}}
-
-        # Mapear nomes de unidade para IDs e subunidades -> principal
-        unidades_info = {}
-        unidade_nome_para_id = {}
-        subunidade_para_principal = {}
-        todas_unidades = Unidade.query.all()
-        for u in todas_unidades:
-            unidade_nome_para_id[u.nome] = u.id
-            if u.unidade_principal_id:
-                subunidade_para_principal[u.id] = u.unidade_principal_id
-            if tipo_agrupamento == 'por-unidade':
-                if not unidades_ids or u.id in unidades_ids:
-                    unidades_info[u.id] = {
-                        'id': u.id,
-                        'nome': u.nome,
-                        'lote_id': u.lote_id
-                    }
-
-        # Campos de refeições e respectivos preços no lote
-        campos_refeicoes = [
-            'cafe_interno', 'cafe_funcionario',
-            'almoco_interno', 'almoco_funcionario',
-            'lanche_interno', 'lanche_funcionario',
-            'jantar_interno', 'jantar_funcionario'
-        ]
-
-        # Helper para obter preço considerando estrutura de preços aninhada ou chaves planas
-        def get_preco(precos, campo):
-            try:
-                if not isinstance(precos, dict):
-                    return 0.0
-                # campo ex: 'cafe_interno' -> refeicao='cafe', tipo='interno'
-                parts = campo.split('_', 1)
-                refeicao = parts[0] if len(parts) > 0 else ''
-                tipo = parts[1] if len(parts) > 1 else ''
-                valor = 0
-                if refeicao and tipo and isinstance(precos.get(refeicao), dict):
-                    valor = precos.get(refeicao, {}).get(tipo, 0)
-                else:
-                    valor = precos.get(campo, 0)
-                # Converter para float, aceitando strings com vírgula/ponto
-                try:
-                    return float(str(valor).replace(',', '.'))
-                except (ValueError, TypeError):
-                    return 0.0
-            except Exception:
-                return 0.0
-
-        # Processar mapas
-        for mapa in mapas_dados:
-            ano = mapa.get('ano')
-            mes = mapa.get('mes')
-            lote_grupo = mapa.get('lote_grupo')
-            lote_id_origem = mapa.get('lote_id')
-            unidade_nome = mapa.get('unidade')
-            unidade_id = unidade_nome_para_id.get(unidade_nome) if unidade_nome else None
-            if unidade_id and unidade_id in subunidade_para_principal:
-                unidade_id = subunidade_para_principal[unidade_id]
-
-            if not ano or not mes:
-                continue
-
-            # Filtrar por unidades, se houver
-            if unidades_ids and unidade_id and unidade_id not in unidades_ids:
-                continue
-
-            periodo = f"{ano}-{mes:02d}"
-            if periodo not in periodos_dados:
-                periodos_dados[periodo] = {}
-
-            # Determinar agrupamento
-            if tipo_agrupamento == 'por-unidade':
-                if not unidade_id:
-                    continue
-                grupo_key = unidade_id
-            else:
-                if not lote_grupo:
-                    continue
-                grupo_key = lote_grupo
-
-            if grupo_key not in periodos_dados[periodo]:
-                periodos_dados[periodo][grupo_key] = 0.0
-
-            # Calcular gasto do mapa usando preços do lote de origem
-            precos_lote = lotes_info.get(lote_id_origem, {}).get('precos', {})
-            gasto_mapa = 0.0
-            for campo in campos_refeicoes:
-                valores = mapa.get(campo, [])
-                preco = get_preco(precos_lote, campo)
-                if isinstance(valores, list) and preco:
-                    try:
-                        quantidade = sum(int(v) if v is not None else 0 for v in valores)
-                    except Exception:
-                        quantidade = 0
-                    try:
-                        gasto_mapa += quantidade * preco
-                    except Exception:
-                        pass
-
-            periodos_dados[periodo][grupo_key] += gasto_mapa
-
-        # Ordenar períodos
-        periodos_ordenados = sorted(periodos_dados.keys())
+        # Agregar gastos (quantidade × preço do lote de origem do mapa) por período e grupo
+        agregado = agregar_mapas(
+            mapas_dados,
+            medida='gastos',
+            agrupar_por='unidade' if tipo_agrupamento == 'por-unidade' else 'lote_grupo',
+            precos_por_lote={lote_id: info['precos'] for lote_id, info in lotes_info.items()},
+            acumulado=(tipo_visualizacao == 'acumulada'),
+            indice_unidades=carga['unidades']
+        )
+        periodos_ordenados = agregado['periodos']
+        unidades_info = carga['unidades']['info']
 
         # Montar resposta
         if tipo_agrupamento == 'total':
-            valores = []
-            for periodo in periodos_ordenados:
-                total_periodo = sum(periodos_dados[periodo].values())
-                valores.append(total_periodo)
-            if tipo_visualizacao == 'acumulada':
-                acumulado = 0
-                valores_acumulados = []
-                for v in valores:
-                    acumulado += v
-                    valores_acumulados.append(acumulado)
-                valores = valores_acumulados
             resultado = {
                 'success': True,
                 'labels': periodos_ordenados,
                 'datasets': [{
                     'label': 'Total de Gastos (R$)',
-                    'data': valores
+                    'data': serie_total(agregado)
                 }],
                 'tipo': tipo_visualizacao,
                 'agrupamento': tipo_agrupamento
@@ -1541,20 +1328,9 @@ def api_dashboard_grafico_gastos():
             # Mostrar apenas lotes principais selecionados
             lotes_principais = sorted(set(lote_para_grupo[l] for l in lotes_ids))
             for lote_id in lotes_principais:
-                lote_nome = lotes_info.get(lote_id, {}).get('nome', f'Lote {lote_id}')
-                valores = []
-                for periodo in periodos_ordenados:
-                    valores.append(periodos_dados[periodo].get(lote_id, 0))
-                if tipo_visualizacao == 'acumulada':
-                    acumulado = 0
-                    valores_acumulados = []
-                    for v in valores:
-                        acumulado += v
-                        valores_acumulados.append(acumulado)
-                    valores = valores_acumulados
                 datasets.append({
-                    'label': lote_nome,
-                    'data': valores,
+                    'label': (lotes_info.get(lote_id) or {}).get('nome', f'Lote {lote_id}'),
+                    'data': serie_grupo(agregado, lote_id),
                     'lote_id': lote_id
                 })
             resultado = {
@@ -1569,34 +1345,11 @@ def api_dashboard_grafico_gastos():
             datasets = []
             # Se nenhuma unidade foi enviada, derivar das chaves presentes
             if not unidades_ids:
-                unidades_ids_processadas = set()
-                for periodo_data in periodos_dados.values():
-                    unidades_ids_processadas.update(periodo_data.keys())
-                unidades_ids = sorted(unidades_ids_processadas)
-                for uid in unidades_ids:
-                    if uid not in unidades_info:
-                        unidade = db.session.get(Unidade, uid)
-                        if unidade:
-                            unidades_info[uid] = {
-                                'id': uid,
-                                'nome': unidade.nome,
-                                'lote_id': unidade.lote_id
-                            }
+                unidades_ids = sorted(agregado['grupos'])
             for unidade_id in unidades_ids:
-                unidade_nome = unidades_info.get(unidade_id, {}).get('nome', f'Unidade {unidade_id}')
-                valores = []
-                for periodo in periodos_ordenados:
-                    valores.append(periodos_dados[periodo].get(unidade_id, 0))
-                if tipo_visualizacao == 'acumulada':
-                    acumulado = 0
-                    valores_acumulados = []
-                    for v in valores:
-                        acumulado += v
-                        valores_acumulados.append(acumulado)
-                    valores = valores_acumulados
                 datasets.append({
-                    'label': unidade_nome,
-                    'data': valores,
+                    'label': unidades_info.get(unidade_id, {}).get('nome', f'Unidade {unidade_id}'),
+                    'data': serie_grupo(agregado, unidade_id),
                     'unidade_id': unidade_id
                 })
             resultado = {
@@ -1607,12 +1360,12 @@ def api_dashboard_grafico_gastos():
                 'agrupamento': tipo_agrupamento
             }
 
+        logger.info("Gráfico gastos: %d mapas, %d períodos, %d dataset(s)",
+                    len(mapas_dados), len(agregado['periodos']), len(resultado['datasets']))
         return jsonify(resultado), 200
 
     except Exception as e:
-        print(f"❌ Erro na API gráfico gastos: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro na API gráfico gastos: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/lote/<int:lote_id>/unidades', methods=['GET'])
@@ -1692,10 +1445,8 @@ def api_dashboard_grafico_refeicoes_desagregado():
         unidades_ids = data.get('unidades', [])
         tipo_agrupamento = data.get('agrupamento', 'total')
         
-        print(f"\n{'='*80}")
-        print(f"📊 API GRÁFICO REFEIÇÕES DESAGREGADO")
-        print(f"{'='*80}")
-        print(f"Lotes: {lotes_ids}, Unidades: {unidades_ids}, Agrupamento: {tipo_agrupamento}")
+        logger.debug("Gráfico refeições desagregado - lotes: %s, unidades: %s, agrupamento: %s",
+                     lotes_ids, unidades_ids, tipo_agrupamento)
         
         if not lotes_ids or len(lotes_ids) == 0:
             return jsonify({'success': False, 'error': 'Nenhum lote selecionado'}), 400
@@ -1703,9 +1454,6 @@ def api_dashboard_grafico_refeicoes_desagregado():
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         unidades_ids = [int(uid) for uid in unidades_ids if uid] if unidades_ids else []
         
-        from functions.mapas import carregar_mapas_db
-        from functions.unidades import Unidade
-        
         campos_refeicoes = [
             'cafe_interno', 'cafe_funcionario',
             'almoco_interno', 'almoco_funcionario',
@@ -1713,127 +1461,47 @@ def api_dashboard_grafico_refeicoes_desagregado():
             'jantar_interno', 'jantar_funcionario'
         ]
         
-        # Buscar predecessores e mapear lotes
-        lote_para_grupo = {}
-        def buscar_predecessores_recursivo(lote_id, lote_principal_id):
-            lote = db.session.get(Lote, lote_id)
-            if lote:
-                lote_para_grupo[lote_id] = lote_principal_id
-                if lote.lote_predecessor_id and lote.lote_predecessor_id not in lote_para_grupo:
-                    buscar_predecessores_recursivo(lote.lote_predecessor_id, lote_principal_id)
-        
-        for lote_id in lotes_ids:
-            buscar_predecessores_recursivo(lote_id, lote_id)
-        
-        # Buscar mapas
-        mapas_dados = []
-        for lote_id in lote_para_grupo.keys():
-            mapas = carregar_mapas_db({'lote_id': lote_id})
-            for mapa in mapas:
-                mapa['lote_grupo'] = lote_para_grupo[lote_id]
-                mapas_dados.append(mapa)
-        
-        if not mapas_dados:
-            return jsonify({'success': False, 'error': 'Nenhum dado encontrado'}), 404
+        # Buscar mapas dos lotes + predecessores (uma consulta) e mapear lotes
+        carga = carregar_mapas_graficos(lotes_ids, unidades_ids)
+        mapas_dados = carga['mapas']
         
-        # Criar mapeamento de unidades
-        unidade_nome_para_id = {}
-        subunidade_para_principal = {}
-        todas_unidades = Unidade.query.all()
-        for u in todas_unidades:
-            unidade_nome_para_id[u.nome] = u.id
-            if u.unidade_principal_id:
-                subunidade_para_principal[u.id] = u.unidade_principal_id
-        
-        # Estrutura: {periodo: {grupo_key: {tipo_refeicao: total}}}
-        periodos_dados = {}
-        
-        for mapa in mapas_dados:
-            ano = mapa.get('ano')
-            mes = mapa.get('mes')
-            lote_grupo = mapa.get('lote_grupo')
-            unidade_nome = mapa.get('unidade')
-            unidade_id = unidade_nome_para_id.get(unidade_nome) if unidade_nome else None
-            
-            if unidade_id and unidade_id in subunidade_para_principal:
-                unidade_id = subunidade_para_principal[unidade_id]
-            
-            if not ano or not mes:
-                continue
-            
-            if unidades_ids and unidade_id and unidade_id not in unidades_ids:
-                continue
-            
-            periodo = f"{ano}-{mes:02d}"
-            
-            if periodo not in periodos_dados:
-                periodos_dados[periodo] = {}
-            
-            # Determinar chave de agrupamento
-            if tipo_agrupamento == 'por-unidade':
-                if not unidade_id:
-                    continue
-                grupo_key = unidade_id
-            else:  # total
-                if not lote_grupo:
-                    continue
-                grupo_key = lote_grupo
-            
-            if grupo_key not in periodos_dados[periodo]:
-                periodos_dados[periodo][grupo_key] = {campo: 0 for campo in campos_refeicoes}
-            
-            # Somar cada tipo de refeição separadamente
-            for campo in campos_refeicoes:
-                valores = mapa.get(campo, [])
-                if isinstance(valores, list):
-                    total_campo = sum(int(v) if v is not None else 0 for v in valores)
-                    periodos_dados[periodo][grupo_key][campo] += total_campo
+        if not carga['existem_mapas']:
+            return jsonify({'success': False, 'error': 'Nenhum dado encontrado'}), 404
         
-        # Ordenar períodos
-        periodos_ordenados = sorted(periodos_dados.keys())
+        # Agregar cada tipo de refeição separadamente: {tipo_refeicao: {periodo: {grupo_key: valor}}}
+        agregado = agregar_mapas(
+            mapas_dados,
+            medida='refeicoes',
+            agrupar_por='unidade' if tipo_agrupamento == 'por-unidade' else 'lote_grupo',
+            campos=campos_refeicoes,
+            indice_unidades=carga['unidades']
+        )
         
-        # Estruturar resposta
         resultado = {
             'success': True,
-            'labels': periodos_ordenados,
-            'dados_por_tipo': {}  # {tipo_refeicao: {periodo: {grupo_key: valor}}}
+            'labels': agregado['periodos'],
+            'dados_por_tipo': valores_por_periodo_grupo(agregado)
         }
         
-        # Reorganizar para facilitar uso no frontend
-        for campo in campos_refeicoes:
-            resultado['dados_por_tipo'][campo] = {}
-            for periodo in periodos_ordenados:
-                resultado['dados_por_tipo'][campo][periodo] = periodos_dados[periodo]
-                # Converter para estrutura mais simples: {grupo_key: valor}
-                resultado['dados_por_tipo'][campo][periodo] = {
-                    grupo_key: dados[campo] 
-                    for grupo_key, dados in periodos_dados[periodo].items()
-                }
-        
-        print(f"✅ Retornando {len(periodos_ordenados)} períodos com dados desagregados")
+        logger.info("Gráfico refeições desagregado: %d mapas, %d períodos", len(mapas_dados), len(agregado['periodos']))
         return jsonify(resultado), 200
     
     except Exception as e:
-        print(f"❌ Erro ao buscar dados desagregados: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro ao buscar dados desagregados: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/dashboard/grafico-gastos-desagregado', methods=['POST'])
 def api_dashboard_grafico_gastos_desagregado():
     """Endpoint para buscar dados de gastos desagregados por tipo de refeição (para previsões mais precisas)"""
     try:
-        import json
         data = request.get_json(force=True, silent=True) or {}
         
         lotes_ids = data.get('lotes', [])
         unidades_ids = data.get('unidades', [])
         tipo_agrupamento = data.get('agrupamento', 'total')
         
-        print(f"\n{'='*80}")
-        print(f"📊 API GRÁFICO GASTOS DESAGREGADO")
-        print(f"{'='*80}")
-        print(f"Lotes: {lotes_ids}, Unidades: {unidades_ids}, Agrupamento: {tipo_agrupamento}")
+        logger.debug("Gráfico gastos desagregado - lotes: %s, unidades: %s, agrupamento: %s",
+                     lotes_ids, unidades_ids, tipo_agrupamento)
         
         if not lotes_ids or len(lotes_ids) == 0:
             return jsonify({'success': False, 'error': 'Nenhum lote selecionado'}), 400
@@ -1841,9 +1509,6 @@ def api_dashboard_grafico_gastos_desagregado():
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         unidades_ids = [int(uid) for uid in unidades_ids if uid] if unidades_ids else []
         
-        from functions.mapas import carregar_mapas_db
-        from functions.unidades import Unidade
-        
         campos_refeicoes = [
             'cafe_interno', 'cafe_funcionario',
             'almoco_interno', 'almoco_funcionario',
@@ -1851,144 +1516,34 @@ def api_dashboard_grafico_gastos_desagregado():
             'jantar_interno', 'jantar_funcionario'
         ]
         
-        # Buscar predecessores e mapear lotes
-        lote_para_grupo = {}
-        lotes_info = {}
-        mapas_dados = []
+        # Buscar mapas dos lotes + predecessores (uma consulta); cada mapa mantém seu lote_id (preços)
+        carga = carregar_mapas_graficos(lotes_ids, unidades_ids)
+        mapas_dados = carga['mapas']
         
-        def buscar_predecessores_recursivo(lote_id, lote_principal_id):
-            lote = db.session.get(Lote, lote_id)
-            if not lote:
-                return
-            lote_para_grupo[lote_id] = lote_principal_id
-            
-            # Guardar preços do lote
-            try:
-                precos = json.loads(lote.precos) if lote.precos else {}
-            except Exception:
-                precos = {}
-            lotes_info[lote_id] = {
-                'id': lote_id,
-                'nome': lote.nome,
-                'precos': precos
-            }
-            
-            # Buscar mapas
-            mapas = carregar_mapas_db({'lote_id': lote_id})
-            for mapa in mapas:
-                mapa['lote_grupo'] = lote_principal_id
-                mapa['lote_id'] = lote_id
-                mapas_dados.append(mapa)
-            
-            if lote.lote_predecessor_id and lote.lote_predecessor_id not in lote_para_grupo:
-                buscar_predecessores_recursivo(lote.lote_predecessor_id, lote_principal_id)
-        
-        for lote_id in lotes_ids:
-            buscar_predecessores_recursivo(lote_id, lote_id)
-        
-        if not mapas_dados:
+        if not carga['existem_mapas']:
             return jsonify({'success': False, 'error': 'Nenhum dado encontrado'}), 404
         
-        # Criar mapeamento de unidades
-        unidade_nome_para_id = {}
-        subunidade_para_principal = {}
-        todas_unidades = Unidade.query.all()
-        for u in todas_unidades:
-            unidade_nome_para_id[u.nome] = u.id
-            if u.unidade_principal_id:
-                subunidade_para_principal[u.id] = u.unidade_principal_id
-        
-        # Estrutura: {periodo: {grupo_key: {tipo_refeicao: total_gasto}}}
-        periodos_dados = {}
-        
-        for mapa in mapas_dados:
-            ano = mapa.get('ano')
-            mes = mapa.get('mes')
-            lote_grupo = mapa.get('lote_grupo')
-            lote_id_mapa = mapa.get('lote_id')
-            unidade_nome = mapa.get('unidade')
-            unidade_id = unidade_nome_para_id.get(unidade_nome) if unidade_nome else None
-            
-            if unidade_id and unidade_id in subunidade_para_principal:
-                unidade_id = subunidade_para_principal[unidade_id]
-            
-            if not ano or not mes:
-                continue
-            
-            if unidades_ids and unidade_id and unidade_id not in unidades_ids:
-                continue
-            
-            periodo = f"{ano}-{mes:02d}"
-            
-            if periodo not in periodos_dados:
-                periodos_dados[periodo] = {}
-            
-            # Determinar chave de agrupamento
-            if tipo_agrupamento == 'por-unidade':
-                if not unidade_id:
-                    continue
-                grupo_key = unidade_id
-            else:  # total
-                if not lote_grupo:
-                    continue
-                grupo_key = lote_grupo
-            
-            if grupo_key not in periodos_dados[periodo]:
-                periodos_dados[periodo][grupo_key] = {campo: 0.0 for campo in campos_refeicoes}
-            
-            # Pegar preços do lote específico
-            precos = lotes_info.get(lote_id_mapa, {}).get('precos', {})
-            
-            # Calcular gasto de cada tipo de refeição separadamente
-            for campo in campos_refeicoes:
-                valores = mapa.get(campo, [])
-                if isinstance(valores, list):
-                    quantidade_total = sum(int(v) if v is not None else 0 for v in valores)
-                    
-                    # Mapear campo para estrutura hierárquica de preços
-                    # Estrutura: {"cafe": {"interno": "2.24", "funcionario": "2.41"}, ...}
-                    # Campo: "cafe_interno" -> precos['cafe']['interno']
-                    partes = campo.split('_')  # ['cafe', 'interno']
-                    if len(partes) == 2:
-                        tipo_refeicao = partes[0]  # 'cafe'
-                        categoria = partes[1]  # 'interno'
-                        preco = precos.get(tipo_refeicao, {}).get(categoria, 0)
-                        if isinstance(preco, str):
-                            preco = float(preco)
-                        elif not isinstance(preco, (int, float)):
-                            preco = 0
-                    else:
-                        preco = 0
-                    
-                    gasto_campo = quantidade_total * preco
-                    periodos_dados[periodo][grupo_key][campo] += gasto_campo
-        
-        # Ordenar períodos
-        periodos_ordenados = sorted(periodos_dados.keys())
+        # Agregar cada tipo de refeição separadamente: {tipo_refeicao: {periodo: {grupo_key: valor}}}
+        agregado = agregar_mapas(
+            mapas_dados,
+            medida='gastos',
+            agrupar_por='unidade' if tipo_agrupamento == 'por-unidade' else 'lote_grupo',
+            campos=campos_refeicoes,
+            precos_por_lote={lote_id: info['precos'] for lote_id, info in carga['lotes_info'].items()},
+            indice_unidades=carga['unidades']
+        )
         
-        # Estruturar resposta
         resultado = {
             'success': True,
-            'labels': periodos_ordenados,
-            'dados_por_tipo': {}  # {tipo_refeicao: {periodo: {grupo_key: valor}}}
+            'labels': agregado['periodos'],
+            'dados_por_tipo': valores_por_periodo_grupo(agregado)
         }
         
-        # Reorganizar para facilitar uso no frontend
-        for campo in campos_refeicoes:
-            resultado['dados_por_tipo'][campo] = {}
-            for periodo in periodos_ordenados:
-                resultado['dados_por_tipo'][campo][periodo] = {
-                    grupo_key: dados[campo] 
-                    for grupo_key, dados in periodos_dados[periodo].items()
-                }
-        
-        print(f"✅ Retornando {len(periodos_ordenados)} períodos com dados de gastos desagregados")
+        logger.info("Gráfico gastos desagregado: %d mapas, %d períodos", len(mapas_dados), len(agregado['periodos']))
         return jsonify(resultado), 200
     
     except Exception as e:
-        print(f"❌ Erro ao buscar dados de gastos desagregados: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro ao buscar dados de gastos desagregados: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/relatorios/dados-grafico', methods=['POST'])
@@ -2004,35 +1559,29 @@ def api_dados_grafico():
         periodo = data.get('periodo', 'mes')
         modo = data.get('modo', 'acumulado')
         incluir_projecao = data.get('projecao', False)
+        data_inicio = data.get('data_inicio')
+        data_fim = data.get('data_fim')
         
-        print(f"📊 API Dados Gráfico - Lotes: {lotes_ids}, Unidades: {unidades}, Período: {periodo}, Modo: {modo}, Projeção: {incluir_projecao}")
+        logger.debug("Dados gráfico - lotes: %s, unidades: %s, período: %s, modo: %s, projeção: %s, intervalo: %s a %s",
+                     lotes_ids, unidades, periodo, modo, incluir_projecao, data_inicio, data_fim)
         
         # Converter lotes_ids para inteiros
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         
-        resultado = buscar_dados_graficos(lotes_ids, unidades, periodo, modo=modo)
-        
-        print(f"📊 Resultado da busca: success={resultado.get('success')}, registros={resultado.get('total_registros')}")
+        resultado = buscar_dados_graficos(lotes_ids, unidades, periodo, data_inicio, data_fim, modo=modo)
         
         if resultado.get('success'):
             # Formatar labels
             dados = resultado['dados']
-            print(f"📊 Labels encontrados: {len(dados.get('labels', []))}")
-            print(f"📊 Grupos encontrados: {len(dados.get('grupos', []))}")
-            
             labels_formatados = [formatar_label_periodo(label, periodo) for label in dados['labels']]
             dados['labels_formatados'] = labels_formatados
             dados['modo'] = modo
             
             # Calcular projeção se solicitada
             if incluir_projecao:
-                print(f"🔮 Calculando projeção para modo: {modo}")
                 from functions.relatorios import calcular_projecao
                 projecao = calcular_projecao(dados, periodo)
                 
-                print(f"🔮 Projeção calculada: {len(projecao.get('labels_projetados', []))} períodos")
-                print(f"🔮 Valores projetados: {projecao.get('valores_projetados', [])}")
-                
                 # Formatar labels de projeção
                 labels_projecao_formatados = [formatar_label_periodo(label, periodo) for label in projecao['labels_projetados']]
                 
@@ -2044,18 +1593,15 @@ def api_dados_grafico():
                     'media_historica': projecao['media_historica'],
                     'tendencia': projecao['tendencia']
                 }
-                
-                print(f"🔮 Projeção adicionada: {len(projecao['labels_projetados'])} períodos, tendência: {projecao['tendencia']}")
             
-            print(f"✅ Retornando dados: modo={dados['modo']}, tem_projecao={bool(dados.get('projecao'))}")
+            logger.debug("Dados gráfico: %d períodos, %d grupos, modo=%s, projeção=%s",
+                         len(dados.get('labels', [])), len(dados.get('grupos', [])), modo, bool(dados.get('projecao')))
             return jsonify(resultado), 200
         else:
             return jsonify(resultado), 400
     
     except Exception as e:
-        print(f"❌ Erro na API dados gráfico: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro na API dados gráfico: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -2072,20 +1618,19 @@ def api_dados_gastos():
         periodo = data.get('periodo', 'mes')
         modo = data.get('modo', 'acumulado')
         incluir_projecao = data.get('projecao', False)
+        data_inicio = data.get('data_inicio')
+        data_fim = data.get('data_fim')
         
-        print(f"💰 API Dados Gastos - Lotes: {lotes_ids}, Unidades: {unidades}, Período: {periodo}, Modo: {modo}")
+        logger.debug("Dados gastos - lotes: %s, unidades: %s, período: %s, modo: %s, intervalo: %s a %s",
+                     lotes_ids, unidades, periodo, modo, data_inicio, data_fim)
         
         # Converter lotes_ids para inteiros
         lotes_ids = [int(lid) for lid in lotes_ids if lid]
         
-        resultado = buscar_dados_gastos(lotes_ids, unidades, periodo, modo=modo)
-        
-        print(f"💰 Resultado: success={resultado.get('success')}, registros={resultado.get('total_registros')}")
+        resultado = buscar_dados_gastos(lotes_ids, unidades, periodo, data_inicio, data_fim, modo=modo)
         
         if resultado.get('success'):
             dados = resultado['dados']
-            print(f"💰 Labels encontrados: {len(dados.get('labels', []))}")
-            print(f"💰 Grupos encontrados: {len(dados.get('grupos', []))}")
             
             labels_formatados = [formatar_label_periodo(label, periodo) for label in dados['labels']]
             dados['labels_formatados'] = labels_formatados
@@ -2093,7 +1638,6 @@ def api_dados_gastos():
             
             # Calcular projeção de gastos se solicitada
             if incluir_projecao:
-                print(f"🔮 Calculando projeção de gastos para modo: {modo}")
                 from functions.relatorios import calcular_projecao
                 
                 # Criar estrutura de dados compatível com calcular_projecao
@@ -2109,7 +1653,6 @@ def api_dados_gastos():
                 
                 projecao = calcular_projecao(dados_para_projecao, periodo)
                 
-                print(f"🔮 Projeção de gastos calculada: {len(projecao.get('labels_projetados', []))} períodos")
                 
                 labels_projecao_formatados = [formatar_label_periodo(label, periodo) for label in projecao['labels_projetados']]
                 
@@ -2122,15 +1665,14 @@ def api_dados_gastos():
                     'tendencia': projecao['tendencia']
                 }
             
-            print(f"✅ Retornando gastos: modo={dados['modo']}, tem_projecao={bool(dados.get('projecao'))}")
+            logger.debug("Dados gastos: %d períodos, %d grupos, modo=%s, projeção=%s",
+                         len(dados.get('labels', [])), len(dados.get('grupos', [])), modo, bool(dados.get('projecao')))
             return jsonify(resultado), 200
         else:
             return jsonify(resultado), 400
     
     except Exception as e:
-        print(f"❌ Erro na API dados gastos: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erro na API dados gastos: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 #NÃO FEITOS
@@ -2152,6 +1694,12 @@ def revogar_usuario(user_id):
 def api_lotes():
     return jsonify({'ok': True})
 
+@app.route('/api/cache/estatisticas')
+@login_required
+def api_cache_estatisticas():
+    # Contadores do cache do dashboard (hits, misses, invalidações)
+    return jsonify({'success': True, 'cache': estatisticas_cache()})
+
 @app.template_filter('data_br')
 def filtro_data_br(data_str):
     try:
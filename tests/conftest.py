@@ -0,0 +1,25 @@
+"""
+Fixtures compartilhadas: banco SQLite temporário preenchido pelo gerador de
+dados sintéticos dos benchmarks (perfil 'pequeno' com cadeias de três lotes,
+semente fixa).
+"""
+import pytest
+
+from benchmarks.gerador import PERFIS, criar_app, gerar_dados
+
+CONFIG = dict(PERFIS['pequeno'], lotes_por_cadeia=3, meses_por_lote=6)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+	caminho_db = tmp_path_factory.mktemp('dados') / 'teste.db'
+	app = criar_app(str(caminho_db))
+	with app.app_context():
+		app.config['DADOS_GERADOS'] = gerar_dados(CONFIG, semente=7)
+	return app
+
+
+@pytest.fixture
+def contexto(app):
+	with app.app_context():
+		yield app
@@ -0,0 +1,48 @@
+"""
+Limpeza do cache de exportações: .xlsx e .json saem juntos, e arquivos sem par
+(ou temporários) abandonados são removidos.
+"""
+import os
+import time
+
+import pytest
+
+from functions import cache_exportacoes
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+	monkeypatch.setattr(cache_exportacoes, 'DIRETORIO_CACHE', str(tmp_path))
+	monkeypatch.setattr(cache_exportacoes, 'LIMITE_MB', 1)
+	return tmp_path
+
+
+def _criar(diretorio, nome, tamanho=10, idade=0):
+	caminho = diretorio / nome
+	caminho.write_bytes(b'x' * tamanho)
+	instante = time.time() - idade
+	os.utime(caminho, (instante, instante))
+
+
+def test_remove_xlsx_e_json_juntos(diretorio):
+	for posicao, chave in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+		_criar(diretorio, f'{chave}.xlsx', 400 * 1024, idade=100 - posicao)
+		_criar(diretorio, f'{chave}.json', idade=100 - posicao)
+
+	cache_exportacoes._liberar_espaco('c' * 64)
+
+	assert sorted(os.listdir(diretorio)) == [f'{"b" * 64}.json', f'{"b" * 64}.xlsx', f'{"c" * 64}.json', f'{"c" * 64}.xlsx']
+
+
+def test_remove_arquivos_sem_par_abandonados(diretorio):
+	prazo = cache_exportacoes.PRAZO_ARQUIVOS_SEM_PAR
+	_criar(diretorio, f'{"a" * 64}.json', idade=prazo + 10)
+	_criar(diretorio, f'{"b" * 64}.xlsx', idade=prazo + 10)
+	_criar(diretorio, f'{"c" * 64}.xlsx.123.tmp', idade=prazo + 10)
+	# Recentes: podem ser de uma gravação em andamento
+	_criar(diretorio, f'{"d" * 64}.json')
+	_criar(diretorio, f'{"e" * 64}.json.123.tmp')
+
+	cache_exportacoes._liberar_espaco(None)
+
+	assert sorted(os.listdir(diretorio)) == [f'{"d" * 64}.json', f'{"e" * 64}.json.123.tmp']
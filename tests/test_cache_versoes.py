@@ -0,0 +1,43 @@
+"""
+Cache do dashboard: uma gravação feita por outro processo do servidor (versão
+incrementada só no banco) invalida as entradas deste processo.
+"""
+from functions.cache import estatisticas_cache
+from functions.lotes import _load_lotes_data
+from functions.models import db, Lote, VersaoDados
+
+
+def _incrementar_em_outro_processo(grupo):
+	# Como outro worker faria: grava e incrementa a versão no banco, sem passar por este processo
+	linha = db.session.get(VersaoDados, grupo)
+	if linha is None:
+		db.session.add(VersaoDados(grupo=grupo, versao=1))
+	else:
+		linha.versao += 1
+	db.session.commit()
+
+
+def test_acerto_sem_gravacao(contexto):
+	_load_lotes_data()
+	hits = estatisticas_cache()['hits']
+	_load_lotes_data()
+	assert estatisticas_cache()['hits'] == hits + 1
+
+
+def test_gravacao_em_outro_processo(contexto):
+	lote = Lote.query.order_by(Lote.id).first()
+	nome_original = lote.nome
+	assert next(l for l in _load_lotes_data() if l['id'] == lote.id)['nome'] == nome_original
+
+	try:
+		lote.nome = f'{nome_original} (renomeado)'
+		db.session.commit()
+		_incrementar_em_outro_processo('lotes')
+
+		misses = estatisticas_cache()['misses']
+		assert next(l for l in _load_lotes_data() if l['id'] == lote.id)['nome'] == lote.nome
+		assert estatisticas_cache()['misses'] == misses + 1
+	finally:
+		lote.nome = nome_original
+		db.session.commit()
+		_incrementar_em_outro_processo('lotes')
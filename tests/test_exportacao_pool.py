@@ -0,0 +1,49 @@
+"""
+Exportação de todos os lotes: o arquivo montado no pool de processos é igual ao
+montado em série (valores, estilos, mesclas, larguras e formatação condicional).
+"""
+from io import BytesIO
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+from functions import exportacao
+from functions.helpers import gerar_excel_exportacao_multiplos_lotes
+
+ATRIBUTOS_ESTILO = ('font', 'fill', 'border', 'alignment', 'number_format', 'protection')
+
+
+@pytest.fixture
+def pool():
+	yield
+	exportacao.encerrar_pool()
+
+
+def _conteudo(resultado):
+	assert resultado['success'], resultado.get('error')
+	wb = openpyxl.load_workbook(BytesIO(resultado['output'].getvalue()))
+	conteudo = {}
+	for ws in wb.worksheets:
+		conteudo[ws.title] = {
+			'celulas': [
+				[(c.value, tuple(repr(getattr(c, a)) for a in ATRIBUTOS_ESTILO)) for c in linha]
+				for linha in ws.iter_rows()
+			],
+			'mesclas': sorted(str(m) for m in ws.merged_cells.ranges),
+			'larguras': {k: d.width for k, d in ws.column_dimensions.items()},
+			'condicionais': sorted(str(f.sqref) for f in ws.conditional_formatting),
+		}
+	return conteudo
+
+
+def test_pool_igual_serie(contexto, pool, monkeypatch):
+	monkeypatch.setattr(exportacao, 'PROCESSOS', 1)
+	serie = _conteudo(gerar_excel_exportacao_multiplos_lotes('2021-01-01', '2021-01-31'))
+	assert exportacao._pool is None
+
+	monkeypatch.setattr(exportacao, 'PROCESSOS', 2)
+	paralelo = _conteudo(gerar_excel_exportacao_multiplos_lotes('2021-01-01', '2021-01-31'))
+	assert exportacao._pool is not None
+	assert len(serie) > 1
+	assert paralelo == serie
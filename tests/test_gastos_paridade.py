@@ -0,0 +1,88 @@
+"""
+buscar_dados_gastos: valores contratuais e gastos calculados direto das linhas
+do banco, como na versão original (laços sobre lotes, unidades e séries JSON).
+"""
+import json
+
+import pytest
+
+from functions.linhagem import expandir_lotes_com_predecessores
+from functions.models import db, Lote, Unidade, Mapa
+from functions.relatorios import buscar_dados_gastos
+
+CAMPOS = [f'{refeicao}_{tipo}' for refeicao in ('cafe', 'almoco', 'lanche', 'jantar') for tipo in ('interno', 'funcionario')]
+
+
+def _cenario(app):
+	lote_id = app.config['DADOS_GERADOS']['lotes_ativos'][0]
+	principais = [
+		u.nome for u in Unidade.query.filter_by(lote_id=lote_id, unidade_principal_id=None).order_by(Unidade.id)
+	]
+	return [lote_id], principais
+
+
+def _valores_esperados(lotes_ids, principais):
+	valores_lotes = []
+	valores_unidades = {}
+	for lote_id in expandir_lotes_com_predecessores(lotes_ids):
+		lote = db.session.get(Lote, lote_id)
+		if lote.valor_contratual and lote_id in lotes_ids:
+			valores_lotes.append({
+				'lote_id': lote_id, 'lote_nome': lote.nome, 'valor_contratual': float(lote.valor_contratual)
+			})
+		for principal in Unidade.query.filter(
+			Unidade.lote_id == lote_id, Unidade.nome.in_(principais), Unidade.unidade_principal_id.is_(None)
+		):
+			total = (principal.valor_contratual_unidade or 0) + sum(
+				sub.valor_contratual_unidade or 0
+				for sub in Unidade.query.filter_by(unidade_principal_id=principal.id, ativo=True)
+			)
+			if total > 0:
+				valores_unidades[principal.nome] = float(total)
+	return valores_lotes, valores_unidades
+
+
+def _gasto_total_esperado(lotes_ids, principais):
+	lotes = expandir_lotes_com_predecessores(lotes_ids)
+	nomes = set(principais)
+	for principal in Unidade.query.filter(Unidade.lote_id.in_(lotes), Unidade.nome.in_(principais)):
+		nomes.update(sub.nome for sub in Unidade.query.filter_by(unidade_principal_id=principal.id, ativo=True))
+	total = 0.0
+	for mapa in Mapa.query.filter(Mapa.lote_id.in_(lotes), Mapa.unidade.in_(nomes)):
+		precos = json.loads(db.session.get(Lote, mapa.lote_id).precos)
+		for campo in CAMPOS:
+			refeicao, tipo = campo.split('_')
+			total += sum(json.loads(getattr(mapa, campo))) * precos[refeicao][tipo]
+	return total
+
+
+def test_valores_contratuais_lote(contexto):
+	lotes_ids, principais = _cenario(contexto)
+	esperado, _ = _valores_esperados(lotes_ids, principais)
+
+	for modo in ('acumulado', 'lote'):
+		resultado = buscar_dados_gastos(lotes_ids, principais, 'mes', modo=modo)
+		assert resultado['success'], resultado.get('error')
+		assert esperado
+		assert resultado['dados']['valores_contratuais'] == esperado
+
+
+def test_valores_contratuais_unidades(contexto):
+	lotes_ids, principais = _cenario(contexto)
+	_, esperado = _valores_esperados(lotes_ids, principais)
+
+	resultado = buscar_dados_gastos(lotes_ids, principais, 'mes', modo='unidade')
+	assert resultado['success'], resultado.get('error')
+	assert set(esperado) == set(principais)
+	assert resultado['dados']['valores_contratuais_unidades'] == pytest.approx(esperado)
+	assert resultado['dados']['valores_contratuais'] == []
+
+
+def test_gasto_total(contexto):
+	lotes_ids, principais = _cenario(contexto)
+
+	resultado = buscar_dados_gastos(lotes_ids, principais, 'mes', modo='acumulado')
+	assert resultado['success'], resultado.get('error')
+	assert sum(resultado['dados']['datasets']['total_gastos']) == pytest.approx(
+		_gasto_total_esperado(lotes_ids, principais)
+	)
@@ -0,0 +1,44 @@
+"""
+/metrics exige usuário logado ou o token de SGMRP_METRICAS_TOKEN; o cabeçalho
+X-Metricas-Requisicao só é incluído com SGMRP_METRICAS_CABECALHO.
+"""
+import pytest
+from flask import Flask
+
+from functions import instrumentacao
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+	monkeypatch.setattr(instrumentacao, 'METRICAS_ATIVAS', True)
+	monkeypatch.setattr(instrumentacao, 'TOKEN_METRICAS', 'segredo')
+	app = Flask('teste_metricas')
+	app.secret_key = 'teste'
+	instrumentacao.instrumentar_app(app)
+
+	@app.route('/login')
+	def login():
+		return 'login'
+
+	return app.test_client()
+
+
+def test_metricas_sem_autenticacao(cliente):
+	assert cliente.get('/metrics').status_code == 401
+	assert cliente.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code == 401
+
+
+def test_metricas_com_token_ou_sessao(cliente):
+	resposta = cliente.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+	assert resposta.status_code == 200
+	assert b'sgmrp_requisicoes_total' in resposta.data
+
+	with cliente.session_transaction() as sessao:
+		sessao['usuario_id'] = 1
+	assert cliente.get('/metrics').status_code == 200
+
+
+def test_cabecalho_opcional(cliente, monkeypatch):
+	assert instrumentacao.CABECALHO_METRICAS not in cliente.get('/login').headers
+	monkeypatch.setattr(instrumentacao, 'CABECALHO_ATIVO', True)
+	assert 'sql=' in cliente.get('/login').headers[instrumentacao.CABECALHO_METRICAS]
@@ -0,0 +1,66 @@
+"""
+Importação em lote de mapas: mesmo UPSERT da gravação individual, inclusive
+quando outra gravação insere a mesma chave durante a importação.
+"""
+from functions import mapas
+from functions.models import db, Lote, Mapa, MapaDia
+
+UNIDADE = 'UNIDADE TESTE IMPORTACAO'
+
+
+def _entrada(lote, valor):
+	ano, mes = int(lote.data_inicio[:4]), int(lote.data_inicio[5:7])
+	return {'lote_id': lote.id, 'ano': ano, 'mes': mes, 'unidade': UNIDADE, 'cafe_interno': [valor] * 28}
+
+
+def _remover_mapas():
+	ids = [m.id for m in Mapa.query.filter_by(unidade=UNIDADE)]
+	MapaDia.query.filter(MapaDia.mapa_id.in_(ids)).delete(synchronize_session=False)
+	Mapa.query.filter(Mapa.id.in_(ids)).delete(synchronize_session=False)
+	db.session.commit()
+
+
+def test_insercao_concorrente_durante_importacao(contexto, monkeypatch):
+	lote = Lote.query.order_by(Lote.id).first()
+	ids_por_chave = mapas._ids_mapas_por_chave
+	chamadas = []
+
+	def consulta_antes_da_gravacao_concorrente(chaves):
+		# A consulta prévia não vê o mapa; logo depois outra gravação o insere
+		chamadas.append(1)
+		if len(chamadas) == 1:
+			existentes = ids_por_chave(chaves)
+			mapas._upsert_mapa(mapas._montar_registro_mapa(_entrada(lote, 1)))
+			db.session.commit()
+			return existentes
+		return ids_por_chave(chaves)
+
+	monkeypatch.setattr(mapas, '_ids_mapas_por_chave', consulta_antes_da_gravacao_concorrente)
+	try:
+		resultado = mapas.salvar_mapas_lote([_entrada(lote, 5)])
+		assert resultado['success'], resultado
+		assert resultado['resultados'][0]['success']
+
+		gravados = Mapa.query.filter_by(unidade=UNIDADE).all()
+		assert len(gravados) == 1
+		assert gravados[0].id == resultado['resultados'][0]['id']
+		assert sum(d.cafe_interno for d in MapaDia.query.filter_by(mapa_id=gravados[0].id)) == 5 * 28
+	finally:
+		_remover_mapas()
+
+
+def test_reimportacao_atualiza_sem_duplicar(contexto):
+	lote = Lote.query.order_by(Lote.id).first()
+	try:
+		primeiro = mapas.salvar_mapas_lote([_entrada(lote, 2)])
+		criado_em = Mapa.query.filter_by(unidade=UNIDADE).one().criado_em
+		segundo = mapas.salvar_mapas_lote([_entrada(lote, 3)])
+		assert (primeiro['inseridos'], segundo['atualizados']) == (1, 1)
+		assert primeiro['resultados'][0]['id'] == segundo['resultados'][0]['id']
+
+		mapa = Mapa.query.filter_by(unidade=UNIDADE).one()
+		assert mapa.criado_em == criado_em
+		assert mapa.atualizado_em >= criado_em
+		assert MapaDia.query.filter_by(mapa_id=mapa.id).count() == 28
+	finally:
+		_remover_mapas()
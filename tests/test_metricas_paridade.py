@@ -0,0 +1,173 @@
+"""
+calcular_metricas_lotes (NumPy) contra a versão original em laços, mantida aqui
+como referência, sobre os dados sintéticos: cadeias de três lotes (métricas do
+lote somam as dos predecessores) e meses sem mapa em alguns lotes.
+"""
+import copy
+from collections import defaultdict
+
+from functions.helpers import _carregar_mapas_dashboard
+from functions.lotes import _load_lotes_data
+from functions.mapas import calcular_metricas_lotes, serialize_mapa
+from functions.models import Mapa
+
+CAMPOS_METRICAS = (
+	'refeicoes_por_mes', 'meses_cadastrados', 'refeicoes_mes', 'custo_mes',
+	'desvio_mes', 'percentual_executado', 'conformidade'
+)
+
+
+def _calcular_metricas_lotes_original(lotes, mapas):
+	# Cópia da versão anterior à vetorização (percorre a cadeia pela lista de lotes)
+	mapas_por_lote_mes = defaultdict(lambda: defaultdict(list))
+	for m in (mapas or []):
+		if not isinstance(m, dict):
+			m = serialize_mapa(m)
+		mapas_por_lote_mes[str(m.get('lote_id'))][f"{m.get('mes')}/{m.get('ano')}"].append(m)
+
+	lotes_por_id = {lote.get('id'): lote for lote in lotes}
+
+	for lote in lotes:
+		lid = str(lote.get('id'))
+		refeicoes_por_mes = {}
+		custo_total = 0.0
+		desvio_total = 0.0
+
+		lotes_ids_para_buscar = [lid]
+		predecessor_id = lote.get('lote_predecessor_id')
+		while predecessor_id:
+			lotes_ids_para_buscar.append(str(predecessor_id))
+			lote_predecessor = lotes_por_id.get(predecessor_id)
+			if lote_predecessor:
+				predecessor_id = lote_predecessor.get('lote_predecessor_id')
+			else:
+				break
+
+		for lote_id_busca in lotes_ids_para_buscar:
+			lote_atual = lotes_por_id.get(int(lote_id_busca)) if lote_id_busca != lid else lote
+			precos_lote = lote_atual.get('precos', {}) if lote_atual else lote.get('precos', {})
+
+			def get_preco(refeicao, tipo):
+				if isinstance(precos_lote.get(refeicao), dict):
+					valor = precos_lote[refeicao].get(tipo, 0)
+				else:
+					valor = precos_lote.get(f'{refeicao}_{tipo}', 0)
+				try:
+					return float(valor)
+				except (ValueError, TypeError):
+					return 0.0
+
+			for mes_ano, mapas_mes in mapas_por_lote_mes[lote_id_busca].items():
+				if mes_ano not in refeicoes_por_mes:
+					refeicoes_por_mes[mes_ano] = 0
+				total_mes = 0
+				custo_mes = 0.0
+				desvio_mes = 0.0
+				for mapa in mapas_mes:
+					for refeicao in ('cafe', 'almoco', 'lanche', 'jantar'):
+						for tipo in ('interno', 'funcionario'):
+							valores = mapa.get(f'{refeicao}_{tipo}', [])
+							if isinstance(valores, list):
+								total_mes += sum(int(x) if x is not None else 0 for x in valores)
+					for refeicao in ('cafe', 'almoco', 'lanche', 'jantar'):
+						for tipo in ('interno', 'funcionario'):
+							valores = mapa.get(f'{refeicao}_{tipo}')
+							if isinstance(valores, list):
+								quantidade = sum(int(x) if x is not None else 0 for x in valores)
+								custo_mes += quantidade * get_preco(refeicao, tipo)
+					for refeicao in ('cafe', 'almoco', 'lanche', 'jantar'):
+						for tipo in ('interno', 'funcionario'):
+							valores = mapa.get(f'{refeicao}_{tipo}_siisp')
+							if isinstance(valores, list):
+								quantidade = sum(max(0, float(x)) if x is not None else 0 for x in valores)
+								desvio_mes += quantidade * get_preco(refeicao, tipo)
+				refeicoes_por_mes[mes_ano] += total_mes
+				custo_total += custo_mes
+				desvio_total += abs(desvio_mes)
+
+		meses_count = len(refeicoes_por_mes)
+		total_refeicoes = sum(refeicoes_por_mes.values())
+		lote['refeicoes_por_mes'] = refeicoes_por_mes
+		lote['meses_cadastrados'] = meses_count
+
+		if meses_count > 0:
+			lote['refeicoes_mes'] = total_refeicoes / meses_count
+			lote['custo_mes'] = custo_total / meses_count
+			lote['desvio_mes'] = desvio_total / meses_count
+		else:
+			lote['refeicoes_mes'] = 0
+			lote['custo_mes'] = 0.0
+			lote['desvio_mes'] = 0.0
+
+		try:
+			valor_contratual = float(lote.get('valor_contratual', 0))
+		except (ValueError, TypeError):
+			valor_contratual = 0.0
+		if valor_contratual > 0 and custo_total > 0:
+			lote['percentual_executado'] = round((custo_total / valor_contratual) * 100, 1)
+		else:
+			lote['percentual_executado'] = 0.0
+
+		if lote['custo_mes'] > 0:
+			lote['conformidade'] = round(max(0, ((lote['custo_mes'] - lote['desvio_mes']) / lote['custo_mes']) * 100), 1)
+		else:
+			lote['conformidade'] = 0.0
+
+
+def _metricas(lotes):
+	return {lote['id']: {campo: lote[campo] for campo in CAMPOS_METRICAS} for lote in lotes}
+
+
+def _comparar(mapas_omitidos=lambda mapa: False):
+	lotes = _load_lotes_data()
+	mapas_db = [m for m in Mapa.query.order_by(Mapa.id) if not mapas_omitidos(m)]
+	mapas = [m for m in _carregar_mapas_dashboard(incluir_series=False) if not mapas_omitidos(m)]
+	assert len(mapas) == len(mapas_db)
+
+	esperado = copy.deepcopy(lotes)
+	_calcular_metricas_lotes_original(esperado, mapas_db)
+	obtido = copy.deepcopy(lotes)
+	calcular_metricas_lotes(obtido, mapas)
+	return _metricas(esperado), _metricas(obtido)
+
+
+def test_metricas_cadeias_completas(contexto):
+	esperado, obtido = _comparar()
+
+	predecessores = [lote for lote in _load_lotes_data() if lote.get('lote_predecessor_id')]
+	assert predecessores
+	assert obtido == esperado
+
+
+def test_metricas_meses_sem_mapa(contexto):
+	lotes = _load_lotes_data()
+	ativo = next(lote for lote in lotes if lote.get('ativo') and lote.get('lote_predecessor_id'))
+	intermediario = ativo['lote_predecessor_id']
+
+	# Sem os meses pares do lote ativo e sem nenhum mapa do lote intermediário da cadeia
+	def omitido(mapa):
+		return (mapa.lote_id == ativo['id'] and mapa.mes % 2 == 0) or mapa.lote_id == intermediario
+
+	esperado, obtido = _comparar(omitido)
+	primeiro = next(lote for lote in lotes if lote['id'] == intermediario)['lote_predecessor_id']
+	assert esperado[intermediario]['meses_cadastrados'] == esperado[primeiro]['meses_cadastrados']
+	assert obtido == esperado
+
+
+def test_metricas_sem_mapas(contexto):
+	lotes = _load_lotes_data()
+	esperado = copy.deepcopy(lotes)
+	_calcular_metricas_lotes_original(esperado, [])
+	obtido = copy.deepcopy(lotes)
+	calcular_metricas_lotes(obtido, [])
+	assert _metricas(obtido) == _metricas(esperado)
+
+
+def test_metricas_so_lotes_ativos(contexto):
+	lotes = [lote for lote in _load_lotes_data() if lote.get('ativo')]
+	mapas_db = Mapa.query.order_by(Mapa.id).all()
+	esperado = copy.deepcopy(lotes)
+	_calcular_metricas_lotes_original(esperado, mapas_db)
+	obtido = copy.deepcopy(lotes)
+	calcular_metricas_lotes(obtido, _carregar_mapas_dashboard(incluir_series=False))
+	assert _metricas(obtido) == _metricas(esperado)
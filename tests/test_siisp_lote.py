@@ -0,0 +1,41 @@
+"""
+Importação de SIISP em lote: o número de comandos SQL não cresce com o número
+de entradas (datas dos lotes e mapas consultadas uma vez por chamada).
+"""
+from sqlalchemy import event
+
+from functions.models import db, Mapa
+from functions.series import decodificar_serie
+from functions.siisp import adicionar_siisp_em_mapas_lote
+
+
+def _payloads(quantidade):
+	# Regrava a série SIISP já existente: os dados do banco não mudam
+	mapas = Mapa.query.order_by(Mapa.lote_id, Mapa.ano, Mapa.mes, Mapa.unidade).limit(quantidade).all()
+	return [
+		{'lote_id': m.lote_id, 'ano': m.ano, 'mes': m.mes, 'unidade': m.unidade, 'dados_siisp': decodificar_serie(m.dados_siisp)}
+		for m in mapas
+	]
+
+
+def _comandos_sql(payloads):
+	comandos = []
+
+	def contar(conn, cursor, statement, parameters, context, executemany):
+		comandos.append(statement)
+
+	engine = db.engine
+	event.listen(engine, 'before_cursor_execute', contar)
+	try:
+		resultado = adicionar_siisp_em_mapas_lote(payloads)
+	finally:
+		event.remove(engine, 'before_cursor_execute', contar)
+	assert resultado['success'], resultado
+	assert resultado['erros'] == 0
+	return len(comandos)
+
+
+def test_comandos_constantes(contexto):
+	um, varios = _payloads(1), _payloads(32)
+	db.session.expire_all()
+	assert _comandos_sql(um) == _comandos_sql(varios)
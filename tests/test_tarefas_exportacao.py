@@ -0,0 +1,51 @@
+"""
+Exportações assíncronas: o estado gravado em disco permite consultar a tarefa e
+baixar o arquivo em um processo que não recebeu o pedido.
+"""
+import time
+
+import pytest
+
+from functions import cache_exportacoes, tarefas
+
+
+@pytest.fixture
+def diretorios(tmp_path, monkeypatch):
+	monkeypatch.setattr(tarefas, 'DIRETORIO_EXPORTACOES', str(tmp_path / 'exportacoes'))
+	monkeypatch.setattr(cache_exportacoes, 'DIRETORIO_CACHE', str(tmp_path / 'cache_exportacoes'))
+	return tmp_path
+
+
+def _aguardar(tarefa_id, limite=120):
+	fim = time.time() + limite
+	while time.time() < fim:
+		tarefa = tarefas.obter_tarefa_exportacao(tarefa_id)
+		if tarefa['status'] in (tarefas.CONCLUIDA, tarefas.ERRO):
+			return tarefa
+		time.sleep(0.05)
+	raise AssertionError(f'Exportação {tarefa_id} não terminou em {limite}s')
+
+
+def test_tarefa_consultada_em_outro_processo(contexto, diretorios, monkeypatch):
+	lote_id = contexto.config['DADOS_GERADOS']['lotes_ativos'][0]
+	resultado = tarefas.enfileirar_exportacao({'lote_id': lote_id})
+	assert resultado['success'], resultado.get('error')
+	tarefa_id = resultado['tarefa']['id']
+
+	tarefa = _aguardar(tarefa_id)
+	assert tarefa['status'] == tarefas.CONCLUIDA, tarefa.get('erro')
+
+	# Outro processo: nenhuma tarefa em memória, só o diretório compartilhado
+	monkeypatch.setattr(tarefas, '_tarefas', {})
+	assert tarefas.obter_tarefa_exportacao(tarefa_id) == tarefa
+	arquivo = tarefas.arquivo_tarefa_exportacao(tarefa_id)
+	assert arquivo['success'], arquivo.get('error')
+	assert arquivo['filename'] == tarefa['filename']
+	with open(arquivo['caminho'], 'rb') as f:
+		assert f.read(2) == b'PK'
+
+
+@pytest.mark.parametrize('tarefa_id', ['0' * 32, '../../dados/modelo', 'ABC'])
+def test_tarefa_inexistente(contexto, diretorios, tarefa_id):
+	assert tarefas.obter_tarefa_exportacao(tarefa_id) is None
+	assert tarefas.arquivo_tarefa_exportacao(tarefa_id)['status'] is None